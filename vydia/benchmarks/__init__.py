@@ -0,0 +1,8 @@
+"""
+Benchmarks of core functionality using synthetic libraries
+"""
+
+from .runner import BENCHMARKS, benchmark, run_benchmarks, compare_results
+
+
+__all__ = ['BENCHMARKS', 'benchmark', 'run_benchmarks', 'compare_results']
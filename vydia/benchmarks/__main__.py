@@ -0,0 +1,161 @@
+"""
+Run benchmarks and compare results between commits, e.g.:
+
+    $ python -m vydia.benchmarks run -o before.json
+    $ git checkout feature
+    $ python -m vydia.benchmarks run -o after.json
+    $ python -m vydia.benchmarks compare before.json after.json
+"""
+
+import sys
+import json
+import tempfile
+
+from typing import Any, Dict, Optional, Tuple
+
+import click
+
+from .runner import (
+    BENCHMARKS, run_benchmarks, compare_results, format_time)
+
+
+@click.group()
+def main() -> None:
+    pass
+
+
+@main.command(help='Run (selected) benchmarks and store results as JSON.')
+@click.argument('names', nargs=-1)
+@click.option(
+    '-o', '--output', type=click.Path(dir_okay=False),
+    help='Result file (default: bench-<commit>.json).')
+@click.option(
+    '--scale', default=1., show_default=True,
+    help='Size of synthetic data relative to full size.')
+@click.option('--repeat', default=5, show_default=True)
+def run(
+    names: Tuple[str, ...], output: Optional[str],
+    scale: float, repeat: int
+) -> None:
+    def progress(name: str, res: Dict[str, Any]) -> None:
+        print(f'{name:<30} {format_time(res["min"]):>10} '
+              f'(median {format_time(res["median"])}, '
+              f'{res["loops"]} loops)')
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        results = run_benchmarks(
+            tmpdir, names=names or None,
+            scale=scale, repeat=repeat, progress=progress)
+
+    output = output or f'bench-{results["commit"] or "unknown"}.json'
+    with open(output, 'w') as fd:
+        json.dump(results, fd, indent=2)
+    print(f'Saved results to "{output}"')
+
+
+@main.command(help='Compare two result files, fail on regressions.')
+@click.argument('old', type=click.File())
+@click.argument('new', type=click.File())
+@click.option(
+    '--threshold', default=.1, show_default=True,
+    help='Relative slowdown which counts as regression.')
+def compare(old: Any, new: Any, threshold: float) -> None:
+    old_res, new_res = json.load(old), json.load(new)
+    print(f'{"benchmark":<30} {old_res["commit"] or "old":>10} '
+          f'{new_res["commit"] or "new":>10}   change')
+
+    regressions = 0
+    for name, t_old, t_new, change, slower in compare_results(
+            old_res, new_res, threshold=threshold):
+        regressions += slower
+        print(f'{name:<30} {format_time(t_old):>10} {format_time(t_new):>10}'
+              f' {change:+8.1%}' + ('  REGRESSION' if slower else ''))
+
+    sys.exit(1 if regressions > 0 else 0)
+
+
+@main.command(help='Run scripted TUI session on headless screen.')
+@click.option('--videos', default=500, show_default=True)
+@click.option(
+    '-o', '--output', type=click.Path(dir_okay=False),
+    help='Store report as JSON.')
+def tui(videos: int, output: Optional[str]) -> None:
+    from .tui import TUIHarness
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with TUIHarness(tmpdir, n_videos=videos) as harness:
+            harness.run_scenario()
+    report = harness.report()
+
+    for step in report['steps']:
+        print(f'{step["label"]:<25} {format_time(step["time"]):>10} '
+              f'{step["widgets"]:>6} widgets {step["redraws"]:>4} redraws')
+    frame_time = report['frame_time']
+    print(f'\n{report["frames"]} frames, '
+          f'median {format_time(frame_time["median"])}, '
+          f'p95 {format_time(frame_time["p95"])}, '
+          f'max {format_time(frame_time["max"])}; '
+          f'{report["widgets"]} widgets, '
+          f'{report["redraws_per_second"]:.1f} redraws/s')
+
+    if output is not None:
+        with open(output, 'w') as fd:
+            json.dump(report, fd, indent=2)
+
+
+@main.command(help='Binge synthetic playlist on simulated player.')
+@click.option('--episodes', default=1000, show_default=True)
+@click.option(
+    '--speedup', default=50_000., show_default=True,
+    help='Factor by which simulated playback outpaces real time.')
+@click.option('--no-preload', is_flag=True)
+@click.option(
+    '-o', '--output', type=click.Path(dir_okay=False),
+    help='Store report as JSON.')
+def binge(
+    episodes: int, speedup: float, no_preload: bool, output: Optional[str]
+) -> None:
+    from .load import run_binge
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        report = run_binge(
+            tmpdir, n_episodes=episodes, speedup=speedup,
+            preload=not no_preload)
+
+    print(f'{report["episodes"]} episodes '
+          f'({report["virtual_duration"] / 3600:.1f}h) '
+          f'in {format_time(report["duration"])}')
+    for key in (
+            'state_writes_per_episode', 'redraws_per_episode',
+            'position_updates', 'widgets'):
+        print(f'{key:<30} {report[key]:>10.2f}')
+    for key in ('memory_growth', 'memory_peak'):
+        print(f'{key:<30} {report[key] / 1024:>8.0f}KB')
+
+    if output is not None:
+        with open(output, 'w') as fd:
+            json.dump(report, fd, indent=2)
+
+
+@main.command(help='Measure memory retained by large YouTube playlist.')
+@click.option('--videos', default=5000, show_default=True)
+def memory(videos: int) -> None:
+    from .memory import measure_playlist
+
+    report = measure_playlist(videos)
+    print(f'{report["videos"]} videos retain '
+          f'{report["retained"] / 2**20:.1f}MiB '
+          f'({report["retained_per_video"]:.0f}B per video)')
+    if report['rss_growth'] is not None:
+        print(f'Resident memory grew by {report["rss_growth"] / 2**20:.1f}MiB')
+
+
+@main.command(name='list', help='List available benchmarks.')
+def list_() -> None:
+    from . import suite  # noqa: F401
+    for name in sorted(BENCHMARKS):
+        print(name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Generators for synthetic state files, playlists and media directories
+"""
+
+import os
+import json
+import wave
+import random
+import functools
+
+from typing import Any, Dict, List
+
+from ..extra.plugins import Playlist, Video, VideoData
+from ..extra.utils import sec2ts
+
+
+def make_title(rng: random.Random, i: int) -> str:
+    words = ['episode', 'part', 'the', 'lecture', 'review', 'live', 'intro',
+             'finale', 'bonus', 'talk', 'vlog', 'chapter', 'season']
+    return f'{i:05d} ' + ' '.join(rng.choice(words) for _ in range(5))
+
+
+def make_state(
+    n_playlists: int = 1000, n_episodes: int = 100_000, seed: int = 42
+) -> Dict[str, Any]:
+    """ State as written by `Model`, episodes spread over all playlists
+    """
+    rng = random.Random(seed)
+    per_playlist = max(1, n_episodes // n_playlists)
+
+    state = {}
+    for p in range(n_playlists):
+        episodes = {
+            make_title(rng, i): {
+                'current_timestamp': sec2ts(rng.randrange(3600))}
+            for i in range(per_playlist)}
+        title = next(iter(episodes)) if len(episodes) > 0 else ''
+
+        state[f'playlist {p:04d}'] = {
+            'id': f'/videos/playlist_{p:04d}',
+            'episodes': episodes,
+            'current': {'title': title, 'timestamp': '00:10:00'}
+        }
+    return state
+
+
+def write_state(fname: str, **kwargs: Any) -> Dict[str, Any]:
+    state = make_state(**kwargs)
+    with open(fname, 'w') as fd:
+        json.dump(state, fd)
+    return state
+
+
+def make_playlist(
+    n_videos: int = 10_000, seed: int = 42,
+    min_duration: int = 60, max_duration: int = 3600
+) -> Playlist:
+    rng = random.Random(seed)
+
+    pl = Playlist()
+    pl._id = '/videos/synthetic'
+    pl._title = 'Synthetic playlist'
+    for i in range(n_videos):
+        path = f'/videos/synthetic/{i:05d}.mp4'
+        pl.append(Video(VideoData(
+            title=make_title(rng, i),
+            duration=rng.randrange(min_duration, max_duration),
+            # picklable, so playlists can be cached like real ones
+            get_file_stream=functools.partial(str, path),
+            get_info=functools.partial(str, ''))))
+    return pl
+
+
+class FakePafy:
+    """ Stand-in for pafy's video objects with comparable metadata
+    """
+
+    def __init__(self, rng: random.Random, i: int) -> None:
+        self.videoid = f'{i:011d}'
+        self.title = make_title(rng, i)
+        self.author = f'channel {rng.randrange(100)}'
+        self.published = '2018-01-01 12:00:00'
+        self.length = rng.randrange(60, 3600)
+        self.description = ' '.join(
+            make_title(rng, j) for j in range(rng.randrange(10, 60)))
+        self.keywords = [make_title(rng, j) for j in range(10)]
+        self.thumb = f'https://i.ytimg.com/vi/{self.videoid}/default.jpg'
+        self.rating, self.viewcount = rng.random() * 5, rng.randrange(10**6)
+
+        # raw API response, as kept by pafy
+        self._ydl_info = {
+            'id': self.videoid, 'title': self.title,
+            'description': self.description, 'tags': list(self.keywords),
+            'thumbnails': [
+                {'url': f'{self.thumb}?size={s}', 'width': s}
+                for s in (120, 320, 480, 640, 1280)]}
+
+
+def make_pafy_items(n_videos: int = 5000, seed: int = 42) -> List[FakePafy]:
+    rng = random.Random(seed)
+    return [FakePafy(rng, i) for i in range(n_videos)]
+
+
+def make_media_dir(path: str, n_files: int = 200) -> str:
+    """ Directory of tiny (but parseable) audio files
+    """
+    os.makedirs(path, exist_ok=True)
+    for i in range(n_files):
+        with wave.open(os.path.join(path, f'{i:05d}.wav'), 'wb') as fd:
+            fd.setnchannels(1)
+            fd.setsampwidth(1)
+            fd.setframerate(8000)
+            # distinct content, files are identified by it
+            fd.writeframes(i.to_bytes(4, 'big') + b'\x80' * 796)
+    return path
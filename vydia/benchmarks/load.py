@@ -0,0 +1,89 @@
+"""
+Binge whole playlists on simulated player to expose leaks and
+write amplification in the playback loop
+"""
+
+import gc
+import time
+import asyncio
+import tracemalloc
+
+from typing import Any, Dict
+
+from ..extra.player import SimulatedPlayer
+from .tui import TUIHarness
+from . import data
+
+
+def run_binge(
+    tmpdir: str,
+    n_episodes: int = 1000, speedup: float = 50_000, tick: float = 10,
+    jitter: float = .2, preload: bool = True, trace_memory: bool = True,
+    timeout: float = 600
+) -> Dict[str, Any]:
+    """ Play all episodes back to back (starting with first one)
+    """
+    playlist = data.make_playlist(
+        n_episodes, min_duration=30, max_duration=120)
+    player = SimulatedPlayer(
+        speedup=speedup, tick=tick, jitter=jitter, preload=preload, seed=42)
+
+    harness = TUIHarness(tmpdir, player=player, playlist=playlist)
+
+    # count writes of state file
+    writes = 0
+    save_state = harness.model._save_state
+
+    def counting_save(*args: Any, **kwargs: Any) -> None:
+        nonlocal writes
+        writes += 1
+        save_state(*args, **kwargs)
+    harness.model._save_state = counting_save  # type: ignore
+
+    async def binge() -> None:
+        while len(player.finished) < n_episodes:
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError(
+                    f'Only {len(player.finished)} episodes were played')
+            await asyncio.sleep(.05)
+
+    with harness:
+        harness.press('enter', label='open playlist')
+        harness.press('home', 'enter', label='play first episode')
+
+        gc.collect()
+        if trace_memory:
+            tracemalloc.start()
+            mem_start = tracemalloc.get_traced_memory()[0]
+        writes_start, draws_start = writes, harness.screen.draws
+
+        start = time.perf_counter()
+        harness.controller.aloop.run_until_complete(binge())
+        harness.wait()
+        duration = time.perf_counter() - start
+
+        gc.collect()
+        if trace_memory:
+            mem_end, mem_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        writes_binge = writes - writes_start
+        draws = harness.screen.draws - draws_start
+        position_updates = player.clock / tick
+
+    report = {
+        'episodes': len(player.finished),
+        'duration': duration,
+        'virtual_duration': player.clock,
+        'state_writes': writes_binge,
+        'state_writes_per_episode': writes_binge / n_episodes,
+        'redraws': draws,
+        'redraws_per_episode': draws / n_episodes,
+        'position_updates': position_updates,
+        'widgets': harness.widgets.count,
+        'last_saved': harness.model.get_current_video('Synthetic')
+    }  # type: Dict[str, Any]
+    if trace_memory:
+        report['memory_growth'] = mem_end - mem_start
+        report['memory_peak'] = mem_peak - mem_start
+    return report
@@ -0,0 +1,73 @@
+"""
+Memory retained by playlists of many videos
+"""
+
+import gc
+import tracemalloc
+
+from typing import Any, Dict, Optional
+
+from ..extra.plugins import Playlist, Video
+from . import data
+
+
+def get_rss() -> Optional[int]:
+    """ Resident set size in bytes (Linux only)
+    """
+    import os
+    try:
+        with open('/proc/self/statm') as fd:
+            return int(fd.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def release_memory() -> None:
+    """ Collect garbage and hand freed heap back to the OS (glibc only)
+    """
+    gc.collect()
+    try:
+        import ctypes
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def build_playlist(n_videos: int) -> Playlist:
+    """ Build YouTube playlist like `YoutubePlugin` does,
+        plugin objects are dropped afterwards
+    """
+    pl = Playlist()
+    for item in data.make_pafy_items(n_videos):
+        pl.append(Video.from_pafy(item))
+    return pl
+
+
+def measure_playlist(n_videos: int = 5000) -> Dict[str, Any]:
+    """ Report memory which stays alive after building playlist,
+        measured by tracemalloc and (separately) as resident set size
+    """
+    release_memory()
+    tracemalloc.start()
+    mem_start = tracemalloc.get_traced_memory()[0]
+    pl = build_playlist(n_videos)
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - mem_start
+    tracemalloc.stop()
+    del pl
+
+    # tracemalloc's bookkeeping would inflate resident memory
+    release_memory()
+    rss_start = get_rss()
+    pl = build_playlist(n_videos)
+    release_memory()
+    rss_end = get_rss()
+
+    assert len(pl) == n_videos
+    return {
+        'videos': n_videos,
+        'retained': retained,
+        'retained_per_video': retained / n_videos,
+        'rss_growth': rss_end - rss_start
+        if rss_start is not None and rss_end is not None else None
+    }
@@ -0,0 +1,117 @@
+"""
+Minimal benchmark registry, timer and result comparison
+"""
+
+import os
+import sys
+import time
+import platform
+import statistics
+import subprocess
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+# setup(scale, tmpdir) returns the callable to be timed
+Setup = Callable[[float, str], Callable[[], Any]]
+BENCHMARKS = {}  # type: Dict[str, Setup]
+
+
+def benchmark(name: str) -> Callable[[Setup], Setup]:
+    def decorator(func: Setup) -> Setup:
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+def time_func(
+    func: Callable[[], Any],
+    repeat: int = 5, min_time: float = .2
+) -> Dict[str, Any]:
+    """ Time `func` like `timeit`: calibrate number of loops,
+        then report per-call statistics over `repeat` runs
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        dur = time.perf_counter() - start
+        if dur >= min_time or number >= 1_000_000:
+            break
+        number *= 10 if dur < min_time / 10 else 2
+
+    timings = [dur / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+
+    return {
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.mean(timings),
+        'loops': number,
+        'repeat': repeat
+    }
+
+
+def get_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(__file__), stderr=subprocess.DEVNULL,
+            universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(
+    tmpdir: str,
+    names: Optional[Iterable[str]] = None,
+    scale: float = 1., repeat: int = 5, min_time: float = .2,
+    progress: Optional[Callable[[str, Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    from . import suite  # noqa: F401  (registers benchmarks)
+
+    results = {}
+    for name in sorted(names or BENCHMARKS):
+        bench_dir = os.path.join(tmpdir, name)
+        os.makedirs(bench_dir, exist_ok=True)
+
+        func = BENCHMARKS[name](scale, bench_dir)
+        results[name] = time_func(func, repeat=repeat, min_time=min_time)
+        if progress is not None:
+            progress(name, results[name])
+
+    return {
+        'commit': get_commit(),
+        'timestamp': time.time(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'scale': scale,
+        'results': results
+    }
+
+
+def compare_results(
+    old: Dict[str, Any], new: Dict[str, Any], threshold: float = .1
+) -> List[Tuple[str, float, float, float, bool]]:
+    """ Return (name, old, new, relative change, is regression) for all
+        benchmarks in both result sets, comparing minimal timings
+    """
+    rows = []
+    for name in sorted(set(old['results']) & set(new['results'])):
+        t_old = old['results'][name]['min']
+        t_new = new['results'][name]['min']
+        change = (t_new - t_old) / t_old if t_old > 0 else 0.
+        rows.append((name, t_old, t_new, change, change > threshold))
+    return rows
+
+
+def format_time(sec: float) -> str:
+    for unit, factor in (('s', 1), ('ms', 1e3), ('us', 1e6)):
+        if sec * factor >= 1:
+            return f'{sec * factor:.2f}{unit}'
+    return f'{sec * 1e9:.0f}ns'
@@ -0,0 +1,106 @@
+"""
+Benchmarks of model, plugin and controller hot paths
+"""
+
+import os
+import itertools
+
+from typing import Any, Callable
+
+from .runner import benchmark
+from . import data
+
+
+def scaled(n: int, scale: float) -> int:
+    return max(1, int(n * scale))
+
+
+def make_model(scale: float, tmpdir: str) -> Any:
+    from ..core.model import Model
+
+    fname = os.path.join(tmpdir, 'state.json')
+    data.write_state(
+        fname,
+        n_playlists=scaled(1000, scale), n_episodes=scaled(100_000, scale))
+    return Model(
+        state_fname=fname, log_fname=os.path.join(tmpdir, 'log.txt'))
+
+
+@benchmark('model.load_state')
+def bench_load_state(scale: float, tmpdir: str) -> Callable[[], Any]:
+    return make_model(scale, tmpdir)._load_state
+
+
+@benchmark('model.update_state')
+def bench_update_state(scale: float, tmpdir: str) -> Callable[[], Any]:
+    model = make_model(scale, tmpdir)
+    pid = next(iter(model.get_playlist_list()))
+    counter = itertools.count()
+
+    def run() -> None:
+        model.update_state(pid, {'episodes': {'new episode': {
+            'current_timestamp': f'00:00:{next(counter) % 60:02d}'}}})
+    return run
+
+
+@benchmark('utils.load_playlist')
+def bench_load_playlist(scale: float, tmpdir: str) -> Callable[[], Any]:
+    from ..extra.utils import load_playlist
+
+    path = data.make_media_dir(
+        os.path.join(tmpdir, 'media'), scaled(200, scale))
+    return lambda: load_playlist(path)
+
+
+@benchmark('utils.file_fingerprint')
+def bench_file_fingerprint(scale: float, tmpdir: str) -> Callable[[], Any]:
+    from ..extra.utils import file_fingerprint
+
+    path = data.make_media_dir(
+        os.path.join(tmpdir, 'media'), scaled(2000, scale))
+    paths = [entry.path for entry in os.scandir(path)]
+    return lambda: [file_fingerprint(p) for p in paths]
+
+
+@benchmark('controller.build_rows')
+def bench_build_rows(scale: float, tmpdir: str) -> Callable[[], Any]:
+    from ..core.controller import build_rows
+
+    playlist = data.make_playlist(scaled(10_000, scale))
+    episodes = {
+        vid.title: {'current_timestamp': '00:00:42'}
+        for vid in playlist[::2]}
+    return lambda: build_rows(playlist, episodes, 120)
+
+
+@benchmark('playlist.get_video_by_title')
+def bench_get_video_by_title(scale: float, tmpdir: str) -> Callable[[], Any]:
+    playlist = data.make_playlist(scaled(10_000, scale))
+    title = playlist[-1].title
+    return lambda: playlist.get_video_by_title(title)
+
+
+@benchmark('utils.ts_conversion')
+def bench_ts_conversion(scale: float, tmpdir: str) -> Callable[[], Any]:
+    from ..extra.utils import sec2ts, ts2sec
+
+    values = list(range(0, 86_400, 87))[:1000]
+
+    def run() -> None:
+        for sec in values:
+            ts2sec(sec2ts(sec))
+    return run
+
+
+@benchmark('utils.nested_dict_update')
+def bench_nested_dict_update(scale: float, tmpdir: str) -> Callable[[], Any]:
+    from ..extra.utils import nested_dict_update
+
+    state = data.make_state(
+        n_playlists=scaled(1000, scale), n_episodes=scaled(100_000, scale))
+    update = {
+        pid: {'episodes': {
+            title: {'current_timestamp': '00:00:01'}
+            for title in list(info['episodes'])[:10]}}
+        for pid, info in state.items()}
+    return lambda: nested_dict_update(state, update)
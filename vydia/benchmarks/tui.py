@@ -0,0 +1,255 @@
+"""
+Drive the TUI without terminal using a fake screen and player
+"""
+
+import os
+import time
+import asyncio
+import statistics
+
+from typing import (  # noqa: F401
+    TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple)
+
+import urwid
+
+from ..core import controller as controller_module
+from ..core.model import Model
+from ..core.controller import Controller
+from ..extra.player import BasePlayer, PlayerEvent
+from . import data
+
+if TYPE_CHECKING:
+    from ..extra.plugins import Playlist  # noqa: F401
+
+
+class HeadlessScreen(urwid.BaseScreen):
+    """ Screen of fixed size which only counts what would be drawn
+    """
+
+    def __init__(self, size: Tuple[int, int] = (120, 40)) -> None:
+        super().__init__()
+        self.size = size
+        self.draws = 0
+        self.last_canvas = None  # type: Any
+
+    def get_cols_rows(self) -> Tuple[int, int]:
+        return self.size
+
+    def draw_screen(self, size: Tuple[int, int], canvas: Any) -> None:
+        self.draws += 1
+        self.last_canvas = canvas
+
+    def hook_event_loop(self, event_loop: Any, callback: Any) -> None:
+        pass
+
+    def unhook_event_loop(self, event_loop: Any) -> None:
+        pass
+
+    def text(self) -> List[str]:
+        """ Content of last frame as list of lines
+        """
+        if self.last_canvas is None:
+            return []
+        return [line.decode() for line in self.last_canvas.text]
+
+
+class StubPlayer(BasePlayer):
+    """ Player which records calls and lets tests fire callbacks
+    """
+
+    def __init__(self) -> None:
+        self.calls = []  # type: List[Tuple[Any, ...]]
+        self.time_callback = None  # type: Optional[Callable[[float], None]]
+        self.event_callback = \
+            None  # type: Optional[Callable[[PlayerEvent], None]]
+
+    def setup(
+        self,
+        time_callback: Callable[[float], None],
+        event_callback: Callable[[PlayerEvent], None],
+        disable_video: bool = False
+    ) -> None:
+        self.time_callback = time_callback
+        self.event_callback = event_callback
+
+    def play_video(self, vid: str, title: str = '', start: int = 0) -> None:
+        self.calls.append(('play', title, start))
+
+    def toggle_pause(self) -> None:
+        self.calls.append(('pause',))
+
+    def shutdown(self) -> None:
+        self.calls.append(('shutdown',))
+
+    def display_text(self, txt: str, duration: int = 1000) -> None:
+        pass
+
+
+class WidgetCounter:
+    """ Count instantiated urwid widgets while active
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __enter__(self) -> 'WidgetCounter':
+        meta = type(urwid.Widget)
+        self._patched = '__call__' in meta.__dict__
+        self._orig_call = meta.__call__
+
+        def counting_call(cls: Any, *args: Any, **kwargs: Any) -> Any:
+            self.count += 1
+            return self._orig_call(cls, *args, **kwargs)
+        meta.__call__ = counting_call
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        meta = type(urwid.Widget)
+        if self._patched:
+            meta.__call__ = self._orig_call
+        else:
+            del meta.__call__
+
+
+class TUIHarness:
+    """ Controller on synthetic library, driven by scripted key presses
+    """
+
+    def __init__(
+        self,
+        tmpdir: str, n_videos: int = 500,
+        size: Tuple[int, int] = (120, 40), timeout: float = 30,
+        player: Optional[BasePlayer] = None,
+        playlist: Optional['Playlist'] = None
+    ) -> None:
+        """ Use directory of `n_videos` tiny files as playlist,
+            unless `playlist` is given
+        """
+        self.timeout = timeout
+        self.playlist = playlist
+
+        self.model = Model(
+            state_fname=os.path.join(tmpdir, 'state.json'),
+            log_fname=os.path.join(tmpdir, 'log.txt'))
+        if playlist is None:
+            media_dir = data.make_media_dir(
+                os.path.join(tmpdir, 'media'), n_videos)
+            self.model.update_state('Synthetic', {
+                'id': media_dir, 'episodes': {},
+                'current': {'title': '00002.wav', 'timestamp': '00:00:00'}})
+        else:
+            self.model.update_state(
+                'Synthetic', {'id': playlist.id, 'episodes': {}})
+
+        self.screen = HeadlessScreen(size)
+        self.player = player or StubPlayer()
+        self.controller = Controller(
+            self.player,
+            {'show_video': False, 'show_titles': False,
+             'preload': self.player.supports_preload},
+            screen=self.screen, model=self.model)
+
+        self.steps = []  # type: List[Dict[str, Any]]
+        self.frame_times = []  # type: List[float]
+        self.widgets = WidgetCounter()
+        self._instrument_draws()
+
+    def _instrument_draws(self) -> None:
+        loop = self.controller.loop
+        orig_draw = loop.draw_screen
+
+        def timed_draw() -> None:
+            start = time.perf_counter()
+            orig_draw()
+            self.frame_times.append(time.perf_counter() - start)
+        loop.draw_screen = timed_draw  # type: ignore
+
+    def __enter__(self) -> 'TUIHarness':
+        if self.playlist is not None:
+            # serve given playlist instead of asking plugins
+            self._load_playlist = controller_module.load_playlist
+            controller_module.load_playlist = \
+                lambda _id: ('SyntheticPlaylist', self.playlist)
+
+        self.controller.__enter__()
+        self.widgets.__enter__()
+
+        self.screen.start()
+        self.controller.view.show_playlist_overview()
+        self.controller.loop.draw_screen()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.duration = time.perf_counter() - self._start
+        self.widgets.__exit__()
+        self.screen.stop()
+        self.controller.__exit__(*args)
+
+        if self.playlist is not None:
+            controller_module.load_playlist = self._load_playlist
+
+    def wait(self) -> None:
+        """ Process pending tasks and callbacks
+        """
+        async def drain() -> None:
+            # let threadsafe callbacks and task callbacks run
+            await asyncio.sleep(0)
+            while len(self.controller.tasks) > 0:
+                await asyncio.wait(
+                    list(self.controller.tasks), timeout=self.timeout)
+                await asyncio.sleep(0)
+
+        self.controller.aloop.run_until_complete(drain())
+
+    def press(self, *keys: str, label: Optional[str] = None) -> float:
+        """ Feed keys, wait for resulting work and draw screen
+        """
+        widgets, draws = self.widgets.count, self.screen.draws
+
+        start = time.perf_counter()
+        for key in keys:
+            self.controller.loop.process_input([key])
+            self.wait()
+        self.controller.loop.draw_screen()
+        dur = time.perf_counter() - start
+
+        self.steps.append({
+            'label': label or ' '.join(keys),
+            'time': dur,
+            'widgets': self.widgets.count - widgets,
+            'redraws': self.screen.draws - draws
+        })
+        return dur
+
+    def run_scenario(self) -> None:
+        """ Open playlist, scroll, (un)mark, play, skip and search
+        """
+        self.press('enter', label='open playlist')
+        self.press(*['down'] * 20, label='scroll 20 rows')
+        self.press('page down', 'page down', label='page down x2')
+        self.press('w', label='mark watched')
+        self.press('w', label='mark unwatched')
+        self.press('c', label='continue')
+        self.press('>', label='next video')
+        self.press('<', label='previous video')
+        self.press('/', *'0042', label='search')
+        self.press('enter', 'n', 'N', label='cycle matches')
+        self.press('end', 'home', label='jump to end and back')
+
+    def report(self) -> Dict[str, Any]:
+        frames = sorted(self.frame_times)
+        duration = getattr(self, 'duration', None) \
+            or time.perf_counter() - self._start
+        return {
+            'frames': len(frames),
+            'frame_time': {
+                'min': frames[0],
+                'median': statistics.median(frames),
+                'p95': frames[int(.95 * (len(frames) - 1))],
+                'max': frames[-1]
+            } if len(frames) > 0 else {},
+            'widgets': self.widgets.count,
+            'redraws_per_second': self.screen.draws / duration,
+            'steps': self.steps
+        }
@@ -1,5 +1,23 @@
-from .controller import Controller
+import sys
+import types
+
+from typing import Any
+
 from .model import Model
 
 
 __all__ = ['Controller', 'Model']
+
+
+class _LazyModule(types.ModuleType):
+    # module-level `__getattr__` needs Python 3.7
+    def __getattr__(self, name: str) -> Any:
+        # urwid is only needed once the TUI is started
+        if name == 'Controller':
+            from .controller import Controller
+            return Controller
+        raise AttributeError(
+            f'module {self.__name__!r} has no attribute {name!r}')
+
+
+sys.modules[__name__].__class__ = _LazyModule
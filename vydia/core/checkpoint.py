@@ -0,0 +1,71 @@
+"""
+Rate-limited checkpoints of the playback position
+"""
+
+import time
+import collections
+
+from typing import Callable, Deque, Optional, Tuple  # noqa: F401
+
+
+class Checkpointer:
+    """ Decide which position updates are worth persisting
+
+        Positions are written every `interval` seconds (right away on
+        pause or seek), only if they moved by at least `threshold`
+        seconds since the last write, and at most `max_per_minute`
+        times per minute.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[str, str, str, int], None],
+        interval: float = 10, threshold: int = 5, max_per_minute: int = 6,
+        seek_jump: int = 10, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.write = write
+        self.interval = interval
+        self.threshold = threshold
+        self.max_per_minute = max_per_minute
+        self.seek_jump = seek_jump
+        self.clock = clock
+
+        self._saved = None  # type: Optional[Tuple[str, str, int]]
+        self._seen = None  # type: Optional[Tuple[str, str, int]]
+        self._last_write = float('-inf')
+        self._writes = collections.deque()  # type: Deque[float]
+
+    def saved(self, pid: str, vid_id: str, title: str, ts: int) -> None:
+        """ Position was persisted elsewhere (e.g. full state save)
+        """
+        self._saved = (pid, vid_id, ts)
+
+    def update(
+        self, pid: str, vid_id: str, title: str, ts: int, force: bool = False
+    ) -> bool:
+        """ Handle new position, return whether it was written
+        """
+        now = self.clock()
+
+        # position jumped further than playback could have advanced
+        seen, self._seen = self._seen, (pid, vid_id, ts)
+        if seen is not None and seen[:2] == (pid, vid_id) \
+                and abs(ts - seen[2]) >= self.seek_jump:
+            force = True
+
+        if self._saved is not None and self._saved[:2] == (pid, vid_id) \
+                and abs(ts - self._saved[2]) < self.threshold:
+            return False
+        if not force and now - self._last_write < self.interval:
+            return False
+
+        while len(self._writes) > 0 and now - self._writes[0] >= 60:
+            self._writes.popleft()
+        if len(self._writes) >= self.max_per_minute:
+            return False
+
+        self._writes.append(now)
+        self._last_write = now
+        self._saved = (pid, vid_id, ts)
+        self.write(pid, vid_id, title, ts)
+        return True
@@ -1,22 +1,33 @@
+import os
 import sys
+import time
 import shlex
+import asyncio
 import logging
+import functools
 import threading
+from concurrent.futures import (  # noqa: F401
+    Executor, Future, ThreadPoolExecutor)
 
 import urwid
 
 import logzero
 from logzero import logger
 
-from typing import Any, Iterable, Optional, Dict, TYPE_CHECKING
+from typing import (  # noqa: F401
+    Any, Callable, Iterable, Optional, Dict, List, Set, Tuple, TYPE_CHECKING)
 
 from .model import Model
 from .view import View
+from .checkpoint import Checkpointer
 from ..extra.player import PlayerEvent, BasePlayer
 from ..extra.utils import load_playlist, sec2ts, ts2sec, shorten_msg
+from ..extra.search import TitleIndex
+from ..extra import metrics, profiling, plugin_pool, log_queue
 
 if TYPE_CHECKING:
     from ..extra.plugins import Video, Playlist  # noqa: F401
+    from ..extra.watcher import BaseWatcher  # noqa: F401
 
 
 HELP_TEXT = '''
@@ -31,10 +42,13 @@ Help Page
 
 Summon the internal commandline by typing `:`.
 Press `[TAB]` for autocomplete.
+Search the current list by typing `/`, jump between matches with `n`/`N`.
+While something is loading, `[ESC]` (or `cancel`) stops waiting for it.
 
 The following commands are supported (in the correct context):
 * Playlist View:
   * `add <playlist id>`: add given playlist
+  * `continue`: list videos to resume across all playlists (`[c]`)
   * `delete`: delete currently selected playlist
   * `quit`: quit Vydia (`[q]`)
 * Episode View:
@@ -46,20 +60,71 @@ The following commands are supported (in the correct context):
   * `next`: play next video (`[>]`)
   * `previous`: play previous video (`[<]`)
   * `continue`: continue playback from last save (`[c]`)
+  * `watched [range]`: mark selection or range (`1-40,45`, `all`) as watched
+  * `unwatched [range]`: same, but mark as unwatched
+  * `mark-until-focus`: mark all videos before the focused one as watched
+  * `select [range]`: add range (default: focused video) to selection
+  * `unselect`: clear selection
   * `quit`: quit Vydia (`[q]`)
 
 Furthermore, the following shortcuts exist:
 * Episode View:
-  * `w`: (un)mark currently selected video as watched
+  * `w`: (un)mark focused video (or all selected ones) as watched
+  * `m`: (un)select focused video
 
 Also, try executing `vydia --help`.
 '''
 
 
+def log_failure(future: 'Future[Any]') -> None:
+    if future.exception() is not None:
+        logger.error(f'Background task failed: {future.exception()!r}')
+
+
+@functools.lru_cache(maxsize=1 << 15)
+def format_row(
+    vid_tit: str, vid_len: int, timestamp: str, cols: int
+) -> Tuple[str, int]:
+    """ Return line of video and watched seconds,
+        cached since rows rarely change between updates
+    """
+    vid_ts = ts2sec(timestamp)
+    vid_perc = round((vid_ts / vid_len) * 100) \
+        if vid_len > 0 else 0
+    vid_perc = min(vid_perc, 100)
+
+    vid_tit = shorten_msg(vid_tit, cols-20)
+    spaces = ' ' * (cols - len(vid_tit) - 19)
+    return f'{vid_tit}{spaces} {sec2ts(vid_len):<10}{vid_perc:>3}%', vid_ts
+
+
+def build_rows(
+    playlist: 'Playlist', episodes: Dict[str, Dict[str, str]], cols: int
+) -> Tuple[List[str], int]:
+    """ Format one line per video, also return total watched seconds
+    """
+    total_video_ts = 0
+    rows = []
+    for vid in playlist:
+        vid_id = vid.id
+        timestamp = episodes[vid_id]['current_timestamp'] \
+            if vid_id in episodes else '00:00:00'
+
+        row, vid_ts = format_row(vid.title, vid.duration, timestamp, cols)
+        total_video_ts += vid_ts
+        rows.append(row)
+    return rows, total_video_ts
+
+
 class Controller:
+    PROGRESS_INTERVAL = .25
+    MIN_FRAME_INTERVAL = 1 / 30
+
     def __init__(
         self,
-        player_backend: BasePlayer, config: Dict[str, Any]
+        player_backend: BasePlayer, config: Dict[str, Any],
+        screen: Optional[urwid.BaseScreen] = None,
+        model: Optional[Model] = None
     ) -> None:
         self.config = config
         self.player_backend = player_backend
@@ -69,12 +134,36 @@ class Controller:
         self.input_callback = None
         self.player = None  # type: Optional[PlayerQueue]
 
-        self.model = Model()
+        self.model = model or Model()
         self.view = View(self)
 
+        # UI runs on asyncio loop, blocking work is done by executor
+        self.aloop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(
+            max_workers=4, thread_name_prefix='vydia-task')
+        # single worker keeps state writes in order
+        self.state_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='vydia-state')
+        self.tasks = {}  # type: Dict[asyncio.Task, Tuple[str, float]]
+
+        # persist position while playing to survive crashes
+        interval = config.get('checkpoint_interval', 10)
+        self.checkpointer = Checkpointer(
+            self._write_checkpoint, interval=interval
+        ) if interval > 0 else None  # type: Optional[Checkpointer]
+
+        self._ui_thread = threading.get_ident()
+        self._progress_alarm = None  # type: Any
+        self._redraw_pending = False
+        self._last_redraw = 0.
+
         self.loop = urwid.MainLoop(
             self.view, unhandled_input=self._unhandled_input,
-            palette=[('reversed', 'standout', '')])
+            palette=[
+                ('reversed', 'standout', ''),
+                ('selected', 'light green', '')],
+            event_loop=urwid.AsyncioEventLoop(loop=self.aloop),
+            screen=screen)
 
         self._setup_logging()
 
@@ -85,18 +174,32 @@ class Controller:
     def __exit__(
         self, exc_type: Any, exc_value: Any, traceback: Any
     ) -> None:
+        self.cancel_tasks()
+        if self.player is not None:
+            self.player.close()
+        self.executor.shutdown(wait=False)
+        self.state_executor.shutdown(wait=True)
+
         self.save_state()
         if self.player is not None:
             self.player_backend.shutdown()
+        self.aloop.close()
         logger.info(f'Destroy controller')
+        self.log_queue.stop()
 
     def _setup_logging(self) -> None:
         # init logzero
+        log_queue.uninstall(logger)
         logzero.loglevel(logging.WARNING)
         logzero.logfile(
             self.model.LOG_FILE,
             maxBytes=1e6, backupCount=3)
 
+        # file I/O must not stall UI and player callbacks
+        self.log_queue = log_queue.QueueLogging(
+            logger, json_lines=self.config.get('log_json', False))
+        self.log_queue.start()
+
         # enforce logging of unhandled exceptions
         def handle_exception(exc_type, exc_value, exc_traceback):
             logger.error(
@@ -106,10 +209,91 @@ class Controller:
 
     def main(self) -> None:
         self.view.show_playlist_overview()
+        if self.config.get('state_gc', False):
+            self.run_task(
+                self.model.collect_garbage, msg='Cleaning up state',
+                callback=lambda stats: logger.info(
+                    f'Collected garbage of state: {stats}'),
+                executor=self.state_executor)
         self.loop.run()
 
+    def run_task(
+        self,
+        func: Callable[..., Any], *args: Any,
+        msg: str = 'Working', callback: Optional[Callable[[Any], None]] = None,
+        executor: Optional[Executor] = None
+    ) -> asyncio.Task:
+        """ Run blocking `func` in executor and pass its result
+            to `callback` on the UI thread
+        """
+        async def runner() -> None:
+            try:
+                result = await self.aloop.run_in_executor(
+                    executor or self.executor,
+                    profiling.wrap(functools.partial(func, *args)))
+            except Exception as err:
+                logger.exception(f'Task "{msg}" failed')
+                self.send_msg(f'Error: {err}')
+                return
+            finally:
+                self.tasks.pop(task, None)
+
+            if len(self.tasks) == 0:
+                self.send_msg(f'{msg}: done')
+            if callback is not None:
+                callback(result)
+
+        task = self.aloop.create_task(runner())
+        self.tasks[task] = (msg, time.monotonic())
+        self._show_progress()
+        return task
+
+    def cancel_tasks(self) -> None:
+        """ Stop waiting for running tasks, their results are discarded
+        """
+        for task, (msg, _) in list(self.tasks.items()):
+            task.cancel()
+            self.send_msg(f'Cancelled: {msg}')
+        self.tasks.clear()
+
+        # do not leave plugins running in the background
+        plugin_pool.cancel()
+
+    def _show_progress(self, *args: Any) -> None:
+        if self._progress_alarm is not None:
+            self.loop.remove_alarm(self._progress_alarm)
+            self._progress_alarm = None
+        if len(self.tasks) == 0 or self.view.widget is None:
+            return
+
+        msg, start = min(self.tasks.values(), key=lambda x: x[1])
+        others = f' (+{len(self.tasks) - 1})' if len(self.tasks) > 1 else ''
+        self.send_msg(
+            f'{msg}{others}... {time.monotonic() - start:.1f}s '
+            '[ESC to cancel]')
+
+        self._progress_alarm = self.loop.set_alarm_in(
+            self.PROGRESS_INTERVAL, self._show_progress)
+
+    def call_in_ui(self, func: Callable[..., Any], *args: Any) -> None:
+        """ Run `func` on UI thread (immediately if already there)
+        """
+        def wrapper() -> None:
+            try:
+                func(*args)
+            except Exception:
+                logger.exception(f'UI callback {func} failed')
+
+        if threading.get_ident() == self._ui_thread:
+            wrapper()
+        elif not self.aloop.is_closed():
+            self.aloop.call_soon_threadsafe(wrapper)
+
     def _unhandled_input(self, key: str) -> None:
-        if key in ('Q', 'q', 'esc'):
+        if key == 'esc' and len(self.tasks) > 0:
+            self.cancel_tasks()
+            return None
+        elif key in ('Q', 'q', 'esc'):
             raise urwid.ExitMainLoop()
         elif key == ':':
             self.view.show_cmdline()
@@ -117,6 +301,12 @@ class Controller:
         elif key == 'h':
             self.show_helpscreen()
             return None
+        elif key == '/':
+            self.view.show_search()
+            return None
+        elif key in ('n', 'N') and self.view.widget is not None:
+            self.view.widget.jump_to_match(1 if key == 'n' else -1)
+            return None
 
     def handle_cmdline_input(self, msg: str) -> None:
         if len(msg) == 0:
@@ -124,18 +314,90 @@ class Controller:
 
         if msg.lower() in ('q', 'quit'):
             raise urwid.ExitMainLoop()
+        if msg.lower() == 'cancel':
+            self.cancel_tasks()
+            return
 
         if self.view.widget is not None:
             cmd, *args = shlex.split(msg)
             logger.info(f'Executing command {cmd} with "{args}"')
             self.view.widget.handle_command(cmd, args=args)
 
-    def on_playlist_selected(self, playlist_id: str) -> None:
+    def on_playlist_selected(self, playlist_id: str) -> asyncio.Task:
         self.current_playlist = playlist_id
         logger.info(f'Selected playlist {self.current_playlist}')
 
         self.view.show_episode_overview()
-        self._init_player()
+        return self._init_player()
+
+    def show_continue_watching(self) -> None:
+        """ List videos to resume across playlists, without loading any
+        """
+        self.view.show_continue_overview()
+        v = self.view.widget
+
+        def show(entries: List[Dict[str, Any]]) -> None:
+            if self.view.widget is not v:
+                return
+            cols, _ = self.loop.screen.get_cols_rows()
+            rows = [
+                format_row(
+                    f'{entry["playlist"]}: {entry["title"]}',
+                    entry['duration'], entry['timestamp'], cols)[0]
+                for entry in entries]
+            v.set_entries(entries, rows)
+
+        self.run_task(
+            self.model.get_continue_watching,
+            msg='Loading continue list', callback=show)
+
+    def on_continue_selected(self, entry: Dict[str, Any]) -> None:
+        """ Open playlist of continue-watching entry and play its video,
+            using the playlist as cached by its last load unless the
+            video's stream is gone
+        """
+        pid = entry['playlist']
+        self.current_playlist = pid
+        logger.info(f'Continuing playlist {pid}')
+        self.view.show_episode_overview()
+
+        def lookup() -> Optional['Playlist']:
+            playlist = self.model.get_cached_playlist(pid)
+            vid = playlist.get_video_by_id(entry['id'])[1] \
+                if playlist is not None else None
+            if vid is None:
+                return None
+
+            try:
+                stream = vid.get_file_stream()
+            except Exception as err:
+                logger.info(f'Stream of "{vid.title}" expired: {err!r}')
+                return None
+            if '://' not in stream and not os.path.exists(stream):
+                return None
+            return playlist
+
+        def play(_: asyncio.Task) -> None:
+            if self.current_playlist != pid or self.player is None \
+                    or self.player.playlist is None:
+                return
+            idx, vid = self.player.playlist.get_video_by_id(entry['id'])
+            if vid is None:
+                self.send_msg(f'Could not find video "{entry["title"]}"')
+                return
+
+            self.view.widget.focus_item(idx)
+            self.send_msg(
+                f'Resuming "{vid.title}" at {entry["timestamp"]}')
+            self.player.play_video(vid, ts2sec(entry['timestamp']))
+
+        def open_playlist(playlist: Optional['Playlist']) -> None:
+            if self.current_playlist != pid:
+                return
+            # without (valid) cache, the plugin is asked again
+            self._init_player(playlist).add_done_callback(play)
+
+        self.run_task(lookup, msg='Loading playlist', callback=open_playlist)
 
     def on_video_selected(self, video_display_name: str) -> None:
         if self.player is None:
@@ -173,45 +435,58 @@ class Controller:
             raise RuntimeError('Current playlist is not set')
         logger.info(f'Continue playback')
 
-        _cur = self.model.get_current_video(self.current_playlist)
+        def resume(_cur: Optional[Dict[str, str]]) -> None:
+            assert self.player is not None and self.player.playlist is not None
 
-        if _cur is None:
-            self.send_msg('Nothing to resume...')
-            return
+            if _cur is None:
+                self.send_msg('Nothing to resume...')
+                return
 
-        i, vid = self.player.playlist.get_video_by_title(_cur['title'])
-        self.send_msg(f'Resuming "{_cur["title"]}" at {_cur["timestamp"]}')
+            i, vid = self.player.playlist.find_video(_cur)
+            if vid is None:
+                self.send_msg(f'Could not find video "{_cur["title"]}"')
+                return
 
-        if vid is not None:
+            self.send_msg(
+                f'Resuming "{_cur["title"]}" at {_cur["timestamp"]}')
             self.player.play_video(vid, ts2sec(_cur['timestamp']))
-        else:
-            raise RuntimeError(f'Could not find video "{_cur["title"]}"')
+
+        self.run_task(
+            self.model.get_current_video, self.current_playlist,
+            msg='Loading last position', callback=resume)
 
     def mark_watched(self, entry_idx: int) -> None:
+        """ Toggle watched state of single video
+        """
+        self.mark_episodes([entry_idx], watched=None)
+
+    def mark_episodes(
+        self, indices: Iterable[int], watched: Optional[bool] = True
+    ) -> None:
+        """ (Un)mark many videos with one state write and one view update,
+            toggle each one if `watched` is None
+        """
         assert self.player is not None
         assert self.player.playlist is not None
         assert self.current_playlist is not None
 
-        vid = self.player.playlist[entry_idx]
-        assert vid is not None
-
-        # mark as unwatched if already watched
-        new_ts = sec2ts(vid.duration)
-        _state = self.model.get_playlist_info(self.current_playlist)
-        if vid.title in _state['episodes']:
-            if _state['episodes'][vid.title]['current_timestamp'] == new_ts:
-                new_ts = sec2ts(0)
+        playlist = self.player.playlist
+        videos = [
+            (vid.id, vid.title, vid.duration)
+            for vid in (playlist[i] for i in indices)]
+        pid = self.current_playlist
 
-        self.model.update_state(
-            self.current_playlist, {
-                'episodes': {
-                    vid.title: {
-                        'current_timestamp': new_ts
-                    }
-                }
-            })
+        def refresh(playlist_state: Dict[str, Any]) -> None:
+            if self.player is not None \
+                    and self.current_playlist == pid:
+                self.player.setup(
+                    reload_playlist=False, playlist_state=playlist_state)
 
-        self.player.setup(reload_playlist=False)
+        self.run_task(
+            self.model.mark_watched, pid, videos, watched,
+            msg='Saving' if len(videos) == 1
+            else f'Marking {len(videos)} videos',
+            callback=refresh, executor=self.state_executor)
 
     def show_video_info(self, entry_idx: int) -> None:
         assert self.player is not None
@@ -220,16 +495,30 @@ class Controller:
         vid = self.player.playlist[entry_idx]
         assert vid is not None
 
-        self.view.show_long_text(vid.get_info(), exit_key='i')
+        self.run_task(
+            vid.get_info, msg='Loading video info',
+            callback=lambda info: self.view.show_long_text(
+                info, exit_key='i'))
 
     def show_helpscreen(self) -> None:
         self.view.show_long_text(HELP_TEXT, exit_key='h')
 
-    def _init_player(self) -> None:
+    def _init_player(
+        self, playlist: Optional['Playlist'] = None
+    ) -> asyncio.Task:
+        """ Set up player for current playlist, loaded by plugin
+            unless (cached) `playlist` is given
+        """
+        if self.player is not None:
+            self.player.close()
         self.player = PlayerQueue(self)
-        self.player.setup(reset_position=True)
+        if playlist is None:
+            return self.player.setup(reset_position=True)
+
+        self.player.playlist = playlist
+        return self.player.setup(reload_playlist=False, reset_position=True)
 
-    def save_state(self) -> None:
+    def save_state(self, background: bool = False) -> None:
         if self.player is not None:
             logger.info('Explicit state save')
             assert self.current_playlist is not None
@@ -238,133 +527,295 @@ class Controller:
             if self.player.current_vid is not None:
                 assert self.player.ts is not None
 
-                self.model.update_state(
-                    self.current_playlist, {
-                        'current': {
-                            'title': self.player.current_vid.title,
-                            'timestamp': sec2ts(self.player.ts)
-                        },
-                        'episodes': {
-                            self.player.current_vid.title: {
-                                'current_timestamp': sec2ts(self.player.ts)
-                            }
-                        }
-                    })
+                vid = self.player.current_vid
+                args = (
+                    self.current_playlist, vid.id, vid.title, self.player.ts)
+                if background:
+                    # quietly, to not redraw status bar on every episode
+                    self.state_executor.submit(
+                        profiling.wrap(self.model.save_progress), *args
+                    ).add_done_callback(log_failure)
+                else:
+                    self.model.save_progress(*args)
+
+                if self.checkpointer is not None:
+                    self.checkpointer.saved(*args)
+
+    def checkpoint(self, force: bool = False) -> None:
+        """ Persist current position if checkpointer deems it necessary
+        """
+        if self.checkpointer is None or self.player is None \
+                or self.player.current_vid is None or self.player.ts is None:
+            return
+        assert self.current_playlist is not None
+
+        vid = self.player.current_vid
+        self.checkpointer.update(
+            self.current_playlist, vid.id, vid.title, self.player.ts,
+            force=force)
+
+    def _write_checkpoint(
+        self, pid: str, vid_id: str, title: str, ts: int
+    ) -> None:
+        self.state_executor.submit(
+            profiling.wrap(self.model.checkpoint_progress),
+            pid, vid_id, title, ts
+        ).add_done_callback(log_failure)
 
     def assemble_info_box(self) -> None:
         if self.current_playlist is None:
             raise RuntimeError('Current playlist is not set')
 
         logger.info('Assembling info box')
-        _cur = self.model.get_current_video(self.current_playlist)
+        self.run_task(
+            self.model.get_current_video, self.current_playlist,
+            msg='Loading state', callback=self.show_info_box)
 
+    def show_info_box(self, _cur: Optional[Dict[str, str]]) -> None:
         if _cur is not None:
             txt = f'Resume: "{_cur["title"]}" ({_cur["timestamp"]})'
         else:
             txt = 'Nothing to resume'
 
-        assert self.view.widget is not None, 'Widget has not been assembled'
-        self.view.widget.update_info_box(txt)
+        # view may have been switched while state was loading
+        if hasattr(self.view.widget, 'update_info_box'):
+            self.view.widget.update_info_box(txt)
+
+    def toggle_pause(self) -> None:
+        self.checkpoint(force=True)
+        self.run_task(self.player_backend.toggle_pause, msg='Pausing')
 
     def send_msg(self, msg: str) -> None:
         assert self.view.widget is not None, 'Widget has not been assembled'
         self.view.widget.update_info_text(msg)
 
     def update_views(self) -> None:
-        if not self.loop.screen.started:
+        """ Schedule redraw, multiple updates in one loop iteration
+            result in a single frame
+        """
+        if not self.loop.screen.started or self._redraw_pending:
             return None
 
-        self.loop.draw_screen()
+        self._redraw_pending = True
+        self.aloop.call_soon_threadsafe(self._schedule_redraw)
+
+    def _schedule_redraw(self) -> None:
+        # limit frame rate when updates arrive faster than it
+        wait = self._last_redraw + self.MIN_FRAME_INTERVAL - self.aloop.time()
+        if wait > 0:
+            self.aloop.call_later(wait, self._redraw)
+        else:
+            self._redraw()
+
+    def _redraw(self) -> None:
+        metrics.inc('redraws')
+        self._redraw_pending = False
+        self._last_redraw = self.aloop.time()
+        if self.loop.screen.started:
+            self.loop.draw_screen()
 
 
 class PlayerQueue:
     def __init__(self, controller: Controller) -> None:
         self.controller = controller
+
+        # backends call back from their own threads
         self.controller.player_backend.setup(
-            self.handle_mpv_pos, self.handle_mpv_event,
+            functools.partial(self.controller.call_in_ui, self.handle_mpv_pos),
+            functools.partial(
+                self.controller.call_in_ui, self.handle_mpv_event),
             disable_video=not self.controller.config['show_video'])
 
         if self.controller.current_playlist is None:
             raise RuntimeError('Current playlist is not set')
+        self.backend_name = type(self.controller.player_backend).__name__
         self.id = self.controller.model.get_playlist_info(
             self.controller.current_playlist)['id']
 
         self.playlist = None  # type: Optional['Playlist']
         self.current_vid = None  # type: Optional['Video']
+        self.preloaded_vid = None  # type: Optional['Video']
         self.ts = None  # type: Optional[int]
         self.item_list = None  # type: Optional[List[str]]
 
+        # time of last video selection, until its first position update
+        self._selected_at = None  # type: Optional[float]
+
+        # picks up changes of directory playlists (if enabled)
+        self.watcher = None  # type: Optional[BaseWatcher]
+        self._file_changes = []  # type: List[Tuple[Set[str], Set[str]]]
+        self._updating = False
+        self._closed = False
+
+    def close(self) -> None:
+        self._closed = True
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+
     def setup(
         self,
-        reload_playlist: bool = True, reset_position: bool = False
-    ) -> None:
-        def tmp() -> None:
+        reload_playlist: bool = True, reset_position: bool = False,
+        playlist_state: Optional[Dict[str, Any]] = None
+    ) -> asyncio.Task:
+        """ Load playlist (unless already there) and show it, using
+            `playlist_state` instead of reading it again if given
+        """
+        pid = self.controller.current_playlist
+        assert pid is not None
+        v = self.controller.view.widget
+        assert v is not None, 'Widget has not been assembled'
+
+        def load() -> Tuple[Optional[str], 'Playlist', Dict[str, Any],
+                            Optional[TitleIndex]]:
+            plugin_name = None
             if reload_playlist:
-                self.controller.send_msg('Loading...')
-
-                plugin_name, self.playlist = load_playlist(self.id)
-                self.controller.send_msg(
-                    f'Loaded playlist with {plugin_name}')
+                plugin_name, playlist = load_playlist(self.id)
+                self.controller.model.migrate_episodes(pid, playlist)
+                self.controller.model.cache_playlist(pid, playlist)
             else:
                 assert self.playlist is not None, \
                     'Playlist has not been loaded'
+                playlist = self.playlist
 
-            state = self.controller.model._load_state()
-            playlist_state = state[self.controller.current_playlist]
+            state = playlist_state if playlist_state is not None \
+                else self.controller.model._load_state()[pid]
 
-            v = self.controller.view.widget
-            assert v is not None, 'Widget has not been assembled'
+            # building search index is too slow for UI thread
+            titles = [vid.title for vid in playlist]
+            index = None
+            if v.search is None or v.search.index.source != titles:
+                index = TitleIndex(titles)
 
-            # adjust video title display
-            total_video_ts = 0
-            self.item_list = []
-            cols, _ = self.controller.loop.screen.get_cols_rows()
-            for vid in self.playlist:
-                vid_tit = vid.title
-                vid_len = vid.duration
+            return plugin_name, playlist, state, index
 
-                if vid_tit in playlist_state['episodes']:
-                    vid_info = playlist_state['episodes'][vid_tit]
-                    vid_ts = ts2sec(vid_info['current_timestamp'])
-                else:
-                    vid_ts = 0
-                total_video_ts += vid_ts
-                vid_perc = round((vid_ts / vid_len) * 100) \
-                    if vid_len > 0 else 0
-                vid_perc = min(vid_perc, 100)
-
-                vid_tit = shorten_msg(vid_tit, cols-20)
-                spaces = ' ' * (cols - len(vid_tit) - 19)
-                cur = f'{vid_tit}{spaces} {sec2ts(vid_len):<10}{vid_perc:>3}%'
-                self.item_list.append(cur)
-
-            v.set_items(self.item_list)
-
-            # set episode-view title
-            total_video_perc = round(
-                (total_video_ts / self.playlist.duration) * 100) \
-                if self.playlist.duration > 0 else 0
-            total_video_perc = min(total_video_perc, 100)
-            pl_tit = shorten_msg(self.playlist.title, cols-20)
-            spaces = ' ' * (cols - len(pl_tit) - 17)
-            v.set_title(
-                f'{pl_tit}{spaces} '
-                f'{sec2ts(self.playlist.duration):<10}'
-                f'{total_video_perc:>3}%')
-            self.controller.assemble_info_box()
-
-            # set list focus to video watched was played last
-            if reset_position:
-                assert self.controller.current_playlist is not None
-                _cur = self.controller.model.get_current_video(
-                    self.controller.current_playlist)
-                if _cur is not None:
-                    idx, _ = self.playlist.get_video_by_title(_cur['title'])
-                    v.vid_list.set_focus(idx)
-                    self.controller.update_views()
-
-        t = threading.Thread(target=tmp)
-        t.start()
+        def show(result: Tuple[Optional[str], 'Playlist', Dict[str, Any],
+                               Optional[TitleIndex]]) -> None:
+            plugin_name, self.playlist, playlist_state, index = result
+            if plugin_name is not None:
+                self.controller.send_msg(
+                    f'Loaded playlist with {plugin_name}')
+            if index is not None:
+                v.set_search_index(index)
+            self._show_playlist(v, playlist_state, reset_position)
+
+            if plugin_name == 'FilesystemPlugin' \
+                    and self.controller.config.get('watch', False):
+                self._watch()
+
+        if reload_playlist:
+            self.controller.send_msg('Loading...')
+        return self.controller.run_task(
+            load, msg='Loading playlist', callback=show)
+
+    def _show_playlist(
+        self,
+        v: Any, playlist_state: Dict[str, Any], reset_position: bool
+    ) -> None:
+        assert self.playlist is not None
+
+        # adjust video title display
+        cols, _ = self.controller.loop.screen.get_cols_rows()
+        self.item_list, total_video_ts = build_rows(
+            self.playlist, playlist_state.get('episodes', {}), cols)
+
+        v.set_items(
+            self.item_list, titles=[vid.title for vid in self.playlist])
+
+        # set episode-view title
+        total_duration = self.playlist.duration
+        total_video_perc = round(
+            (total_video_ts / total_duration) * 100) \
+            if total_duration > 0 else 0
+        total_video_perc = min(total_video_perc, 100)
+        pl_tit = shorten_msg(self.playlist.title, cols-20)
+        spaces = ' ' * (cols - len(pl_tit) - 17)
+        v.set_title(
+            f'{pl_tit}{spaces} '
+            f'{sec2ts(total_duration):<10}'
+            f'{total_video_perc:>3}%')
+
+        _cur = playlist_state.get('current', None)
+        self.controller.show_info_box(_cur)
+
+        # set list focus to video watched was played last
+        if reset_position and _cur is not None:
+            idx, _ = self.playlist.find_video(_cur)
+            if idx is not None:
+                v.vid_list.set_focus(idx)
+                self.controller.update_views()
+
+    def _watch(self) -> None:
+        """ (Re)start watching directory behind playlist
+        """
+        assert self.playlist is not None
+        from ..extra.scan import split_location
+        from ..extra.watcher import create_watcher
+
+        root = self.playlist.title
+        _, options = split_location(self.id)
+        known = [vid.get_file_stream() for vid in self.playlist]
+        on_change = functools.partial(
+            self.controller.call_in_ui, self._on_files_changed)
+
+        def start() -> 'BaseWatcher':
+            watcher = create_watcher(root, options, on_change, known)
+            watcher.start()
+            return watcher
+
+        def started(watcher: 'BaseWatcher') -> None:
+            if self.watcher is not None:
+                self.watcher.stop()
+            self.watcher = watcher
+            if self._closed:
+                self.close()
+
+        self.controller.run_task(
+            start, msg='Watching directory', callback=started)
+
+    def _on_files_changed(self, added: Set[str], removed: Set[str]) -> None:
+        if self._closed or self.playlist is None:
+            return
+        self._file_changes.append((added, removed))
+        if not self._updating:
+            self._apply_file_changes()
+
+    def _apply_file_changes(self) -> None:
+        """ Probe new files in background, then swap playlist
+        """
+        from ..extra.plugins import FilesystemPlugin
+
+        base = self.playlist
+        assert base is not None
+        changes, self._file_changes = self._file_changes, []
+        self._updating = True
+
+        def apply() -> 'Playlist':
+            playlist = base
+            for added, removed in changes:
+                playlist = FilesystemPlugin.apply_changes(
+                    playlist, added, removed)
+            return playlist
+
+        def swap(playlist: 'Playlist') -> None:
+            if self.playlist is not base or self._closed:
+                return  # reloaded in the meantime
+
+            n_added = len(playlist) - len(base)
+            self.playlist = playlist
+            self.controller.send_msg(
+                f'Playlist changed on disk ({n_added:+d} videos)')
+            self.preload_next_video()
+            self.setup(reload_playlist=False)
+
+        def done(_: asyncio.Task) -> None:
+            self._updating = False
+            if len(self._file_changes) > 0 and not self._closed:
+                self._apply_file_changes()
+
+        self.controller.run_task(
+            apply, msg='Updating playlist', callback=swap
+        ).add_done_callback(done)
 
     def handle_mpv_pos(self, pos: float) -> None:
         assert self.current_vid is not None
@@ -373,15 +824,28 @@ class PlayerQueue:
             self.ts = int(pos)
             assert self.ts is not None
 
+            if self._selected_at is not None:
+                metrics.observe(
+                    'playback_start_seconds',
+                    time.perf_counter() - self._selected_at,
+                    backend=self.backend_name)
+                self._selected_at = None
+
+            self.controller.checkpoint()
             self.controller.send_msg(
                 f'Playing "{self.current_vid.title}" ({sec2ts(self.ts)})')
 
     def handle_mpv_event(self, ev: PlayerEvent) -> None:
         if ev is PlayerEvent.VIDEO_OVER:
-            self.onVideoEnd(play_next=True)
+            # backend continues with preloaded video on its own
+            self.onVideoEnd(play_next=self.preloaded_vid is None)
         elif ev is PlayerEvent.VIDEO_QUIT:
+            # backend discards its playlist once stopped
+            self.preloaded_vid = None
             self.controller.send_msg('Waiting for input')
             self.onVideoEnd()
+        elif ev is PlayerEvent.VIDEO_NEXT:
+            self.onPreloadedVideoStart()
 
     def onVideoEnd(self, play_next: bool = False) -> None:
         self.controller.assemble_info_box()
@@ -391,18 +855,78 @@ class PlayerQueue:
 
         self.setup(reload_playlist=False)
 
+    def onPreloadedVideoStart(self) -> None:
+        if self.preloaded_vid is None:
+            return
+        logger.info(f'Advanced to preloaded video {self.preloaded_vid.title}')
+
+        self.controller.save_state(background=True)
+        self.ts = 0
+        self.current_vid = self.preloaded_vid
+        self.preloaded_vid = None
+
+        self._display_title()
+        self.preload_next_video()
+
     def play_video(self, vid: 'Video', start_pos: int = 0) -> None:
-        self.controller.save_state()
+        self.controller.save_state(background=True)
         self.ts = start_pos
         self.current_vid = vid
+        self.preloaded_vid = None
+        self._selected_at = time.perf_counter()
+
+        def start() -> None:
+            # resolving streams and talking to remote players may be slow
+            with metrics.timer(
+                    'stream_resolve_seconds', backend=self.backend_name):
+                stream = vid.get_file_stream()
+            with metrics.timer(
+                    'player_start_seconds', backend=self.backend_name):
+                self.controller.player_backend.play_video(
+                    stream, vid.title, start=start_pos)
+            self._display_title()
+
+        self.controller.run_task(
+            start, msg=f'Starting "{vid.title}"',
+            callback=lambda _: self.preload_next_video())
+
+    def preload_next_video(self) -> None:
+        """ Queue up next video in backend to allow gapless transitions
+        """
+        backend = self.controller.player_backend
+        if not self.controller.config['preload'] \
+                or not backend.supports_preload \
+                or self.current_vid is None:
+            return
 
-        self.controller.player_backend.play_video(
-            vid.get_file_stream(), vid.title,
-            start=start_pos)
+        current, vid = self.current_vid, self._get_video_relative(1)
+        self.preloaded_vid = None
+
+        def queue() -> bool:
+            backend.clear_queue()
+            if vid is None:
+                return False
+            with metrics.timer(
+                    'stream_resolve_seconds', backend=self.backend_name):
+                stream = vid.get_file_stream()
+            return backend.queue_video(stream, vid.title)
+
+        def queued(ok: bool) -> None:
+            # until now, the backend would stop after the current video;
+            # an idle backend does not queue anything
+            if ok and self.current_vid is current:
+                self.preloaded_vid = vid
+
+        self.controller.run_task(
+            queue, msg='Preloading next video', callback=queued)
+
+    def _display_title(self) -> None:
+        assert self.current_vid is not None
 
         if self.controller.config['show_titles']:
             self.controller.player_backend.display_text(
-                vid.title, min(3000, vid.duration*1000))
+                self.current_vid.title,
+                min(3000, self.current_vid.duration*1000))
 
     def play_next_video(self) -> None:
         if self.current_vid is None:
@@ -430,7 +954,7 @@ class PlayerQueue:
         assert self.playlist is not None
         assert self.current_vid is not None
 
-        idx, _ = self.playlist.get_video_by_title(self.current_vid.title)
+        idx, _ = self.playlist.get_video_by_id(self.current_vid.id)
         if idx is None:
             raise RuntimeError(
                 f'Could not find video "{self.current_vid.title}"')
@@ -0,0 +1,619 @@
+"""
+Headless daemon which owns model, playlist caches and player backend,
+controlled via JSON-RPC 2.0 over a Unix socket
+"""
+
+import os
+import json
+import time
+import socket
+import threading
+import socketserver
+from pathlib import Path
+
+from logzero import logger
+
+from typing import (  # noqa: F401
+    TYPE_CHECKING, Any, Callable, Dict, List, Optional, Set, Union)
+
+from .model import Model
+from .checkpoint import Checkpointer
+from ..extra import metrics
+from ..extra.player import BasePlayer, PlayerEvent
+from ..extra.utils import load_playlist, sec2ts, ts2sec
+
+if TYPE_CHECKING:
+    from ..extra.plugins import Video, Playlist  # noqa: F401
+
+
+def get_socket_path() -> Path:
+    from appdirs import AppDirs
+    return Path(AppDirs('vydia', 'kpj').user_data_dir) / 'daemon.sock'
+
+
+class DaemonError(RuntimeError):
+    pass
+
+
+class Daemon:
+    """ Playback session without UI, all `rpc_*` methods are exposed
+    """
+
+    def __init__(
+        self,
+        player_backend: BasePlayer, config: Dict[str, Any],
+        model: Optional[Model] = None
+    ) -> None:
+        self.config = config
+        self.model = model or Model()
+
+        # backends look up the running video via `controller.player`
+        self.player = self
+        self.player_backend = player_backend
+        self.player_backend.set_controller(self)
+        self._backend_ready = False
+
+        self.playlists = {}  # type: Dict[str, Playlist]
+        self.current_playlist = None  # type: Optional[str]
+        self.current_vid = None  # type: Optional[Video]
+        self.ts = None  # type: Optional[int]
+        self.backend_name = type(player_backend).__name__
+        self._selected_at = None  # type: Optional[float]
+
+        interval = config.get('checkpoint_interval', 10)
+        self.checkpointer = Checkpointer(
+            self.model.checkpoint_progress, interval=interval
+        ) if interval > 0 else None  # type: Optional[Checkpointer]
+
+        # set when a thin client (e.g. the TUI) drives the backend itself
+        self.external = False
+
+        self._subscribers = set()  # type: Set[Callable[[str, Dict], None]]
+        self._lock = threading.RLock()
+
+    def _ensure_backend(self) -> None:
+        if not self._backend_ready:
+            self.player_backend.setup(
+                self._handle_pos, self._handle_event,
+                disable_video=not self.config['show_video'])
+            self._backend_ready = True
+
+    def subscribe(self, callback: Callable[[str, Dict], None]) -> None:
+        with self._lock:
+            self._subscribers.add(callback)
+
+    def unsubscribe(self, callback: Callable[[str, Dict], None]) -> None:
+        with self._lock:
+            self._subscribers.discard(callback)
+
+    def _notify(self, method: str, params: Dict[str, Any]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for cb in subscribers:
+            try:
+                cb(method, params)
+            except OSError:
+                self.unsubscribe(cb)
+
+    def _handle_pos(self, pos: Optional[float]) -> None:
+        if pos is None or self.current_vid is None:
+            return
+        self.ts = int(pos)
+        if self._selected_at is not None:
+            metrics.observe(
+                'playback_start_seconds',
+                time.perf_counter() - self._selected_at,
+                backend=self.backend_name)
+            self._selected_at = None
+        self.checkpoint()
+        self._notify('time', {'pos': pos})
+
+    def _handle_event(self, ev: PlayerEvent) -> None:
+        self._notify('event', {'name': ev.name})
+        if self.external:
+            return
+
+        self.save_progress()
+        if ev is PlayerEvent.VIDEO_OVER:
+            try:
+                self.rpc_next()
+            except DaemonError as err:
+                logger.info(f'Stopping auto-advance: {err}')
+                self._notify('stopped', {'reason': str(err)})
+
+    def save_progress(self) -> None:
+        with self._lock:
+            if self.external or self.current_playlist is None \
+                    or self.current_vid is None or self.ts is None:
+                return
+            args = (
+                self.current_playlist, self.current_vid.id,
+                self.current_vid.title, self.ts)
+            self.model.save_progress(*args)
+            if self.checkpointer is not None:
+                self.checkpointer.saved(*args)
+
+    def checkpoint(self, force: bool = False) -> None:
+        with self._lock:
+            if self.checkpointer is None or self.external \
+                    or self.current_playlist is None \
+                    or self.current_vid is None or self.ts is None:
+                return
+            self.checkpointer.update(
+                self.current_playlist, self.current_vid.id,
+                self.current_vid.title, self.ts, force=force)
+
+    def shutdown(self) -> None:
+        self.save_progress()
+        if self._backend_ready:
+            self.player_backend.shutdown()
+
+    def get_playlist(self, name: str, reload: bool = False) -> 'Playlist':
+        """ Return (cached) playlist, loading it via plugins if needed
+        """
+        with self._lock:
+            if name not in self.model.get_playlist_list():
+                raise DaemonError(f'Unknown playlist "{name}"')
+            if not reload and name in self.playlists:
+                return self.playlists[name]
+            pl_id = self.model.get_playlist_info(name)['id']
+
+        # other commands may run meanwhile, concurrent loads are shared
+        plugin_name, playlist = load_playlist(pl_id)
+        self.model.migrate_episodes(name, playlist)
+        self.model.cache_playlist(name, playlist)
+        logger.info(f'Loaded "{name}" with {plugin_name}')
+
+        with self._lock:
+            self.playlists[name] = playlist
+        return playlist
+
+    def _play(
+        self,
+        name: str, vid: 'Video', start: int = 0,
+        stream: Optional[str] = None
+    ) -> None:
+        self._ensure_backend()
+        with self._lock:
+            self.save_progress()
+
+            self.external = False
+            self.current_playlist = name
+            self.current_vid = vid
+            self.ts = start
+            self._selected_at = time.perf_counter()
+
+        if stream is None:
+            with metrics.timer(
+                    'stream_resolve_seconds', backend=self.backend_name):
+                stream = vid.get_file_stream()
+        with metrics.timer('player_start_seconds', backend=self.backend_name):
+            self.player_backend.play_video(stream, vid.title, start=start)
+        if self.config['show_titles']:
+            self.player_backend.display_text(
+                vid.title, min(3000, vid.duration*1000))
+        self._notify('playing', self.rpc_progress())
+
+    def rpc_add(self, playlist: str) -> Dict[str, str]:
+        result = self.model.add_new_playlist(playlist)
+        if result is None:
+            raise DaemonError(f'Playlist "{playlist}" could not be added')
+
+        title, plugin = result
+        return {'title': title, 'plugin': plugin}
+
+    def rpc_list(
+        self, playlist: Optional[str] = None
+    ) -> List[Union[str, Dict[str, Any]]]:
+        if playlist is None:
+            return list(self.model.get_playlist_list())
+
+        pl = self.get_playlist(playlist)
+        episodes = self.model.get_playlist_info(playlist)['episodes']
+        return [{
+            'index': i,
+            'title': vid.title,
+            'duration': vid.duration,
+            'timestamp': episodes.get(vid.id, {}).get(
+                'current_timestamp', sec2ts(0))
+        } for i, vid in enumerate(pl)]
+
+    def rpc_play(
+        self,
+        playlist: str,
+        video: Union[int, str, None] = None, start: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """ Play video (index or title), resume last one if not given
+        """
+        pl = self.get_playlist(playlist)
+
+        vid = None  # type: Optional[Video]
+        if video is None:
+            cur = self.model.get_current_video(playlist)
+            if cur is not None:
+                video = cur['title']
+                _, vid = pl.find_video(cur)
+                if start is None:
+                    start = ts2sec(cur['timestamp'])
+            elif len(pl) > 0:
+                video = 0
+
+        if vid is None:
+            if isinstance(video, int) and 0 <= video < len(pl):
+                vid = pl[video]
+            elif isinstance(video, str):
+                _, vid = pl.get_video_by_title(video)
+        if vid is None:
+            raise DaemonError(f'Could not find video "{video}"')
+
+        if start is None:
+            episodes = self.model.get_playlist_info(playlist)['episodes']
+            start = ts2sec(episodes.get(vid.id, {}).get(
+                'current_timestamp', sec2ts(0)))
+            if start >= vid.duration:  # already watched, start over
+                start = 0
+
+        self._play(playlist, vid, start)
+        return self.rpc_progress()
+
+    def rpc_next(self) -> Dict[str, Any]:
+        if self.current_playlist is None or self.current_vid is None \
+                or self.external:
+            raise DaemonError('No video playing')
+
+        pl = self.get_playlist(self.current_playlist)
+        idx, _ = pl.get_video_by_id(self.current_vid.id)
+        if idx is None or idx + 1 >= len(pl):
+            raise DaemonError('Reached end of playlist')
+
+        self._play(self.current_playlist, pl[idx + 1])
+        return self.rpc_progress()
+
+    def rpc_continue_list(self) -> List[Dict[str, Any]]:
+        return self.model.get_continue_watching()
+
+    def rpc_continue(self, entry: int = 0) -> Dict[str, Any]:
+        """ Play `entry` of continue-watching list, using the playlist
+            as cached by its last load unless the video's stream is gone
+        """
+        entries = self.model.get_continue_watching()
+        if len(entries) == 0:
+            raise DaemonError('Nothing to continue')
+        if not 0 <= entry < len(entries):
+            raise DaemonError(f'No entry #{entry + 1}')
+        info = entries[entry]
+        name = info['playlist']
+
+        with self._lock:
+            pl = self.playlists.get(name)
+        if pl is None:
+            pl = self.model.get_cached_playlist(name)
+
+        stream = None
+        vid = pl.get_video_by_id(info['id'])[1] if pl is not None else None
+        if vid is not None:
+            try:
+                with metrics.timer(
+                        'stream_resolve_seconds', backend=self.backend_name):
+                    stream = vid.get_file_stream()
+            except Exception as err:
+                logger.info(f'Stream of "{vid.title}" expired: {err!r}')
+            else:
+                if '://' not in stream and not os.path.exists(stream):
+                    stream = None
+
+        if stream is None:
+            # locator is outdated, ask plugin again
+            pl = self.get_playlist(name, reload=True)
+            _, vid = pl.get_video_by_id(info['id'])
+            if vid is None:
+                raise DaemonError(
+                    f'Video "{info["title"]}" is gone from "{name}"')
+        else:
+            with self._lock:
+                self.playlists.setdefault(name, pl)
+
+        assert vid is not None
+        self._play(name, vid, ts2sec(info['timestamp']), stream=stream)
+        return self.rpc_progress()
+
+    def rpc_pause(self) -> None:
+        if not self._backend_ready:
+            raise DaemonError('No video playing')
+        self.checkpoint(force=True)
+        self.player_backend.toggle_pause()
+
+    def rpc_progress(self) -> Dict[str, Any]:
+        vid = self.current_vid
+        return {
+            'playlist': self.current_playlist,
+            'title': vid.title if vid is not None else None,
+            'duration': vid.duration if vid is not None else None,
+            'timestamp': sec2ts(self.ts) if self.ts is not None else None,
+            'external': self.external
+        }
+
+    def rpc_refresh(self, playlist: str) -> Dict[str, Any]:
+        pl = self.get_playlist(playlist, reload=True)
+        return {'title': pl.title, 'count': len(pl)}
+
+    # raw backend access for thin clients which manage playback themselves
+    def rpc_player_play(
+        self, url: str, title: str = '', start: int = 0, duration: int = 0
+    ) -> None:
+        from ..extra.plugins import Video, VideoData
+
+        self._ensure_backend()
+        with self._lock:
+            self.save_progress()
+
+            self.external = True
+            self.current_playlist = None
+            self.current_vid = Video(VideoData(
+                title=title, duration=duration,
+                get_file_stream=lambda: url, get_info=lambda: ''))
+            self.ts = start
+        self.player_backend.play_video(url, title, start=start)
+
+    def rpc_state_gc(
+        self, retention: Optional[float] = None, dry_run: bool = False
+    ) -> Dict[str, int]:
+        return self.model.collect_garbage(retention, dry_run=dry_run)
+
+    def rpc_stats(self) -> Dict[str, Any]:
+        """ Current metrics (empty unless enabled)
+        """
+        return metrics.snapshot()
+
+    def rpc_player_pause(self) -> None:
+        self.rpc_pause()
+
+    def rpc_player_text(self, text: str, duration: int = 1000) -> None:
+        self._ensure_backend()
+        self.player_backend.display_text(text, duration)
+
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    server: 'DaemonServer'
+
+    def setup(self) -> None:
+        super().setup()
+        self._write_lock = threading.Lock()
+        self._subscription = None  # type: Optional[Callable]
+
+    def _write(self, msg: Dict[str, Any]) -> None:
+        data = (json.dumps(msg) + '\n').encode()
+        with self._write_lock:
+            self.wfile.write(data)
+            self.wfile.flush()
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            if len(line.strip()) == 0:
+                continue
+            response = self._dispatch(line)
+            if response is not None:
+                self._write(response)
+
+    def finish(self) -> None:
+        if self._subscription is not None:
+            self.server.daemon.unsubscribe(self._subscription)
+        super().finish()
+
+    def _dispatch(self, line: bytes) -> Optional[Dict[str, Any]]:
+        try:
+            req = json.loads(line)
+            method, params = req['method'], req.get('params', {})
+        except (ValueError, KeyError, TypeError):
+            return {
+                'jsonrpc': '2.0', 'id': None,
+                'error': {'code': -32700, 'message': 'Parse error'}}
+        req_id = req.get('id')
+
+        def error(code: int, msg: str) -> Dict[str, Any]:
+            return {
+                'jsonrpc': '2.0', 'id': req_id,
+                'error': {'code': code, 'message': msg}}
+
+        if method == 'subscribe':
+            # stream notifications over this connection from now on
+            def notify(method: str, params: Dict[str, Any]) -> None:
+                self._write({
+                    'jsonrpc': '2.0', 'method': method, 'params': params})
+            self._subscription = notify
+            self.server.daemon.subscribe(notify)
+            result = None  # type: Any
+        else:
+            func = getattr(
+                self.server.daemon, 'rpc_' + method.replace('.', '_'), None)
+            if func is None:
+                return error(-32601, f'Method "{method}" not found')
+
+            try:
+                result = func(**params)
+            except TypeError as err:
+                return error(-32602, str(err))
+            except (DaemonError, ValueError, KeyError) as err:
+                return error(-32000, str(err))
+            except Exception as err:
+                logger.exception(f'RPC "{method}" failed')
+                return error(-32603, str(err))
+
+        if req_id is None:  # notification
+            return None
+        return {'jsonrpc': '2.0', 'id': req_id, 'result': result}
+
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: Path, daemon: Daemon) -> None:
+        self.path = Path(path)
+        self.daemon = daemon
+
+        if self.path.exists():
+            client = get_daemon_client(self.path)
+            if client is not None:
+                client.close()
+                raise DaemonError(f'Daemon already running at {self.path}')
+            self.path.unlink()  # stale socket of crashed daemon
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        super().__init__(str(self.path), DaemonRequestHandler)
+        os.chmod(self.path, 0o600)
+
+    def server_close(self) -> None:
+        super().server_close()
+        if self.path.exists():
+            self.path.unlink()
+
+
+class DaemonClient:
+    """ Blocking JSON-RPC client, notifications are passed to `callback`
+    """
+
+    def __init__(self, path: Path, timeout: Optional[float] = 30) -> None:
+        self.path = Path(path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(str(self.path))
+        self.rfile = self.sock.makefile('rb')
+
+        self._ids = 0
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        # wake up threads blocked in `listen` before closing the reader
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.rfile.close()
+        self.sock.close()
+
+    def call(self, method: str, **params: Any) -> Any:
+        with self._lock:
+            self._ids += 1
+            req_id = self._ids
+            self.sock.sendall((json.dumps({
+                'jsonrpc': '2.0', 'id': req_id,
+                'method': method, 'params': params
+            }) + '\n').encode())
+
+            while True:
+                line = self.rfile.readline()
+                if len(line) == 0:
+                    raise DaemonError('Daemon closed the connection')
+
+                msg = json.loads(line)
+                if msg.get('id') == req_id:
+                    break
+
+        if 'error' in msg:
+            raise DaemonError(msg['error']['message'])
+        return msg.get('result')
+
+    def listen(self, callback: Callable[[str, Dict], None]) -> None:
+        """ Subscribe and dispatch notifications until connection closes
+        """
+        self.call('subscribe')
+        self.sock.settimeout(None)
+
+        for line in self.rfile:
+            msg = json.loads(line)
+            if 'method' in msg:
+                callback(msg['method'], msg.get('params', {}))
+
+
+def get_daemon_client(
+    path: Optional[Path] = None
+) -> Optional[DaemonClient]:
+    """ Return client if a daemon is listening at `path`
+    """
+    path = path or get_socket_path()
+    if not os.path.exists(path):
+        return None
+
+    try:
+        return DaemonClient(path)
+    except OSError:
+        return None
+
+
+class DaemonPlayer(BasePlayer):
+    """ Let a running daemon's backend play videos for the TUI
+    """
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self.path = path or get_socket_path()
+        self.client = DaemonClient(self.path)
+
+    def setup(
+        self,
+        time_callback: Callable[[float], None],
+        event_callback: Callable[[PlayerEvent], None],
+        disable_video: bool = False
+    ) -> None:
+        self.time_callback = time_callback
+        self.event_callback = event_callback
+
+        self.listener = DaemonClient(self.path)
+        threading.Thread(target=self._listen, daemon=True).start()
+
+    def _listen(self) -> None:
+        def handle(method: str, params: Dict[str, Any]) -> None:
+            if method == 'time':
+                self.time_callback(params['pos'])
+            elif method == 'event':
+                self.event_callback(PlayerEvent[params['name']])
+
+        try:
+            self.listener.listen(handle)
+        except (OSError, ValueError):
+            pass
+
+    def play_video(self, vid: str, title: str = '', start: int = 0) -> None:
+        current_vid = self.controller.player.current_vid
+        duration = current_vid.duration if current_vid is not None else 0
+
+        self.client.call(
+            'player.play', url=vid, title=title,
+            start=start, duration=duration)
+
+    def toggle_pause(self) -> None:
+        self.client.call('player.pause')
+
+    def shutdown(self) -> None:
+        """ Leave daemon (and its player) running
+        """
+        self.listener.close()
+        self.client.close()
+
+    def display_text(self, txt: str, duration: int = 1000) -> None:
+        self.client.call('player.text', text=txt, duration=duration)
+
+
+def run_daemon(
+    player_backend: BasePlayer, config: Dict[str, Any],
+    path: Optional[Path] = None
+) -> None:
+    from ..extra.log_queue import QueueLogging
+
+    with QueueLogging(logger, json_lines=config.get('log_json', False)):
+        daemon = Daemon(player_backend, config)
+        if config.get('state_gc', False):
+            threading.Thread(
+                target=lambda: logger.info(
+                    'Collected garbage of state: '
+                    f'{daemon.model.collect_garbage()}'),
+                name='vydia-gc', daemon=True).start()
+        server = DaemonServer(path or get_socket_path(), daemon)
+        logger.info(f'Daemon listening on {server.path}')
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            daemon.shutdown()
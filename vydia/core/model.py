@@ -1,16 +1,31 @@
 import os
 import json
+import time
+import hashlib
+import threading
+import contextlib
 import collections
 
 from pathlib import Path
 from appdirs import AppDirs
 
-from typing import Any, Optional, Iterable, Dict, Tuple
+from typing import (  # noqa: F401
+    Any, Optional, Iterable, Dict, List, Tuple, TYPE_CHECKING)
 
-from ..extra.utils import nested_dict_update, load_playlist
+from ..extra import metrics
+from ..extra.utils import (
+    nested_dict_update, load_playlist, sec2ts, ts2sec)
+
+if TYPE_CHECKING:
+    from ..extra.plugins import Playlist  # noqa: F401
 
 
 class Model:
+    # fold journal into state file once it grows this long
+    JOURNAL_MAX_ENTRIES = 1000
+    # keep progress of vanished videos around this long (in seconds)
+    GC_RETENTION = 30 * 24 * 60 * 60
+
     def __init__(
         self,
         state_fname: Optional[Path] = None,
@@ -22,9 +37,24 @@ class Model:
             or Path(self.adirs.user_data_dir) / 'state.json'
         self.LOG_FILE: Path = log_fname \
             or Path(self.adirs.user_log_dir) / 'log.txt'
+        self.JOURNAL_FILE: Path = Path(self.STATE_FILE).with_suffix('.journal')
+        self.CACHE_DIR: Path = Path(self.STATE_FILE).parent / 'playlists'
+        self.CONTINUE_FILE: Path = \
+            Path(self.STATE_FILE).parent / 'continue.json'
 
         self._ensure_dir(str(self.LOG_FILE))
 
+        # state is read and written from background tasks concurrently
+        self._lock = threading.RLock()
+        self._journal_entries = 0
+        # (inode, size) of journal as replayed by last load, other
+        # processes may append to it before the next full save
+        self._journal_replayed = None  # type: Optional[Tuple[int, int]]
+
+        # playlists whose continue-watching entry is outdated,
+        # with time they were last watched (if known)
+        self._continue_dirty = {}  # type: Dict[str, Optional[float]]
+
     def get_playlist_list(self) -> Iterable[str]:
         return sorted(self._load_state().keys())
 
@@ -34,9 +64,14 @@ class Model:
         return cur
 
     def delete_playlist_by_name(self, name: str) -> None:
-        _state = self._load_state()
-        _state.pop(name)
-        self._save_state(_state)
+        with self._lock:
+            _state = self._load_state()
+            _state.pop(name)
+            self._touch(name)
+            self._save_state(_state)
+
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._cache_file(name))
 
     def get_current_video(self, pid: str) -> Optional[Dict[str, str]]:
         _state = self._load_state()
@@ -48,22 +83,349 @@ class Model:
         except ValueError:
             print(f'No plugin found for "{plid}"')
             return None
+        except (TimeoutError, RuntimeError) as err:
+            print(f'Could not load "{plid}": {err}')
+            return None
 
         self.update_state(pl.title, {'id': pl.id, 'episodes': {}})
+        self.cache_playlist(pl.title, pl)
         return pl.title, plugin_name
 
+    def _cache_file(self, pid: str) -> Path:
+        digest = hashlib.sha1(pid.encode()).hexdigest()
+        return self.CACHE_DIR / f'{digest}.pickle'
+
+    def cache_playlist(self, pid: str, playlist: 'Playlist') -> None:
+        """ Remember contents of playlist as last loaded by plugin
+        """
+        from logzero import logger
+
+        try:
+            data = playlist.dumps()
+        except Exception as err:  # e.g. videos of custom plugins
+            logger.warning(f'Cannot cache playlist "{pid}": {err}')
+            return
+
+        fname = self._cache_file(pid)
+        self._ensure_dir(str(fname))
+        tmp_fname = f'{fname}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_fname, 'wb') as fd:
+            fd.write(data)
+        os.replace(tmp_fname, fname)
+
+        self._touch(pid)
+
+    def get_cached_playlist(self, pid: str) -> Optional['Playlist']:
+        """ Playlist as last loaded by plugin, None if never loaded
+        """
+        from ..extra.plugins import Playlist
+
+        try:
+            with open(self._cache_file(pid), 'rb') as fd:
+                return Playlist.loads(fd.read())
+        except FileNotFoundError:
+            return None
+        except Exception as err:
+            from logzero import logger
+            logger.warning(f'Ignoring invalid cache of "{pid}": {err}')
+            return None
+
+    def collect_garbage(
+        self,
+        retention: Optional[float] = None, dry_run: bool = False
+    ) -> Dict[str, int]:
+        """ Mark progress of videos which vanished from their (cached)
+            playlist, drop it once marked longer than `retention` seconds
+            and rewrite state compactly; return what was done
+        """
+        retention = self.GC_RETENTION if retention is None else retention
+        now = int(time.time())
+        stats = {
+            'playlists': 0, 'orphaned': 0, 'restored': 0, 'removed': 0,
+            'caches_removed': 0}
+
+        with self._lock:
+            stats['bytes_before'] = sum(
+                os.path.getsize(fname)
+                for fname in [self.STATE_FILE, self.JOURNAL_FILE]
+                if os.path.isfile(fname))
+            _state = self._load_state()
+
+            for pid, info in _state.items():
+                playlist = self.get_cached_playlist(pid)
+                if playlist is None:  # cannot tell what is gone
+                    continue
+                stats['playlists'] += 1
+
+                # entries of older versions are keyed by title
+                known = {vid.id for vid in playlist} \
+                    | {vid.title for vid in playlist}
+                cur = info.get('current') or {}
+                known.add(cur.get('id', cur.get('title')))
+
+                episodes = info.get('episodes', {})
+                for key, episode in list(episodes.items()):
+                    if key in known:
+                        if episode.pop('orphaned_since', None) is not None:
+                            stats['restored'] += 1
+                    elif 'orphaned_since' not in episode:
+                        episode['orphaned_since'] = now
+                        stats['orphaned'] += 1
+                    elif now - episode['orphaned_since'] >= retention:
+                        del episodes[key]
+                        stats['removed'] += 1
+
+            # caches of deleted playlists
+            cache_files = {self._cache_file(pid).name for pid in _state}
+            if os.path.isdir(self.CACHE_DIR):
+                for entry in os.scandir(self.CACHE_DIR):
+                    if entry.name not in cache_files:
+                        stats['caches_removed'] += 1
+                        stats['bytes_before'] += entry.stat().st_size
+                        if not dry_run:
+                            os.remove(entry.path)
+
+            if dry_run:
+                stats['bytes_after'] = len(self._dump_state(_state).encode())
+            else:
+                self._save_state(_state)
+                stats['bytes_after'] = os.path.getsize(self.STATE_FILE)
+        return stats
+
+    def save_progress(
+        self, pid: str, vid_id: str, title: str, ts: int
+    ) -> None:
+        """ Remember position in video and mark it as current one
+        """
+        with self._lock:
+            self._touch(pid, time.time())
+            self.update_state(
+                pid, self._progress_data(vid_id, title, sec2ts(ts)))
+
+    def checkpoint_progress(
+        self, pid: str, vid_id: str, title: str, ts: int
+    ) -> None:
+        """ Like `save_progress`, but only append the change to journal
+            instead of rewriting the whole state
+        """
+        now = time.time()
+        entry = json.dumps({
+            'playlist': pid, 'id': vid_id, 'title': title,
+            'timestamp': sec2ts(ts), 'time': now})
+
+        with self._lock:
+            self._touch(pid, now)
+            with open(self.JOURNAL_FILE, 'a') as fd:
+                fd.write(entry + '\n')
+            metrics.inc('state_journal_writes')
+
+            self._journal_entries += 1
+            if self._journal_entries >= self.JOURNAL_MAX_ENTRIES:
+                self._save_state(self._load_state())
+
+    def _progress_data(
+        self, vid_id: str, title: str, timestamp: str
+    ) -> Dict[str, Any]:
+        return {
+            'current': {
+                'id': vid_id,
+                'title': title,
+                'timestamp': timestamp
+            },
+            'episodes': {
+                vid_id: {
+                    'title': title,
+                    'current_timestamp': timestamp
+                }
+            }
+        }
+
+    def migrate_episodes(self, pid: str, playlist: 'Playlist') -> int:
+        """ Key progress stored by title (as done by older versions)
+            by video id instead, return number of moved entries
+        """
+        with self._lock:
+            _state = self._load_state()
+            if pid not in _state:
+                return 0
+            episodes = _state[pid].setdefault('episodes', {})
+
+            moved = 0
+            for vid in playlist:
+                if vid.id != vid.title and vid.title in episodes \
+                        and vid.id not in episodes:
+                    episodes[vid.id] = dict(
+                        episodes.pop(vid.title), title=vid.title)
+                    moved += 1
+
+            cur = _state[pid].get('current')
+            if cur is not None and 'id' not in cur:
+                _, vid = playlist.get_video_by_title(cur['title'])
+                if vid is not None:
+                    cur['id'] = vid.id
+                    moved += 1
+
+            if moved > 0:
+                from logzero import logger
+                logger.info(f'Migrated {moved} entries of "{pid}" to ids')
+                self._touch(pid)
+                self._save_state(_state)
+            return moved
+
     def update_state(
         self,
         pid: str, data: Dict[str, Any]
     ) -> None:
-        _state = self._load_state()
+        with self._lock:
+            _state = self._load_state()
 
-        if pid in _state:
-            _state[pid] = nested_dict_update(_state[pid], data)
-        else:
-            _state[pid] = data
+            if pid in _state:
+                _state[pid] = nested_dict_update(_state[pid], data)
+            else:
+                _state[pid] = data
+
+            self._touch(pid)
+            self._save_state(_state)
+
+    def mark_watched(
+        self,
+        pid: str, videos: Iterable[Tuple[str, str, int]],
+        watched: Optional[bool] = True
+    ) -> Dict[str, Any]:
+        """ Mark (id, title, duration) of many videos as (un)watched
+            with a single write, toggle each one if `watched` is None;
+            return new state of playlist
+        """
+        with self._lock:
+            _state = self._load_state()
+            episodes = _state[pid].setdefault('episodes', {})
+
+            for vid_id, title, duration in videos:
+                end_ts = sec2ts(duration)
+                if watched is None:
+                    cur_ts = episodes.get(vid_id, {}).get('current_timestamp')
+                    mark = cur_ts != end_ts
+                else:
+                    mark = watched
+                episodes[vid_id] = {
+                    'title': title,
+                    'current_timestamp': end_ts if mark else sec2ts(0)
+                }
+
+            self._touch(pid)
+            self._save_state(_state)
+            return _state[pid]
+
+    def get_continue_watching(self) -> List[Dict[str, Any]]:
+        """ Video to resume (or to watch next) of each playlist,
+            most recently watched first
+        """
+        with self._lock:
+            index = self._read_continue()
+            if index is None or len(self._continue_dirty) > 0 \
+                    or os.path.exists(self.JOURNAL_FILE):
+                index = self._refresh_continue(self._load_state(), index)
+
+        return sorted(
+            index.values(),
+            key=lambda entry: (-entry['watched_at'], entry['playlist']))
+
+    def _touch(self, pid: str, watched_at: Optional[float] = None) -> None:
+        """ Recompute continue-watching entry of playlist on next save
+        """
+        with self._lock:
+            prev = self._continue_dirty.get(pid)
+            self._continue_dirty[pid] = watched_at if prev is None \
+                else max(prev, watched_at or 0)
+
+    def _read_continue(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        """ Index as last written, None if missing or older than state
+        """
+        try:
+            with open(self.CONTINUE_FILE) as fd:
+                index = json.load(fd)
+            if os.path.getmtime(self.CONTINUE_FILE) \
+                    < os.path.getmtime(self.STATE_FILE):
+                return None
+        except (FileNotFoundError, json.decoder.JSONDecodeError):
+            return None
+        return index
+
+    def _refresh_continue(
+        self,
+        state: Dict[Any, Any], index: Optional[Dict[str, Dict[str, Any]]]
+    ) -> Dict[str, Dict[str, Any]]:
+        """ Update entries of changed playlists (all of them if there
+            is no index yet) and write index
+        """
+        if index is None:
+            index = {}
+            for pid in state:
+                self._touch(pid)
+
+        dirty, self._continue_dirty = self._continue_dirty, {}
+        for pid, watched_at in dirty.items():
+            prev = index.pop(pid, None)
+            entry = self._continue_entry(pid, state[pid], prev) \
+                if pid in state else None
+            if entry is not None:
+                entry['watched_at'] = max(
+                    watched_at or 0, prev['watched_at'] if prev else 0)
+                index[pid] = entry
+
+        self._ensure_dir(str(self.CONTINUE_FILE))
+        tmp_fname = f'{self.CONTINUE_FILE}.{os.getpid()}.' \
+            f'{threading.get_ident()}.tmp'
+        with open(tmp_fname, 'w') as fd:
+            json.dump(index, fd, separators=(',', ':'))
+        os.replace(tmp_fname, self.CONTINUE_FILE)
+        return index
+
+    def _continue_entry(
+        self,
+        pid: str, info: Dict[str, Any], prev: Optional[Dict[str, Any]]
+    ) -> Optional[Dict[str, Any]]:
+        """ Current video if unfinished, next unfinished one otherwise;
+            None if there is none or playlist was never loaded
+        """
+        cur = info.get('current')
+        if cur is None:
+            return None
+        episodes = info.get('episodes', {})
 
-        self._save_state(_state)
+        def position(vid_id: str, default: str = '00:00:00') -> int:
+            return ts2sec(
+                episodes.get(vid_id, {}).get('current_timestamp', default))
+
+        # still watching same video, no need to look at playlist
+        cur_id = cur.get('id', cur['title'])
+        if prev is not None and prev['id'] == cur_id:
+            pos = position(cur_id, cur['timestamp'])
+            if pos < prev['duration']:
+                return dict(
+                    prev, timestamp=sec2ts(pos), status='in-progress')
+
+        playlist = self.get_cached_playlist(pid)
+        if playlist is None:
+            return None
+        idx, _ = playlist.find_video(cur)
+        if idx is None:
+            return None
+
+        for i in range(idx, len(playlist)):
+            vid = playlist[i]
+            pos = position(vid.id, cur['timestamp'] if i == idx
+                           else '00:00:00')
+            if pos < vid.duration:
+                return {
+                    'playlist': pid,
+                    'id': vid.id,
+                    'title': vid.title,
+                    'duration': vid.duration,
+                    'timestamp': sec2ts(pos),
+                    'status': 'in-progress' if i == idx else 'next'
+                }
+        return None
 
     def _ensure_dir(self, fname: str) -> None:
         """ Make sure that directory exists
@@ -82,20 +444,97 @@ class Model:
             res: Dict[Any, Any] = {}
         else:
             try:
-                with open(fname) as fd:
+                with metrics.timer('state_load_seconds'), \
+                        open(fname) as fd:
                     res = json.load(fd)
+                    metrics.inc('state_read_bytes', fd.tell())
             except json.decoder.JSONDecodeError:
                 print(f'Invalid state file: "{fname}"')
                 exit(-1)
 
+        if fn is None:
+            self._replay_journal(res)
         return collections.defaultdict(dict, res)
 
+    def _replay_journal(self, state: Dict[Any, Any]) -> None:
+        """ Apply checkpoints written since last full save
+        """
+        try:
+            with open(self.JOURNAL_FILE, 'rb') as fd:
+                data = fd.read()
+                inode = os.fstat(fd.fileno()).st_ino
+        except FileNotFoundError:
+            data, inode = b'', None
+        lines = data.decode().splitlines()
+
+        with self._lock:
+            self._journal_entries = len(lines)
+            self._journal_replayed = (inode, len(data)) \
+                if inode is not None else None
+
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except json.decoder.JSONDecodeError:
+                # interrupted while appending
+                continue
+
+            # playlist may have been deleted in the meantime
+            if entry['playlist'] in state:
+                self._touch(entry['playlist'], entry.get('time'))
+                nested_dict_update(
+                    state[entry['playlist']],
+                    self._progress_data(
+                        entry.get('id', entry['title']), entry['title'],
+                        entry['timestamp']))
+
+    def _compact_journal(self) -> None:
+        """ Drop checkpoints replayed by last load, they are contained in
+            full state now; keep the ones appended since
+        """
+        replayed, self._journal_replayed = self._journal_replayed, None
+        try:
+            with open(self.JOURNAL_FILE, 'rb') as fd:
+                # unless it was replaced by another process in the meantime
+                skip = replayed is not None \
+                    and replayed[0] == os.fstat(fd.fileno()).st_ino
+                if skip:
+                    fd.seek(replayed[1])
+                rest = fd.read()
+        except FileNotFoundError:
+            skip, rest = False, b''
+        self._journal_entries = rest.count(b'\n')
+
+        if len(rest) == 0:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.JOURNAL_FILE)
+        elif skip:
+            fname = str(self.JOURNAL_FILE)
+            tmp_fname = f'{fname}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_fname, 'wb') as fd:
+                fd.write(rest)
+            os.replace(tmp_fname, fname)
+
+    def _dump_state(self, state: Dict[Any, Any]) -> str:
+        return json.dumps(state, separators=(',', ':'))
+
     def _save_state(
         self,
         state: Dict[Any, Any], fn: Optional[str] = None
     ) -> None:
         fname = str(fn or self.STATE_FILE)
         self._ensure_dir(fname)
+        index = self._read_continue() if fn is None else None
+
+        # replace atomically, readers never see partially written file
+        tmp_fname = f'{fname}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with metrics.timer('state_save_seconds'):
+            with open(tmp_fname, 'w') as fd:
+                fd.write(self._dump_state(state))
+                metrics.inc('state_written_bytes', fd.tell())
+            os.replace(tmp_fname, fname)
 
-        with open(fname, 'w') as fd:
-            json.dump(state, fd)
+        if fn is None:
+            with self._lock:
+                self._compact_journal()
+                self._refresh_continue(state, index)
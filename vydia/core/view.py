@@ -1,10 +1,14 @@
 from abc import ABC, abstractmethod
 
-from typing import Optional, Tuple, Any, List, TYPE_CHECKING
+from typing import (  # noqa: F401
+    Optional, Tuple, Any, Dict, List, Set, TYPE_CHECKING)
 
 import urwid
 import urwid_readline
 
+from ..extra.search import TitleIndex, SearchState
+from ..extra.utils import parse_range
+
 if TYPE_CHECKING:
     from .controller import Controller  # noqa: F401
 
@@ -32,6 +36,10 @@ class View(urwid.Frame):
         w = EpisodeOverview(self.controller)
         self._activate_widget(w)
 
+    def show_continue_overview(self) -> None:
+        w = ContinueOverview(self.controller)
+        self._activate_widget(w)
+
     def show_overlay(self, widget: urwid.WidgetWrap, exit_key: str) -> None:
         cur_widget = self['body']
 
@@ -64,6 +72,25 @@ class View(urwid.Frame):
         self.contents.update(footer=(cmdline, None))
         self.focus_position = 'footer'
 
+    def show_search(self) -> None:
+        if self.widget is None or self.widget.search is None:
+            return
+
+        def return_callback(query: str) -> None:
+            self.hide_cmdline()
+
+        def cancel_callback() -> None:
+            self.widget.update_search('')
+            self.hide_cmdline()
+
+        cmdline = CmdlineView(
+            caption='/', callback=return_callback,
+            change_callback=self.widget.update_search,
+            cancel_callback=cancel_callback)
+
+        self.contents.update(footer=(cmdline, None))
+        self.focus_position = 'footer'
+
     def hide_cmdline(self) -> None:
         self.contents.update(footer=(None, None))
         self.focus_position = 'body'
@@ -72,15 +99,23 @@ class View(urwid.Frame):
 class CmdlineView(urwid_readline.ReadlineEdit):
     def __init__(
         self, *args: Any,
-        callback: Any = None, **kwargs: Any
+        callback: Any = None, change_callback: Any = None,
+        cancel_callback: Any = None, **kwargs: Any
     ) -> None:
         super().__init__(*args, **kwargs)
         self._callback = callback
+        self._cancel_callback = cancel_callback
+
+        if change_callback is not None:
+            urwid.connect_signal(
+                self, 'postchange',
+                lambda *_: change_callback(self.edit_text))
 
         self.command_list = list(sorted([
-            'add', 'delete', 'quit',
+            'add', 'delete', 'quit', 'cancel',
             'pause', 'info', 'reload', 'reverse', 'shuffle',
-            'next', 'previous', 'continue'
+            'next', 'previous', 'continue',
+            'watched', 'unwatched', 'mark-until-focus', 'select', 'unselect'
         ]))
         self.enable_autocomplete(self.autocomplete_func)
 
@@ -89,6 +124,8 @@ class CmdlineView(urwid_readline.ReadlineEdit):
             urwid.emit_signal(self, 'done', self, self.get_edit_text())
             return self._callback(self.edit_text) \
                 if self._callback is not None else None
+        if key == 'esc' and self._cancel_callback is not None:
+            return self._cancel_callback()
 
         super().keypress(size, key)
 
@@ -109,12 +146,62 @@ class BaseView(ABC):
         self.title = title
         self.items = items
 
+        self.search = None  # type: Optional[SearchState]
+
     @abstractmethod
     def build(self) -> urwid.WidgetWrap:
         """ Generate widget from provided data
         """
         pass
 
+    @abstractmethod
+    def focus_item(self, idx: int) -> None:
+        """ Move list focus to given item
+        """
+        pass
+
+    def update_info_text(self, txt: str) -> None:
+        """ Show short status message
+        """
+        pass
+
+    def set_search_titles(self, titles: List[str]) -> None:
+        """ (Re)build search index if titles changed
+        """
+        if self.search is not None and self.search.index.source == titles:
+            return
+        self.set_search_index(TitleIndex(titles))
+
+    def set_search_index(self, index: TitleIndex) -> None:
+        self.search = SearchState(index)
+
+    def update_search(self, query: str) -> None:
+        """ Focus best match of (partial) query
+        """
+        if self.search is None:
+            return
+
+        matches = self.search.update(query)
+        if len(query) == 0:
+            return
+        elif len(matches) == 0:
+            self.update_info_text(f'No match for "{query}"')
+        else:
+            self.focus_item(matches[0])
+            self.update_info_text(
+                f'Match 1/{len(matches)} for "{query}"')
+
+    def jump_to_match(self, shift: int) -> None:
+        """ Cycle through matches of last search
+        """
+        if self.search is None or len(self.search.matches) == 0:
+            return
+
+        self.focus_item(self.search.step(shift))
+        self.update_info_text(
+            f'Match {self.search.pos+1}/{len(self.search.matches)} '
+            f'for "{self.search.query}"')
+
     def handle_select(self, button: int, choice: str) -> None:
         """ Handle in-widget list selection
         """
@@ -151,26 +238,115 @@ class PlaylistOverview(BaseView):
 
         self.main_list = urwid.SimpleFocusListWalker(body)
         item_list = urwid.ListBox(self.main_list)
+        self.info_bar = urwid.Text('Press [h] for help.')
+
+        self.set_search_titles(self.items)
 
-        return urwid.Frame(
+        w = urwid.Frame(
             item_list,
             header=urwid.Text(self.title),
-            footer=urwid.Text('Press [h] for help.'))
+            footer=self.info_bar)
+        w.keypress = lambda size, key: \
+            w.body.keypress(size, self.handle_input(key))
+        return w
+
+    def focus_item(self, idx: int) -> None:
+        self.main_list.set_focus(idx)
+        self.controller.update_views()
+
+    def update_info_text(self, txt: str) -> None:
+        self.info_bar.set_text(txt)
+        self.controller.update_views()
+
+    def handle_input(self, key: str) -> Optional[str]:
+        if key == 'c':
+            self.controller.show_continue_watching()
+            return None
+        else:
+            return key
 
     def handle_command(self, cmd: str, args: List[Any]) -> None:
-        if cmd in ('delete',):
+        def refresh(_: Any) -> None:
+            self.controller.view.show_playlist_overview()
+
+        if cmd in ('continue',):
+            self.controller.show_continue_watching()
+        elif cmd in ('delete',):
             idx = self.main_list.get_focus()[1]
             pl_name = self.items[idx]
 
-            self.controller.model.delete_playlist_by_name(pl_name)
-            self.controller.view.show_playlist_overview()
+            self.controller.run_task(
+                self.controller.model.delete_playlist_by_name, pl_name,
+                msg='Deleting playlist', callback=refresh)
         elif cmd in ('add',):
             if len(args) == 0:
                 return
 
-            for pl_name in args:
-                self.controller.model.add_new_playlist(pl_name)
+            def add() -> None:
+                for pl_name in args:
+                    self.controller.model.add_new_playlist(pl_name)
+
+            self.controller.run_task(
+                add, msg='Adding playlist', callback=refresh)
+
+
+class ContinueOverview(BaseView):
+    def __init__(self, controller: 'Controller') -> None:
+        self.controller = controller
+        self.entries = []  # type: List[Dict[str, Any]]
+
+        super().__init__('Continue watching', [])
+
+    def build(self) -> urwid.WidgetWrap:
+        self.main_list = urwid.SimpleFocusListWalker([])
+        self.info_bar = urwid.Text('Loading...')
+
+        w = urwid.Frame(
+            urwid.ListBox(self.main_list),
+            header=urwid.Text(self.title),
+            footer=self.info_bar)
+        w.keypress = lambda size, key: \
+            w.body.keypress(size, self.handle_input(key))
+        return w
+
+    def set_entries(
+        self, entries: List[Dict[str, Any]], rows: List[str]
+    ) -> None:
+        """ Show one row per entry of continue-watching list
+        """
+        self.entries = entries
+        self.items = rows
+
+        body = []
+        for i, row in enumerate(rows):
+            button = urwid.Button(row)
+            urwid.connect_signal(button, 'click', self.handle_select, i)
+            body.append(urwid.AttrMap(button, None, focus_map='reversed'))
+        self.main_list[:] = body
+
+        self.set_search_titles(
+            [f'{e["playlist"]}: {e["title"]}' for e in entries])
+        self.update_info_text(
+            '[Help] enter: play, c: back to playlists' if len(rows) > 0
+            else 'Nothing to continue (playlists show up once opened)')
+
+    def handle_select(self, button: urwid.Button, idx: int) -> None:
+        self.controller.on_continue_selected(self.entries[idx])
+
+    def focus_item(self, idx: int) -> None:
+        self.main_list.set_focus(idx)
+        self.controller.update_views()
+
+    def update_info_text(self, txt: str) -> None:
+        self.info_bar.set_text(txt)
+        self.controller.update_views()
+
+    def handle_input(self, key: str) -> Optional[str]:
+        if key == 'c':
             self.controller.view.show_playlist_overview()
+            return None
+        else:
+            return key
 
 
 class EpisodeOverview(BaseView):
@@ -183,6 +359,10 @@ class EpisodeOverview(BaseView):
 
         self.info = self.controller.get_current_playlist_info()
 
+        # ids of videos selected with `m`, and rows currently highlighted
+        self.selected = set()  # type: Set[str]
+        self._highlighted = set()  # type: Set[int]
+
         super().__init__('Loading...', [])
 
     def build(self) -> urwid.WidgetWrap:
@@ -211,8 +391,12 @@ class EpisodeOverview(BaseView):
         self.info_box.base_widget.set_text(txt)
         self.controller.update_views()
 
-    def handle_select(self, button: int, choice: str) -> None:
-        self.controller.on_video_selected(choice)
+    def handle_select(self, button: urwid.Button) -> None:
+        self.controller.on_video_selected(button.label)
+
+    def focus_item(self, idx: int) -> None:
+        self.vid_list.set_focus(idx)
+        self.controller.update_views()
 
     def handle_input(self, key: str) -> Optional[str]:
         if key == 'c':
@@ -228,13 +412,25 @@ class EpisodeOverview(BaseView):
             return None
         elif key == ' ':
             assert self.controller.player is not None
-            self.controller.player_backend.toggle_pause()
+            self.controller.toggle_pause()
             return None
         elif key == 'w':
+            if len(self.selected) > 0:
+                self.controller.mark_episodes(
+                    self.pop_selection(), watched=None)
+                return None
             idx = self.vid_list.get_focus()[1]
             if idx is not None:
                 self.controller.mark_watched(idx)
             return None
+        elif key == 'm':
+            idx = self.vid_list.get_focus()[1]
+            if idx is not None:
+                self.toggle_selection(idx)
+                if idx + 1 < len(self.vid_list):
+                    self.vid_list.set_focus(idx + 1)
+                self.controller.update_views()
+            return None
         elif key == 'i':
             idx = self.vid_list.get_focus()[1]
             if idx is not None:
@@ -249,22 +445,107 @@ class EpisodeOverview(BaseView):
 
         self.controller.update_views()
 
-    def set_items(self, items: List[str]) -> None:
+    def set_items(
+        self,
+        items: List[str], titles: Optional[List[str]] = None
+    ) -> None:
         old_focus = self.vid_list.get_focus()[1]
-        self.vid_list.clear()
+        old_items = self.items
 
         self.items = items
-        for it in self.items:
-            button = urwid.Button(it)
-            urwid.connect_signal(button, 'click', self.handle_select, it)
-            self.vid_list.append(
-                urwid.AttrMap(button, None, focus_map='reversed'))
-
-        if old_focus is not None:
-            self.vid_list.set_focus(old_focus)
+        self.set_search_titles(titles if titles is not None else items)
 
+        if len(old_items) == len(items):
+            # only relabel changed rows instead of rebuilding all widgets
+            for i, (old, new) in enumerate(zip(old_items, items)):
+                if old != new:
+                    self.vid_list[i].base_widget.set_label(new)
+        else:
+            # rows were inserted or removed, only replace those between
+            # unchanged head and tail
+            start, old_end, new_end = 0, len(old_items), len(items)
+            while start < min(old_end, new_end) \
+                    and old_items[start] == items[start]:
+                start += 1
+            while old_end > start and new_end > start \
+                    and old_items[old_end - 1] == items[new_end - 1]:
+                old_end -= 1
+                new_end -= 1
+
+            self.vid_list[start:old_end] = [
+                self._make_row(it) for it in items[start:new_end]]
+
+            if old_focus is not None and old_focus >= old_end:
+                old_focus += new_end - old_end
+
+            # rows moved, highlight all of them anew
+            self._highlighted = set(range(len(items))) \
+                if len(self.selected) > 0 else set()
+
+        if old_focus is not None and len(items) > 0:
+            self.vid_list.set_focus(min(old_focus, len(items) - 1))
+
+        self._highlight_selection()
         self.controller.update_views()
 
+    def _video_ids(self) -> List[str]:
+        pl = self.controller.player
+        if pl is None or pl.playlist is None:
+            return []
+        return [vid.id for vid in pl.playlist]
+
+    def toggle_selection(self, idx: int) -> None:
+        vid_id = self._video_ids()[idx]
+        if vid_id in self.selected:
+            self.selected.remove(vid_id)
+        else:
+            self.selected.add(vid_id)
+        self._highlight_selection()
+
+    def pop_selection(self) -> List[int]:
+        """ Indices of selected videos, selection is cleared
+        """
+        indices = [
+            i for i, vid_id in enumerate(self._video_ids())
+            if vid_id in self.selected]
+        self.selected.clear()
+        self._highlight_selection()
+        return indices
+
+    def _highlight_selection(self) -> None:
+        if len(self.selected) == 0 and len(self._highlighted) == 0:
+            return
+
+        rows = {
+            i for i, vid_id in enumerate(self._video_ids())
+            if vid_id in self.selected and i < len(self.vid_list)}
+        for i in self._highlighted | rows:
+            if i < len(self.vid_list):
+                self.vid_list[i].set_attr_map(
+                    {None: 'selected' if i in rows else None})
+        self._highlighted = rows
+
+    def _target_indices(self, args: List[Any]) -> Optional[List[int]]:
+        """ Videos a command applies to: given range, selection
+            or focused video
+        """
+        if len(args) > 0:
+            try:
+                return parse_range(' '.join(args), len(self.vid_list))
+            except ValueError as err:
+                self.update_info_text(str(err))
+                return None
+        if len(self.selected) > 0:
+            return self.pop_selection()
+
+        idx = self.vid_list.get_focus()[1]
+        return [idx] if idx is not None else None
+
+    def _make_row(self, label: str) -> urwid.Widget:
+        button = urwid.Button(label)
+        urwid.connect_signal(button, 'click', self.handle_select)
+        return urwid.AttrMap(button, None, focus_map='reversed')
+
     def handle_command(self, cmd: str, args: List[Any]) -> None:
         pl = self.controller.player
 
@@ -274,11 +555,36 @@ class EpisodeOverview(BaseView):
         elif cmd in ('reverse',):
             if pl is not None and pl.playlist is not None:
                 pl.playlist.reverse()
+                pl.preload_next_video()
                 pl.setup(reload_playlist=False)
         elif cmd in ('shuffle',):
             if pl is not None and pl.playlist is not None:
                 pl.playlist.shuffle()
+                pl.preload_next_video()
                 pl.setup(reload_playlist=False)
+        elif cmd in ('watched', 'unwatched'):
+            indices = self._target_indices(args)
+            if indices is not None:
+                self.selected.clear()
+                self._highlight_selection()
+                self.controller.mark_episodes(
+                    indices, watched=cmd == 'watched')
+        elif cmd in ('mark-until-focus',):
+            idx = self.vid_list.get_focus()[1]
+            if idx is not None and idx > 0:
+                self.controller.mark_episodes(range(idx), watched=True)
+        elif cmd in ('select',):
+            idx = self.vid_list.get_focus()[1]
+            indices = self._target_indices(args) if len(args) > 0 \
+                else [idx] if idx is not None else None
+            if indices is not None:
+                ids = self._video_ids()
+                self.selected.update(ids[i] for i in indices)
+                self._highlight_selection()
+                self.controller.update_views()
+        elif cmd in ('unselect',):
+            self.pop_selection()
+            self.controller.update_views()
         elif cmd in ('next',):
             assert self.controller.player is not None
             self.controller.player.play_next_video()
@@ -289,7 +595,7 @@ class EpisodeOverview(BaseView):
             self.controller.continue_playback()
         elif cmd in ('pause',):
             assert self.controller.player is not None
-            self.controller.player_backend.toggle_pause()
+            self.controller.toggle_pause()
         elif cmd in ('info',):
             idx = self.vid_list.get_focus()[1]
             if idx is not None:
@@ -0,0 +1,149 @@
+"""
+Minimal AirPlay video client on top of a single keep-alive connection
+"""
+
+import socket
+import plistlib
+import threading
+import urllib.parse
+
+from logzero import logger
+
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .http_session import HTTPSession
+
+
+class AirPlayClient:
+    """ Control an AirPlay receiver, all commands share one connection
+    """
+
+    def __init__(
+        self,
+        host: str, port: int = 7000, timeout: float = 5
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+        self.session = HTTPSession(host, port, timeout=timeout)
+
+    def _request(
+        self,
+        method: str, path: str,
+        body: bytes = b'', headers: Optional[Dict[str, str]] = None,
+        **params: Any
+    ) -> Tuple[int, str, bytes]:
+        if len(params) > 0:
+            path += '?' + urllib.parse.urlencode(params)
+
+        status, resp_headers, data = self.session.request(
+            method, path, body, headers)
+        return status, resp_headers.get('content-type', ''), data
+
+    def play(self, url: str, position: float = 0.) -> bool:
+        """ Start playback, position is a fraction between 0 and 1
+        """
+        body = f'Content-Location: {url}\nStart-Position: {position}\n\n'
+        status, _, _ = self._request(
+            'POST', '/play', body.encode(),
+            {'Content-Type': 'text/parameters'})
+        return status == 200
+
+    def rate(self, value: float) -> bool:
+        status, _, _ = self._request('POST', '/rate', value=float(value))
+        return status == 200
+
+    def scrub(self, position: float) -> bool:
+        """ Seek to position (in seconds)
+        """
+        status, _, _ = self._request(
+            'POST', '/scrub', position=float(position))
+        return status == 200
+
+    def stop(self) -> bool:
+        status, _, _ = self._request('POST', '/stop')
+        return status == 200
+
+    def playback_info(self) -> Dict[str, Any]:
+        """ Return playback state (position, duration, rate, ...),
+            empty if nothing is playing
+        """
+        status, ctype, data = self._request('GET', '/playback-info')
+        if status != 200 or len(data) == 0 \
+                or ctype != 'text/x-apple-plist+xml':
+            return {}
+        return plistlib.loads(data)
+
+    def server_info(self) -> Dict[str, Any]:
+        status, ctype, data = self._request('GET', '/server-info')
+        if status != 200 or len(data) == 0:
+            return {}
+        return plistlib.loads(data)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def listen_events(
+        self,
+        callback: Callable[[Dict[str, Any]], None],
+        stop: threading.Event
+    ) -> None:
+        """ Receive video events via reverse HTTP until `stop` is set
+        """
+        sock = socket.create_connection(
+            (self.host, self.port), timeout=self.timeout)
+
+        def read_until(buf: bytes, done: Callable[[bytes], bool]) -> bytes:
+            while not done(buf):
+                try:
+                    chunk = sock.recv(4096)
+                except socket.timeout:
+                    if stop.is_set():
+                        raise EOFError
+                    continue
+                if len(chunk) == 0:
+                    raise EOFError
+                buf += chunk
+            return buf
+
+        def has_head(buf: bytes) -> bool:
+            return b'\r\n\r\n' in buf
+
+        try:
+            sock.sendall(
+                b'POST /reverse HTTP/1.1\r\n'
+                b'Upgrade: PTTH/1.0\r\nConnection: Upgrade\r\n'
+                b'Content-Length: 0\r\n\r\n')
+
+            head, buf = read_until(b'', has_head).split(b'\r\n\r\n', 1)
+            if b' 101 ' not in head.split(b'\r\n')[0]:
+                raise RuntimeError(f'Unexpected reverse HTTP response: {head}')
+
+            # check regularly whether we are supposed to stop
+            sock.settimeout(.5)
+            while not stop.is_set():
+                head, buf = read_until(buf, has_head).split(b'\r\n\r\n', 1)
+
+                length = 0
+                for line in head.split(b'\r\n')[1:]:
+                    key, _, val = line.decode().partition(':')
+                    if key.strip().lower() == 'content-length':
+                        length = int(val)
+
+                buf = read_until(buf, lambda b: len(b) >= length)
+                body, buf = buf[:length], buf[length:]
+
+                sock.sendall(b'HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n')
+
+                try:
+                    event = plistlib.loads(body)
+                except Exception:
+                    logger.warning(f'Invalid AirPlay event: {body!r}')
+                    continue
+                if event.get('category') == 'video':
+                    callback(event)
+        except EOFError:
+            pass
+        finally:
+            sock.close()
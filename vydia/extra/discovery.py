@@ -0,0 +1,149 @@
+"""
+Concurrent, cached discovery of AirPlay and DLNA devices
+"""
+
+import json
+import time
+import collections
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from logzero import logger
+
+from typing import Any, Callable, Dict, List, Optional  # noqa: F401
+
+
+class Device(collections.namedtuple(
+    'Device', ['kind', 'name', 'address', 'model']
+)):
+    @property
+    def spec(self) -> str:
+        """ Player specification as understood by `--remote`
+        """
+        return f'{self.kind}::{self.address}'
+
+
+def scan_airplay(timeout: float) -> List[Device]:
+    from airplay import AirPlay
+    from .airplay_client import AirPlayClient
+
+    def describe(ap: Any) -> Device:
+        ap.control_socket.close()
+        try:
+            info = AirPlayClient(ap.host, ap.port, timeout=timeout) \
+                .server_info()
+        except OSError:
+            info = {}
+        return Device(
+            'airplay', ap.name or ap.host,
+            f'{ap.host}:{ap.port}', info.get('model', 'unknown'))
+
+    found = AirPlay.find(timeout=timeout, fast=False) or []
+    if len(found) == 0:
+        return []
+
+    # query all devices at once instead of one after another
+    with ThreadPoolExecutor(len(found)) as pool:
+        return list(pool.map(describe, found))
+
+
+def scan_dlna(timeout: float) -> List[Device]:
+    from nanodlna import devices
+
+    return [
+        Device(
+            'dlna', dev['friendly_name'] or dev['hostname'],
+            dev['location'], dev['manufacturer'] or 'unknown')
+        for dev in devices.get_devices(timeout=timeout)]
+
+
+SCANNERS = {
+    'airplay': scan_airplay,
+    'dlna': scan_dlna
+}  # type: Dict[str, Callable[[float], List[Device]]]
+
+
+def discover(timeout: float = 3) -> List[Device]:
+    """ Run all scanners concurrently, failing ones are skipped
+    """
+    pool = ThreadPoolExecutor(len(SCANNERS))
+    futures = {
+        pool.submit(func, timeout): kind
+        for kind, func in SCANNERS.items()}
+
+    # scanners handle `timeout` themselves, grant some slack for lookups
+    done, pending = wait(futures, timeout=timeout + 5)
+    pool.shutdown(wait=False)
+
+    result = []
+    for fut in futures:
+        kind = futures[fut]
+        if fut in pending:
+            logger.warning(f'{kind} discovery timed out')
+        elif fut.exception() is not None:
+            logger.warning(f'{kind} discovery failed: {fut.exception()}')
+        else:
+            result.extend(fut.result())
+    return result
+
+
+class DeviceCache:
+    """ Remember discovered devices for `ttl` seconds
+    """
+
+    def __init__(self, fname: Path, ttl: float = 24 * 60 * 60) -> None:
+        self.fname = Path(fname)
+        self.ttl = ttl
+
+    def load(self) -> Optional[List[Device]]:
+        """ Return cached devices, None if cache is missing or expired
+        """
+        try:
+            with self.fname.open() as fd:
+                data = json.load(fd)
+        except (OSError, ValueError):
+            return None
+
+        if time.time() - data.get('timestamp', 0) > self.ttl:
+            return None
+        return [Device(*dev) for dev in data.get('devices', [])]
+
+    def save(self, devices: List[Device]) -> None:
+        self.fname.parent.mkdir(parents=True, exist_ok=True)
+        with self.fname.open('w') as fd:
+            json.dump({
+                'timestamp': time.time(),
+                'devices': [list(dev) for dev in devices]
+            }, fd)
+
+    def get_devices(
+        self,
+        refresh: bool = False, timeout: float = 3
+    ) -> List[Device]:
+        devices = None if refresh else self.load()
+        if not devices:
+            devices = discover(timeout)
+            # an empty scan (e.g. network not up yet) must not stick
+            if len(devices) > 0:
+                self.save(devices)
+        return devices
+
+    def resolve(self, remote: str) -> str:
+        """ Turn device index (e.g. "2" or "#2") or name into player spec,
+            explicit specs (containing "::") are returned as is
+        """
+        if '::' in remote:
+            return remote
+
+        for refresh in (False, True):
+            devices = self.get_devices(refresh=refresh)
+
+            idx = remote.lstrip('#')
+            if idx.isdigit() and 0 < int(idx) <= len(devices):
+                return devices[int(idx) - 1].spec
+
+            for dev in devices:
+                if dev.name.lower() == remote.lower():
+                    return dev.spec
+
+        raise ValueError(f'Unknown device "{remote}"')
@@ -0,0 +1,112 @@
+"""
+Minimal UPnP AVTransport client for DLNA renderers
+"""
+
+import urllib.parse
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape as xmlescape
+
+from typing import Dict, List, Tuple
+
+from .http_session import HTTPSession
+from .utils import sec2ts, ts2sec
+
+
+SERVICE_TYPE = 'urn:schemas-upnp-org:service:AVTransport:1'
+
+SOAP_TEMPLATE = '''<?xml version="1.0" encoding="utf-8"?>
+<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/" \
+s:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">
+  <s:Body>
+    <u:{action} xmlns:u="{service}">
+      <InstanceID>0</InstanceID>{args}
+    </u:{action}>
+  </s:Body>
+</s:Envelope>'''
+
+
+class DLNAError(RuntimeError):
+    pass
+
+
+def parse_duration(value: str) -> int:
+    """ Parse UPnP time values such as '0:01:02' or '00:01:02.500'
+    """
+    value = value.split('.')[0].strip()
+    if value.count(':') != 2 or value.startswith('NOT_IMPLEMENTED'):
+        return 0
+    try:
+        return ts2sec(value)
+    except ValueError:
+        return 0
+
+
+class AVTransportClient:
+    """ Control a renderer's AVTransport service over one connection
+    """
+
+    def __init__(self, action_url: str, timeout: float = 5) -> None:
+        self.action_url = action_url
+
+        url = urllib.parse.urlparse(action_url)
+        self.path = url.path + (f'?{url.query}' if url.query else '')
+        self.session = HTTPSession(
+            url.hostname, url.port or 80, timeout=timeout)
+
+    def _action(
+        self,
+        action: str, args: List[Tuple[str, str]] = []
+    ) -> Dict[str, str]:
+        body = SOAP_TEMPLATE.format(
+            action=action, service=SERVICE_TYPE,
+            args=''.join(
+                f'\n      <{k}>{xmlescape(str(v))}</{k}>' for k, v in args))
+
+        status, _, data = self.session.request(
+            'POST', self.path, body.encode(), {
+                'Content-Type': 'text/xml; charset="utf-8"',
+                'SOAPACTION': f'"{SERVICE_TYPE}#{action}"'
+            })
+        if status != 200:
+            raise DLNAError(f'{action} failed with status {status}')
+
+        # return output arguments by (namespace-less) tag name
+        result = {}
+        for node in ET.fromstring(data).iter():
+            if len(node) == 0 and node.text is not None:
+                result[node.tag.split('}')[-1]] = node.text
+        return result
+
+    def set_uri(self, uri: str, metadata: str = '') -> None:
+        self._action('SetAVTransportURI', [
+            ('CurrentURI', uri), ('CurrentURIMetaData', metadata)])
+
+    def play(self) -> None:
+        self._action('Play', [('Speed', '1')])
+
+    def pause(self) -> None:
+        self._action('Pause')
+
+    def stop(self) -> None:
+        self._action('Stop')
+
+    def seek(self, position: int) -> None:
+        self._action('Seek', [
+            ('Unit', 'REL_TIME'), ('Target', sec2ts(position))])
+
+    def get_transport_state(self) -> str:
+        """ E.g. PLAYING, PAUSED_PLAYBACK, STOPPED, TRANSITIONING
+        """
+        return self._action('GetTransportInfo').get(
+            'CurrentTransportState', 'NO_MEDIA_PRESENT')
+
+    def get_position(self) -> Tuple[int, int]:
+        """ Return position and duration (in seconds) of current track
+        """
+        info = self._action('GetPositionInfo')
+        return (
+            parse_duration(info.get('RelTime', '')),
+            parse_duration(info.get('TrackDuration', '')))
+
+    def close(self) -> None:
+        self.session.close()
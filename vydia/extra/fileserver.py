@@ -0,0 +1,230 @@
+"""
+Threaded HTTP server which streams local files to remote renderers
+"""
+
+import os
+import re
+import socket
+import hashlib
+import mimetypes
+import threading
+import socketserver
+import http.server
+import urllib.parse
+
+from logzero import logger
+
+from typing import Dict, Optional, Tuple  # noqa: F401
+
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+_servers = {}  # type: Dict[str, FileServer]
+_servers_lock = threading.Lock()
+
+
+def get_serve_ip(target_host: str) -> str:
+    """ Find local address which is reachable from `target_host`
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.connect((target_host, 9))
+        return sock.getsockname()[0]
+
+
+def get_file_server(host: str) -> 'FileServer':
+    """ Return running file server bound to `host` (started on first use)
+    """
+    with _servers_lock:
+        if host not in _servers:
+            server = FileServer(host)
+            server.start()
+            _servers[host] = server
+        return _servers[host]
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """ Parse single byte range into inclusive (start, end),
+        raise ValueError if it cannot be satisfied
+    """
+    match = RANGE_PATTERN.match(header.strip())
+    if match is None:
+        # multiple or malformed ranges are answered with the whole file
+        return None
+
+    first, last = match.groups()
+    if first == '' and last == '':
+        return None
+    elif first == '':  # suffix range, e.g. last 500 bytes
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last != '' else size - 1
+
+    if start >= size or start > end:
+        raise ValueError(f'Unsatisfiable range "{header}"')
+    return start, end
+
+
+class FileRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server: 'FileServer'
+
+    def log_message(self, fmt: str, *args: object) -> None:
+        logger.debug(f'{self.address_string()} - {fmt % args}')
+
+    def do_HEAD(self) -> None:
+        self._serve(send_body=False)
+
+    def do_GET(self) -> None:
+        self._serve(send_body=True)
+
+    def _serve(self, send_body: bool) -> None:
+        token = urllib.parse.urlparse(self.path).path.split('/')[2:3]
+        path = self.server.files.get(token[0]) if len(token) > 0 else None
+        if path is None:
+            self.send_error(404)
+            return
+
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            self.send_error(404)
+            return
+
+        try:
+            size = os.fstat(fd).st_size
+            start, end = 0, size - 1
+
+            try:
+                byte_range = parse_range(self.headers.get('Range', ''), size)
+            except ValueError:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            if byte_range is not None:
+                start, end = byte_range
+                self.send_response(206)
+                self.send_header(
+                    'Content-Range', f'bytes {start}-{end}/{size}')
+            else:
+                self.send_response(200)
+
+            ctype = mimetypes.guess_type(path)[0]
+            self.send_header(
+                'Content-Type', ctype or 'application/octet-stream')
+            self.send_header('Content-Length', str(end - start + 1))
+            self.send_header('Accept-Ranges', 'bytes')
+            self.end_headers()
+
+            if send_body:
+                self._send_file(fd, start, end - start + 1)
+        except (BrokenPipeError, ConnectionResetError):
+            # client went away (e.g. renderer seeked elsewhere)
+            self.close_connection = True
+        finally:
+            os.close(fd)
+
+    def _send_file(self, fd: int, offset: int, count: int) -> None:
+        """ Send file region using zero-copy `sendfile` if available
+        """
+        self.wfile.flush()
+
+        if hasattr(os, 'sendfile'):
+            out = self.connection.fileno()
+            while count > 0:
+                sent = os.sendfile(out, fd, offset, count)
+                if sent == 0:
+                    raise BrokenPipeError
+                offset += sent
+                count -= sent
+        else:
+            os.lseek(fd, offset, os.SEEK_SET)
+            while count > 0:
+                chunk = os.read(fd, min(count, 1 << 16))
+                if len(chunk) == 0:
+                    raise BrokenPipeError
+                self.wfile.write(chunk)
+                count -= len(chunk)
+
+
+# `http.server.ThreadingHTTPServer` needs Python 3.7
+class FileServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """ Serve registered local files, one thread per connection
+    """
+    daemon_threads = True
+
+    def __init__(self, host: str = '0.0.0.0', port: int = 0) -> None:
+        super().__init__((host, port), FileRequestHandler)
+        self.files = {}  # type: Dict[str, str]
+        self._thread = None  # type: Optional[threading.Thread]
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def add_file(self, path: str) -> str:
+        """ Register file and return its URL
+        """
+        path = os.path.abspath(path)
+        token = hashlib.sha1(path.encode()).hexdigest()[:16]
+        self.files[token] = path
+
+        host, port = self.server_address[:2]
+        name = urllib.parse.quote(os.path.basename(path))
+        return f'http://{host}:{port}/files/{token}/{name}'
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    import tempfile
+    import http.client
+    from concurrent.futures import ThreadPoolExecutor
+
+    # throughput benchmark: python -m vydia.extra.fileserver [MB] [clients]
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    def _fetch(url: str, start: int = 0) -> int:
+        parts = urllib.parse.urlparse(url)
+        conn = http.client.HTTPConnection(parts.hostname, parts.port)
+        conn.request('GET', parts.path, headers={'Range': f'bytes={start}-'})
+        resp = conn.getresponse()
+
+        total = 0
+        while True:
+            chunk = resp.read(1 << 20)
+            if len(chunk) == 0:
+                break
+            total += len(chunk)
+        conn.close()
+        return total
+
+    with tempfile.NamedTemporaryFile(suffix='.mp4') as fd:
+        block = os.urandom(1 << 20)
+        for _ in range(size_mb):
+            fd.write(block)
+        fd.flush()
+
+        server = get_file_server('127.0.0.1')
+        url = server.add_file(fd.name)
+
+        for n in (1, clients):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(n) as pool:
+                total = sum(pool.map(
+                    _fetch, [url] * n,
+                    [i * (size_mb << 20) // (2 * n) for i in range(n)]))
+            dur = time.perf_counter() - start
+            print(f'{n} client(s): {total / dur / 2**20:.1f} MiB/s '
+                  f'({total / 2**20:.0f} MiB in {dur:.2f}s)')
+
+        server.stop()
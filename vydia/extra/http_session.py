@@ -0,0 +1,60 @@
+"""
+Persistent HTTP connection shared by the remote player backends
+"""
+
+import threading
+import http.client
+
+from typing import Dict, Optional, Tuple
+
+
+class HTTPSession:
+    """ Keep-alive HTTP/1.1 connection to a single host
+
+        Requests are serialized, a connection which was closed by the
+        server in the meantime is transparently re-established once.
+    """
+
+    def __init__(self, host: str, port: int, timeout: float = 5) -> None:
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+        self._conn = None  # type: Optional[http.client.HTTPConnection]
+        self._lock = threading.Lock()
+
+    def request(
+        self,
+        method: str, path: str,
+        body: bytes = b'', headers: Optional[Dict[str, str]] = None
+    ) -> Tuple[int, http.client.HTTPMessage, bytes]:
+        with self._lock:
+            for attempt in range(2):
+                if self._conn is None:
+                    self._conn = http.client.HTTPConnection(
+                        self.host, self.port, timeout=self.timeout)
+                try:
+                    self._conn.request(
+                        method, path, body=body, headers=headers or {})
+                    resp = self._conn.getresponse()
+                    data = resp.read()
+                except (http.client.HTTPException, OSError):
+                    # stale keep-alive connection, retry once
+                    self._conn.close()
+                    self._conn = None
+                    if attempt > 0:
+                        raise
+                    continue
+
+                if resp.will_close:
+                    self._conn.close()
+                    self._conn = None
+                return resp.status, resp.headers, data
+
+        raise RuntimeError('unreachable')
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
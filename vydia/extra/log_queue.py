@@ -0,0 +1,181 @@
+"""
+Move log output off the calling thread
+"""
+
+import json
+import time
+import queue
+import logging
+import logging.handlers
+import threading
+
+from typing import Any, Dict, Iterator, List, Optional  # noqa: F401
+
+from . import metrics
+
+
+# attributes every record has, everything else was passed as `extra`
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord(
+    '', 0, '', 0, '', (), None, None))) | {'message', 'asctime', 'enqueued'}
+
+
+class JSONFormatter(logging.Formatter):
+    """ One JSON object per line, including when the record was created
+        and how long it waited to be written
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'location': f'{record.module}:{record.lineno}',
+            'message': record.getMessage(),
+        }  # type: Dict[str, Any]
+
+        enqueued = getattr(record, 'enqueued', None)
+        if enqueued is not None:
+            entry['queue_delay'] = round(time.perf_counter() - enqueued, 6)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """ Never block: drop records while queue is full, and count them
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        super().__init__(queue.Queue(maxsize))
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # formatting happens in listener thread
+        record.enqueued = time.perf_counter()
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            metrics.inc('log_records_dropped')
+
+
+class QueueLogging:
+    """ Let background thread write records of `logger` to the handlers
+        it had before, with at most `maxsize` records waiting
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        maxsize: int = 10_000, json_lines: bool = False
+    ) -> None:
+        self.logger = logger
+        self.handler = DroppingQueueHandler(maxsize)
+        self.handler.owner = self  # type: ignore
+        self.json_lines = json_lines
+
+        self._handlers = []  # type: List[logging.Handler]
+        self._formatters = []  # type: List[Optional[logging.Formatter]]
+        self._reported = 0
+        self._listener = None  # type: Optional[logging.handlers.QueueListener]
+
+    def __enter__(self) -> 'QueueLogging':
+        self.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.stop()
+
+    @property
+    def handlers(self) -> List[logging.Handler]:
+        """ Handlers records end up in
+        """
+        return list(self._handlers)
+
+    def start(self) -> None:
+        uninstall(self.logger)
+
+        self._handlers = list(self.logger.handlers)
+        self._formatters = [h.formatter for h in self._handlers]
+        if self.json_lines:
+            for handler in self._handlers:
+                if isinstance(handler, logging.FileHandler):
+                    handler.setFormatter(JSONFormatter())
+
+        self._listener = _ReportingListener(self, self._handlers)
+        self.logger.handlers = [self.handler]
+        self._listener.start()
+
+    def stop(self) -> None:
+        """ Write remaining records and restore handlers
+        """
+        if self._listener is None:
+            return
+
+        self.logger.handlers = self._handlers
+        self._listener.stop()
+        self._listener = None
+        self._report_drops()
+
+        for handler, formatter in zip(self._handlers, self._formatters):
+            handler.setFormatter(formatter)
+
+    def _report_drops(self) -> None:
+        dropped = self.handler.dropped
+        if dropped > self._reported:
+            record = self.logger.makeRecord(
+                self.logger.name, logging.WARNING, __file__, 0,
+                f'Dropped {dropped - self._reported} log records '
+                f'({dropped} in total), logging is too slow',
+                (), None, extra={'dropped': dropped})
+            self._reported = dropped
+            for handler in self._handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+
+class _ReportingListener(logging.handlers.QueueListener):
+    def __init__(
+        self, owner: QueueLogging, handlers: List[logging.Handler]
+    ) -> None:
+        super().__init__(
+            owner.handler.queue, *handlers, respect_handler_level=True)
+        self.owner = owner
+
+    def handle(self, record: logging.LogRecord) -> None:
+        self.owner._report_drops()
+        super().handle(record)
+
+    def enqueue_sentinel(self) -> None:
+        # queue may be full, but is being drained
+        self.queue.put(self._sentinel)  # type: ignore
+
+
+def uninstall(logger: logging.Logger) -> None:
+    """ Stop queueing records of `logger` (if that was the case)
+    """
+    for handler in list(logger.handlers):
+        owner = getattr(handler, 'owner', None)
+        if isinstance(owner, QueueLogging):
+            owner.stop()
+
+
+def iter_handlers(logger: logging.Logger) -> Iterator[logging.Handler]:
+    """ Handlers of `logger`, looking behind queue handler
+    """
+    for handler in logger.handlers:
+        owner = getattr(handler, 'owner', None)
+        if isinstance(owner, QueueLogging):
+            yield from owner.handlers
+        else:
+            yield handler
@@ -0,0 +1,229 @@
+"""
+Counters and latency histograms of hot paths, no-ops unless enabled
+"""
+
+import os
+import json
+import time
+import bisect
+import threading
+import contextlib
+
+from pathlib import Path
+
+from typing import Any, Dict, Iterator, List, Optional, Tuple  # noqa: F401
+
+
+# upper bounds (in seconds) of latency buckets, last one is +Inf
+BUCKETS = (
+    .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10., 30.)
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+_enabled = False
+_lock = threading.Lock()
+_started = time.time()
+_counters = {}  # type: Dict[Key, float]
+_histograms = {}  # type: Dict[Key, List[Any]]
+
+
+def get_metrics_dir() -> Path:
+    from appdirs import AppDirs
+    return Path(AppDirs('vydia', 'kpj').user_data_dir) / 'metrics'
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    global _started
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _started = time.time()
+
+
+def _key(name: str, labels: Dict[str, Any]) -> Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels: Any) -> None:
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, value: float, **labels: Any) -> None:
+    """ Add `value` (e.g. duration in seconds) to histogram
+    """
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        # bucket counts, sum, count
+        hist = _histograms.setdefault(key, [[0] * (len(BUCKETS) + 1), 0., 0])
+        hist[0][bisect.bisect_left(BUCKETS, value)] += 1
+        hist[1] += value
+        hist[2] += 1
+
+
+@contextlib.contextmanager
+def _timed(name: str, labels: Dict[str, Any]) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+# suppressing nothing, i.e. `contextlib.nullcontext` before Python 3.7
+_null_timer = contextlib.suppress()
+
+
+def timer(name: str, **labels: Any) -> Any:
+    """ Observe duration of `with` block
+    """
+    if not _enabled:
+        return _null_timer
+    return _timed(name, labels)
+
+
+def snapshot() -> Dict[str, Any]:
+    """ JSON-serializable copy of all metrics
+    """
+    with _lock:
+        return {
+            'started': _started,
+            'updated': time.time(),
+            'pid': os.getpid(),
+            'buckets': list(BUCKETS),
+            'counters': [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(_counters.items())],
+            'histograms': [
+                {'name': name, 'labels': dict(labels),
+                 'buckets': list(hist[0]), 'sum': hist[1], 'count': hist[2]}
+                for (name, labels), hist in sorted(_histograms.items())]
+        }
+
+
+def quantile(hist: Dict[str, Any], q: float, buckets: List[float]) -> float:
+    """ Upper bound of bucket containing `q`-quantile
+    """
+    rank = q * hist['count']
+    seen = 0
+    for bound, count in zip(buckets, hist['buckets']):
+        seen += count
+        if seen >= rank:
+            return bound
+    return float('inf')
+
+
+def to_prometheus(snap: Dict[str, Any]) -> str:
+    """ Format snapshot in Prometheus text exposition format
+    """
+    def escape(value: str) -> str:
+        return value.replace('\\', '\\\\').replace('"', '\\"') \
+            .replace('\n', '\\n')
+
+    def fmt_labels(labels: Dict[str, str], **extra: str) -> str:
+        labels = dict(labels, **extra)
+        if len(labels) == 0:
+            return ''
+        inner = ','.join(
+            f'{k}="{escape(v)}"' for k, v in labels.items())
+        return f'{{{inner}}}'
+
+    lines = []
+    typed = set()
+    for counter in snap['counters']:
+        name = f'vydia_{counter["name"]}_total'
+        if name not in typed:
+            typed.add(name)
+            lines.append(f'# TYPE {name} counter')
+        lines.append(f'{name}{fmt_labels(counter["labels"])} '
+                     f'{counter["value"]}')
+
+    for hist in snap['histograms']:
+        name = f'vydia_{hist["name"]}'
+        if name not in typed:
+            typed.add(name)
+            lines.append(f'# TYPE {name} histogram')
+
+        total = 0
+        bounds = [str(b) for b in snap['buckets']] + ['+Inf']
+        for bound, count in zip(bounds, hist['buckets']):
+            total += count
+            lines.append(
+                f'{name}_bucket{fmt_labels(hist["labels"], le=bound)} {total}')
+        lines.append(f'{name}_sum{fmt_labels(hist["labels"])} {hist["sum"]}')
+        lines.append(
+            f'{name}_count{fmt_labels(hist["labels"])} {hist["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def write(directory: Path) -> None:
+    """ Store snapshot as `metrics.json` and `metrics.prom` (to be picked
+        up by e.g. the node-exporter textfile collector)
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    snap = snapshot()
+
+    for fname, content in (
+            ('metrics.json', json.dumps(snap, indent=2)),
+            ('metrics.prom', to_prometheus(snap))):
+        tmp_fname = directory / f'{fname}.{os.getpid()}.tmp'
+        with open(tmp_fname, 'w') as fd:
+            fd.write(content)
+        os.replace(tmp_fname, directory / fname)
+
+
+def load(directory: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(directory / 'metrics.json') as fd:
+            return json.load(fd)
+    except FileNotFoundError:
+        return None
+
+
+class MetricsWriter:
+    """ Write metrics every `interval` seconds and when stopped
+    """
+
+    def __init__(self, directory: Path, interval: float = 10) -> None:
+        self.directory = directory
+        self.interval = interval
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self) -> 'MetricsWriter':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self._stop.set()
+        self._thread.join()
+        write(self.directory)
+
+    def _run(self) -> None:
+        from logzero import logger
+
+        while not self._stop.wait(self.interval):
+            try:
+                write(self.directory)
+            except OSError as err:
+                logger.warning(f'Could not write metrics: {err}')
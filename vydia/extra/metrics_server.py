@@ -0,0 +1,49 @@
+"""
+HTTP endpoint exposing metrics to Prometheus
+"""
+
+import threading
+import socketserver
+import http.server
+
+from logzero import logger
+
+from typing import Any
+
+from .metrics import snapshot, to_prometheus
+
+
+class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+    def log_message(self, fmt: str, *args: object) -> None:
+        logger.debug(f'{self.address_string()} - {fmt % args}')
+
+    def do_GET(self) -> None:
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+
+        body = to_prometheus(snapshot()).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """ Serve metrics at `http://<host>:<port>/metrics`
+    """
+    daemon_threads = True
+
+    def __init__(self, port: int, host: str = '127.0.0.1') -> None:
+        super().__init__((host, port), MetricsRequestHandler)
+        self._thread = threading.Thread(
+            target=self.serve_forever, daemon=True)
+
+    def __enter__(self) -> 'MetricsServer':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.shutdown()
+        self.server_close()
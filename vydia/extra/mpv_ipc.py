@@ -0,0 +1,244 @@
+"""
+Client for mpv's JSON-IPC protocol (`--input-ipc-server`)
+"""
+
+import os
+import re
+import json
+import time
+import socket
+import itertools
+import selectors
+import threading
+
+from logzero import logger
+
+from typing import Any, Callable, Dict, List, Optional, Tuple  # noqa: F401
+
+
+class MPVIPCError(RuntimeError):
+    pass
+
+
+class MPVIPCClient:
+    """ Talk to an mpv process over its Unix socket
+
+        A single selector-driven reader thread dispatches replies,
+        property changes and events. Callbacks are run on that thread.
+    """
+
+    def __init__(self, socket_path: str) -> None:
+        self.socket_path = socket_path
+        self.sock = None  # type: Optional[socket.socket]
+
+        self._request_ids = itertools.count(1)
+        self._observer_ids = itertools.count(1)
+        self._pending = {}  # type: Dict[int, Tuple[threading.Event, list]]
+        self._observers = {}  # type: Dict[int, Callable[[str, Any], None]]
+        self._event_callbacks = []  # type: List[Callable[[Dict], None]]
+        self._disconnect_callbacks = []  # type: List[Callable[[], None]]
+
+        self._write_lock = threading.Lock()
+        # only `connect`/`close` open and close the pipe, never the reader
+        self._wakeup_r = self._wakeup_w = -1
+        self._reader = None  # type: Optional[threading.Thread]
+        self._close_deferred = False
+
+    def connect(self, timeout: float = 5) -> None:
+        """ Connect to socket, waiting for mpv to create it
+        """
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        connected = False
+        try:
+            deadline = time.monotonic() + timeout
+            while True:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                try:
+                    sock.connect(self.socket_path)
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    sock.close()
+                    if time.monotonic() > deadline:
+                        raise MPVIPCError(
+                            f'Could not connect to "{self.socket_path}"')
+                    time.sleep(.05)
+            connected = True
+        finally:
+            if not connected:
+                self._close_pipe()
+
+        sock.setblocking(False)
+        self.sock = sock
+
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+
+    @property
+    def connected(self) -> bool:
+        return self.sock is not None
+
+    def close(self) -> None:
+        if self._reader is None:
+            self._close_pipe()
+            return
+
+        if self._reader.is_alive():
+            os.write(self._wakeup_w, b'x')
+        if self._reader is threading.current_thread():
+            # called from a callback, the reader still selects on the pipe
+            self._close_deferred = True
+            return
+
+        self._reader.join(timeout=1)
+        self._reader = None
+        self._close_pipe()
+
+    def _close_pipe(self) -> None:
+        for fd in (self._wakeup_r, self._wakeup_w):
+            if fd >= 0:
+                os.close(fd)
+        self._wakeup_r = self._wakeup_w = -1
+
+    def _read_loop(self) -> None:
+        assert self.sock is not None
+
+        sel = selectors.DefaultSelector()
+        sel.register(self.sock, selectors.EVENT_READ, 'sock')
+        sel.register(self._wakeup_r, selectors.EVENT_READ, 'wakeup')
+
+        buf = b''
+        running = True
+        while running:
+            for key, _ in sel.select():
+                if key.data == 'wakeup':
+                    running = False
+                    break
+
+                try:
+                    chunk = self.sock.recv(65536)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    chunk = b''
+                if len(chunk) == 0:
+                    running = False
+                    break
+
+                buf += chunk
+                *lines, buf = buf.split(b'\n')
+                for line in lines:
+                    if len(line.strip()) > 0:
+                        self._dispatch(line)
+
+        sel.close()
+        self.sock.close()
+        self.sock = None
+
+        # wake up everyone still waiting for a reply
+        for done, _ in list(self._pending.values()):
+            done.set()
+        for cb in self._disconnect_callbacks:
+            cb()
+
+        if self._close_deferred:
+            self._reader = None
+            self._close_pipe()
+
+    def _dispatch(self, line: bytes) -> None:
+        try:
+            msg = json.loads(line)
+        except ValueError:
+            logger.warning(f'Invalid IPC message: {line!r}')
+            return
+
+        if 'request_id' in msg and 'event' not in msg:
+            entry = self._pending.pop(msg['request_id'], None)
+            if entry is not None:
+                done, result = entry
+                result.append(msg)
+                done.set()
+            return
+
+        # a failing callback must not take down the reader thread
+        try:
+            if msg.get('event') == 'property-change':
+                cb = self._observers.get(msg.get('id'))
+                if cb is not None:
+                    cb(msg['name'], msg.get('data'))
+            elif 'event' in msg:
+                for cb in self._event_callbacks:
+                    cb(msg)
+        except Exception:
+            logger.exception(f'Error while handling {msg}')
+
+    def _send(self, payload: Dict[str, Any]) -> None:
+        if self.sock is None:
+            raise MPVIPCError('Not connected to mpv')
+
+        data = (json.dumps(payload) + '\n').encode()
+        with self._write_lock:
+            self.sock.setblocking(True)
+            try:
+                self.sock.sendall(data)
+            finally:
+                self.sock.setblocking(False)
+
+    def command(self, *args: Any, timeout: Optional[float] = 5) -> Any:
+        """ Execute command and return its data,
+            does not wait for a reply if timeout is None
+        """
+        req_id = next(self._request_ids)
+        done, result = threading.Event(), []  # type: threading.Event, list
+
+        if timeout is not None:
+            self._pending[req_id] = (done, result)
+        try:
+            self._send({'command': list(args), 'request_id': req_id})
+        except OSError as err:
+            self._pending.pop(req_id, None)
+            raise MPVIPCError(f'Failed to send {args}: {err}')
+
+        if timeout is None:
+            return None
+
+        if not done.wait(timeout) or len(result) == 0:
+            self._pending.pop(req_id, None)
+            raise MPVIPCError(f'No reply to {args}')
+
+        reply = result[0]
+        if reply.get('error') != 'success':
+            raise MPVIPCError(f'{args[0]} failed: {reply.get("error")}')
+        return reply.get('data')
+
+    def get_property(self, name: str) -> Any:
+        return self.command('get_property', name)
+
+    def set_property(self, name: str, value: Any) -> None:
+        self.command('set_property', name, value, timeout=None)
+
+    def observe_property(
+        self, name: str, callback: Callable[[str, Any], None]
+    ) -> int:
+        obs_id = next(self._observer_ids)
+        self._observers[obs_id] = callback
+        self.command('observe_property', obs_id, name)
+        return obs_id
+
+    def register_event_callback(
+        self, callback: Callable[[Dict], None]
+    ) -> None:
+        self._event_callbacks.append(callback)
+
+    def register_disconnect_callback(
+        self, callback: Callable[[], None]
+    ) -> None:
+        self._disconnect_callbacks.append(callback)
+
+    def version(self) -> Tuple[int, ...]:
+        """ Parse mpv version, e.g. (0, 38, 0)
+        """
+        res = re.search(r'(\d+)\.(\d+)(?:\.(\d+))?',
+                        self.get_property('mpv-version') or '')
+        if res is None:
+            return (0, 0, 0)
+        return tuple(int(x or 0) for x in res.groups())
@@ -1,22 +1,30 @@
 import os
 import sys
 import enum
-import time
-import urllib
+import random
+import shutil
+import tempfile
 import threading
+import subprocess
 from abc import ABC, abstractmethod
 
-from typing import TYPE_CHECKING, Any, Callable
+from logzero import logger
+
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
 
 if TYPE_CHECKING:
     import mpv
+    from .mpv_ipc import MPVIPCClient  # noqa: F401
     from ..core.controller import Controller  # noqa: F401
 
 
-PlayerEvent = enum.Enum('PlayerEvent', 'VIDEO_OVER VIDEO_QUIT')
+PlayerEvent = enum.Enum('PlayerEvent', 'VIDEO_OVER VIDEO_QUIT VIDEO_NEXT')
 
 
 class BasePlayer(ABC):
+    # whether videos can be queued up to play once the current one ends
+    supports_preload = False
+
     @abstractmethod
     def setup(
         self,
@@ -42,15 +50,39 @@ class BasePlayer(ABC):
     def display_text(self, txt: str, duration: int = 1000) -> None:
         pass
 
+    def queue_video(self, vid: str, title: str = '') -> bool:
+        """ Append video to the backend's internal playlist unless
+            nothing is playing, return whether it was queued;
+            VIDEO_NEXT is emitted once it starts
+            (only called if `supports_preload` is set)
+        """
+        return False
+
+    def clear_queue(self) -> None:
+        """ Drop all queued videos (but keep the current one)
+        """
+        pass
+
     def set_controller(self, controller: 'Controller') -> None:
         self.controller = controller
 
 
 class AirPlayer(BasePlayer):
+    # polling intervals (in seconds), see `AdaptivePoller`
+    FAST_POLL = .25
+    SLOW_POLL = 2.
+    POLL_BURST = 5.
+
     def __init__(self, ip: str, port: int) -> None:
         self.ip = ip
         self.port = port
 
+        self.paused = False
+        self.client = None  # type: Any
+        self.poller = None  # type: Any
+        self._stop_events = threading.Event()
+        self._event_thread = None  # type: Optional[threading.Thread]
+
     def setup(
         self,
         time_callback: Callable[[float], None],
@@ -63,51 +95,89 @@ class AirPlayer(BasePlayer):
         if disable_video:
             raise RuntimeError('Disabling video not supported with Airplay.')
 
-        from airplay import AirPlay
-        self.ap = AirPlay(self.ip, self.port)
-
-        threading.Thread(
-            target=self._handle_events, daemon=True).start()
-        threading.Thread(
-            target=self._check_video_position, daemon=True).start()
-
-    def _handle_events(self) -> None:
-        for event in self.ap.events():
-            state = event['state']
-
-            if state == 'stopped':
-                if self.controller.player.ts is None:
-                    return None
-                assert self.controller.player is not None
-                assert self.controller.player.current_vid is not None
-
-                # AirPlay does not understand the difference between
-                # force-stopping and gracefully ending a video when
-                # it is over. Here, this is approximated by checking
-                # how close we are to the video's end.
-                # A difference of 5 seems to magically work out.
-                MAGIC_END_MARKER = 5
-                time2end = self.controller.player.current_vid.duration \
-                    - self.controller.player.ts
-
-                if time2end < MAGIC_END_MARKER:
-                    self.event_callback(PlayerEvent.VIDEO_OVER)
-                else:
-                    self.event_callback(PlayerEvent.VIDEO_QUIT)
+        from .airplay_client import AirPlayClient
+        from .poller import AdaptivePoller
+
+        # called for every opened playlist, retire previous listeners
+        self._stop_listeners()
+        if self.client is not None:
+            self.client.close()
+
+        self.client = AirPlayClient(self.ip, self.port)
+        self.poller = AdaptivePoller(
+            self._check_video_position,
+            fast=self.FAST_POLL, slow=self.SLOW_POLL, burst=self.POLL_BURST)
+        self.poller.start()
+
+        self._stop_events = threading.Event()
+        self._event_thread = threading.Thread(
+            target=self._handle_events,
+            args=(self.client, self._stop_events), daemon=True)
+        self._event_thread.start()
+
+    def _stop_listeners(self) -> None:
+        if self.poller is not None:
+            self.poller.stop()
+        self._stop_events.set()
+
+    def _handle_events(self, client: Any, stop: threading.Event) -> None:
+        def handle(event: Dict[str, Any]) -> None:
+            # stopped listener may still be waiting for its socket
+            if not stop.is_set():
+                self._handle_event(event)
+
+        try:
+            client.listen_events(handle, stop)
+        except (OSError, RuntimeError) as err:
+            logger.warning(f'AirPlay event stream failed: {err}')
+
+    def _handle_event(self, event: Dict[str, Any]) -> None:
+        state = event.get('state')
+
+        if state == 'loading':
+            self.poller.boost()
+        elif state == 'playing':
+            self.paused = False
+            self.poller.steady()
+        elif state == 'paused':
+            self.paused = True
+            self.poller.idle()
+        elif state == 'stopped':
+            self.poller.idle()
+
+            player = self.controller.player
+            if player is None or player.ts is None \
+                    or player.current_vid is None:
+                return None
+
+            # AirPlay does not understand the difference between
+            # force-stopping and gracefully ending a video when
+            # it is over. Here, this is approximated by checking
+            # how close we are to the video's end.
+            # A difference of 5 seems to magically work out.
+            MAGIC_END_MARKER = 5
+            time2end = player.current_vid.duration - player.ts
+
+            if time2end < MAGIC_END_MARKER:
+                self.event_callback(PlayerEvent.VIDEO_OVER)
+            else:
+                self.event_callback(PlayerEvent.VIDEO_QUIT)
 
     def _check_video_position(self) -> None:
-        while True:
-            info = self.ap.playback_info()
-            if info and 'position' in info:
-                self.time_callback(info['position'])
-            time.sleep(1)
+        info = self.client.playback_info()
+        if 'position' in info:
+            self.time_callback(info['position'])
+        if 'rate' in info:
+            self.paused = info['rate'] == 0
 
     def _is_local_file(self, fname: str) -> bool:
         return os.path.exists(fname)
 
     def play_video(self, vid: str, title: str = '', start: int = 0) -> None:
         if self._is_local_file(vid):
-            vid_url = self.ap.serve(os.path.abspath(vid))
+            from .fileserver import get_file_server, get_serve_ip
+            server = get_file_server(get_serve_ip(self.ip))
+            vid_url = server.add_file(vid)
         else:
             vid_url = vid
 
@@ -117,17 +187,33 @@ class AirPlayer(BasePlayer):
         assert start <= self.controller.player.current_vid.duration
         start_frac = start / self.controller.player.current_vid.duration
 
-        self.ap.play(vid_url, position=start_frac)
+        self.client.play(vid_url, position=start_frac)
+        self.paused = False
+        self.poller.boost()
 
     def toggle_pause(self) -> None:
-        info = self.ap.playback_info()
-        if info['rate'] == 0:
-            self.ap.rate(1)
+        # rate is kept up to date by events and polling
+        self.client.rate(1 if self.paused else 0)
+        self.paused = not self.paused
+
+        if self.paused:
+            self.poller.idle()
         else:
-            self.ap.rate(0)
+            self.poller.boost()
 
     def shutdown(self) -> None:
-        self.ap.stop()
+        if self.client is None:
+            return
+        self._stop_listeners()
+
+        try:
+            self.client.stop()
+        except OSError as err:
+            logger.warning(f'Could not stop AirPlay playback: {err}')
+        self.client.close()
+
+        if self._event_thread is not None:
+            self._event_thread.join(timeout=2)
 
     def display_text(self, txt: str, duration: int = 1000) -> None:
         """ Does not seem possible
@@ -136,6 +222,9 @@ class AirPlayer(BasePlayer):
 
 
 class LocalPlayer(BasePlayer):
+    # the macOS proxy cannot return property values (e.g. playlist-count)
+    supports_preload = sys.platform != 'darwin'
+
     def setup(
         self,
         time_callback: Callable[[float], None],
@@ -145,6 +234,10 @@ class LocalPlayer(BasePlayer):
         self.time_callback = time_callback
         self.event_callback = event_callback
 
+        # files started by `play_video` (as opposed to being queued)
+        self._pending_loads = 0
+        self._lock = threading.Lock()
+
         optional_opts = {}
         if disable_video:
             optional_opts['vo'] = 'null'
@@ -165,7 +258,7 @@ class LocalPlayer(BasePlayer):
             from .macos_mpv_wrapper import MPVProxy
             mpv = MPVProxy(
                 input_default_bindings=True, input_vo_keyboard=True,
-                ytdl=True,
+                ytdl=True, prefetch_playlist=True,
                 **optional_opts)
         else:
             import mpv
@@ -174,6 +267,7 @@ class LocalPlayer(BasePlayer):
                 input_default_bindings=True,
                 input_vo_keyboard=True,
                 ytdl=True,
+                prefetch_playlist=True,
                 **optional_opts)
 
         return mpv
@@ -182,7 +276,13 @@ class LocalPlayer(BasePlayer):
         self.time_callback(pos)
 
     def _handle_mpv_event(self, ev: Any) -> None:
-        if ev['event_id'] == 7:  # end-file
+        if ev['event_id'] == 6:  # start-file
+            with self._lock:
+                if self._pending_loads > 0:
+                    self._pending_loads -= 1
+                    return
+            self.event_callback(PlayerEvent.VIDEO_NEXT)
+        elif ev['event_id'] == 7:  # end-file
             reason = ev['event']['reason']
             if reason == 0:  # graceful shutdown
                 self.event_callback(PlayerEvent.VIDEO_OVER)
@@ -194,6 +294,8 @@ class LocalPlayer(BasePlayer):
         self.mpv.playlist_clear()
         self.mpv._set_property('title', title)
         # self.mpv['title'] = title
+        with self._lock:
+            self._pending_loads += 1
         self.mpv.loadfile(vid, start=start)
 
     def toggle_pause(self) -> None:
@@ -209,10 +311,20 @@ class LocalPlayer(BasePlayer):
     def display_text(self, txt: str, duration: int = 1000) -> None:
         self.mpv.show_text(txt, duration=duration)
 
-    def queue_video(self, vid: str) -> None:
-        plc = int(self.mpv._get_property('playlist-count'))
-        mode = 'replace' if plc == 0 else 'append-play'
-        self.mpv.loadfile(vid, mode=mode)
+    def queue_video(self, vid: str, title: str = '') -> bool:
+        # appending to an idle player would start playback
+        if int(self.mpv._get_property('playlist-count')) == 0:
+            return False
+
+        opts = {}
+        if len(title) > 0:
+            # mpv's `%n%` quoting allows commas in option values
+            opts['force_media_title'] = f'%{len(title.encode())}%{title}'
+        self.mpv.loadfile(vid, mode='append', **opts)
+        return True
+
+    def clear_queue(self) -> None:
+        self.mpv.playlist_clear()
 
     def join(self) -> None:
         """ Wait for playlist to finish
@@ -220,10 +332,217 @@ class LocalPlayer(BasePlayer):
         self.mpv.wait_for_property('filename', lambda x: x is None)
 
 
+class IPCPlayer(BasePlayer):
+    """ Run mpv as child process and control it via JSON-IPC
+    """
+    supports_preload = True
+
+    STOP_KEYS = (
+        'q', 'Q', 'POWER', 'STOP', 'CLOSE_WIN',
+        'Ctrl+c', 'AR_PLAY_HOLD', 'AR_CENTER_HOLD')
+
+    def __init__(
+        self,
+        mpv_binary: str = 'mpv', socket_path: Optional[str] = None
+    ) -> None:
+        self.mpv_binary = mpv_binary
+
+        # connect to existing socket instead of spawning mpv if given
+        self.external_socket = socket_path
+        self.proc = None  # type: Optional[subprocess.Popen]
+        self.client = None  # type: Optional[MPVIPCClient]
+
+        self._tmpdir = None  # type: Optional[str]
+        self._pending_loads = 0
+        self._lock = threading.Lock()
+        self._closing = False
+        self.disable_video = False
+
+    def setup(
+        self,
+        time_callback: Callable[[float], None],
+        event_callback: Callable[[PlayerEvent], None],
+        disable_video: bool = False
+    ) -> None:
+        self.time_callback = time_callback
+        self.event_callback = event_callback
+
+        # called for every opened playlist, keep using running mpv
+        if self.client is not None and self.client.connected \
+                and disable_video == self.disable_video:
+            return
+
+        self.shutdown()
+        self.disable_video = disable_video
+        self._connect()
+
+    def _build_command(self, socket_path: str, input_conf: str) -> List[str]:
+        cmd = [
+            self.mpv_binary,
+            '--idle=yes', '--force-window=yes',
+            '--input-default-bindings=yes', '--input-vo-keyboard=yes',
+            '--ytdl=yes', '--prefetch-playlist=yes',
+            '--really-quiet', '--terminal=no',
+            f'--input-ipc-server={socket_path}',
+            f'--input-conf={input_conf}']
+        if self.disable_video:
+            cmd.append('--vo=null')
+        return cmd
+
+    def _connect(self) -> None:
+        from .mpv_ipc import MPVIPCClient  # noqa: F811
+
+        if self.external_socket is not None:
+            socket_path = self.external_socket
+        else:
+            self._tmpdir = tempfile.mkdtemp(prefix='vydia-mpv-')
+            socket_path = os.path.join(self._tmpdir, 'mpv.sock')
+            input_conf = os.path.join(self._tmpdir, 'input.conf')
+
+            with open(input_conf, 'w') as fd:
+                for key in self.STOP_KEYS:
+                    fd.write(f'{key} stop\n')
+
+            self.proc = subprocess.Popen(
+                self._build_command(socket_path, input_conf),
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        self.client = MPVIPCClient(socket_path)
+        self.client.connect()
+        self.client.register_event_callback(self._handle_mpv_event)
+        self.client.register_disconnect_callback(self._handle_disconnect)
+        self.client.observe_property('time-pos', self._handle_mpv_pos)
+
+        self._mpv_version = self.client.version()
+
+    def _ensure_running(self) -> None:
+        """ Restart mpv if it went away (e.g. crashed or window closed)
+        """
+        if self.client is not None and self.client.connected:
+            return
+        logger.warning('mpv is not running anymore, restarting it')
+
+        self.shutdown()
+        self._connect()
+
+    def _handle_mpv_pos(self, prop_name: str, pos: Optional[float]) -> None:
+        self.time_callback(pos)
+
+    def _handle_mpv_event(self, ev: Dict[str, Any]) -> None:
+        if ev['event'] == 'start-file':
+            with self._lock:
+                if self._pending_loads > 0:
+                    self._pending_loads -= 1
+                    return
+            self.event_callback(PlayerEvent.VIDEO_NEXT)
+        elif ev['event'] == 'end-file':
+            reason = ev.get('reason')
+            if reason == 'eof':  # graceful shutdown
+                self.event_callback(PlayerEvent.VIDEO_OVER)
+            elif reason == 'stop':  # force quit
+                self.event_callback(PlayerEvent.VIDEO_QUIT)
+
+    def _handle_disconnect(self) -> None:
+        with self._lock:
+            self._pending_loads = 0
+        if not self._closing:
+            self.event_callback(PlayerEvent.VIDEO_QUIT)
+
+    def _loadfile(self, vid: str, mode: str, **options: Any) -> None:
+        assert self.client is not None
+
+        opts = ','.join(
+            f'{k.replace("_", "-")}={v}' for k, v in options.items())
+        args = ['loadfile', vid, mode]
+        if len(opts) > 0:
+            # mpv 0.38 introduced an index argument before the options
+            if self._mpv_version >= (0, 38):
+                args.append(-1)
+            args.append(opts)
+
+        if mode == 'replace':
+            with self._lock:
+                self._pending_loads += 1
+        self.client.command(*args)
+
+    def play_video(self, vid: str, title: str = '', start: int = 0) -> None:
+        self._ensure_running()
+        assert self.client is not None
+
+        self.client.command('playlist-clear')
+        self.client.set_property('title', title)
+        self._loadfile(vid, 'replace', start=start)
+
+    def queue_video(self, vid: str, title: str = '') -> bool:
+        assert self.client is not None
+        # appending to an idle player would start playback
+        if int(self.client.get_property('playlist-count')) == 0:
+            return False
+
+        opts = {}
+        if len(title) > 0:
+            opts['force_media_title'] = f'%{len(title.encode())}%{title}'
+        self._loadfile(vid, 'append', **opts)
+        return True
+
+    def clear_queue(self) -> None:
+        assert self.client is not None
+        self.client.command('playlist-clear', timeout=None)
+
+    def toggle_pause(self) -> None:
+        assert self.client is not None
+        self.client.command('cycle', 'pause', timeout=None)
+
+    def shutdown(self) -> None:
+        """ Close player (and terminate mpv if we started it)
+        """
+        self._closing = True
+        if self.client is not None:
+            if self.proc is not None and self.client.connected:
+                self.client.command('quit', timeout=None)
+            self.client.close()
+            self.client = None
+
+        if self.proc is not None:
+            try:
+                self.proc.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+            self.proc = None
+
+        if self._tmpdir is not None:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = None
+        self._closing = False
+
+    def display_text(self, txt: str, duration: int = 1000) -> None:
+        assert self.client is not None
+        self.client.command('show-text', txt, duration, timeout=None)
+
+
 class DLNAPlayer(BasePlayer):
+    # polling intervals (in seconds), see `AdaptivePoller`
+    FAST_POLL = .5
+    SLOW_POLL = 2.
+    POLL_BURST = 5.
+
+    # DLNA does not distinguish between stopping and finishing a video,
+    # a stop within this many seconds of the end counts as finished
+    END_MARKER = 5
+
     def __init__(self, url: str) -> None:
         self.url = url
 
+        self.paused = False
+        self._started = False
+        self._pending_seek = 0
+        self._position = 0
+        self._duration = 0
+
+        self.client = None  # type: Any
+        self.poller = None  # type: Any
+
     def setup(
         self,
         time_callback: Callable[[float], None],
@@ -236,28 +555,238 @@ class DLNAPlayer(BasePlayer):
         if disable_video:
             raise RuntimeError('Disabling video not supported with DLNA.')
 
-        from nanodlna import dlna, devices, streaming
+        from nanodlna import devices
+        from .dlna_client import AVTransportClient
+        from .poller import AdaptivePoller
 
         self.device = devices.register_device(self.url)
-        serve_ip = streaming.get_serve_ip(self.device['hostname'])
-        self.server = streaming.start_server(serve_ip)
+        if self.device['action_url'] is None:
+            raise RuntimeError(f'No AVTransport service found at {self.url}')
+
+        # set up again (e.g. new playlist): retire the previous poller
+        if self.poller is not None:
+            self.poller.stop()
+        if self.client is not None:
+            self.client.close()
+
+        self.client = AVTransportClient(self.device['action_url'])
+        self.poller = AdaptivePoller(
+            self._check_transport,
+            fast=self.FAST_POLL, slow=self.SLOW_POLL, burst=self.POLL_BURST)
+        self.poller.start()
+
+    def _check_transport(self) -> None:
+        state = self.client.get_transport_state()
+
+        if state in ('PLAYING', 'PAUSED_PLAYBACK'):
+            self._started = True
+            self.paused = state == 'PAUSED_PLAYBACK'
+
+            if self._pending_seek > 0 and not self.paused:
+                self.client.seek(self._pending_seek)
+                self._pending_seek = 0
+                self.poller.boost()
+                return
+
+            self._position, duration = self.client.get_position()
+            self._duration = duration or self._duration
+            self.time_callback(self._position)
+            self.poller.steady()
+        elif state in ('STOPPED', 'NO_MEDIA_PRESENT') and self._started:
+            self._started = False
+            self.poller.idle()
+
+            if self._duration - self._position < self.END_MARKER:
+                self.event_callback(PlayerEvent.VIDEO_OVER)
+            else:
+                self.event_callback(PlayerEvent.VIDEO_QUIT)
 
-        self.dlna = dlna
+    def _serve_local_file(self, fname: str) -> str:
+        from .fileserver import get_file_server, get_serve_ip
+
+        server = get_file_server(get_serve_ip(self.device['hostname']))
+        return server.add_file(fname)
 
     def play_video(self, vid: str, title: str = '', start: int = 0) -> None:
-        files_urls = self.server.add_entry('file_video', vid)
+        self._started = False
+        self.paused = False
+        self._pending_seek = start
+        self._position = start
 
-        try:
-            self.dlna.play(files_urls, self.device)
-        except urllib.error.HTTPError:
-            # TODO: why is this happening? I have no idea...
-            pass
+        assert self.controller.player is not None
+        assert self.controller.player.current_vid is not None
+        self._duration = self.controller.player.current_vid.duration
+
+        if os.path.exists(vid):
+            vid = self._serve_local_file(vid)
+
+        self.client.set_uri(vid)
+        self.client.play()
+        self.poller.boost()
 
     def toggle_pause(self) -> None:
+        if self.paused:
+            self.client.play()
+        else:
+            self.client.pause()
+        self.paused = not self.paused
+        self.poller.boost()
+
+    def shutdown(self) -> None:
+        if self.client is None:
+            return
+        self.poller.stop()
+
+        try:
+            self.client.stop()
+        except (OSError, RuntimeError) as err:
+            logger.warning(f'Could not stop DLNA playback: {err}')
+        self.client.close()
+
+    def display_text(self, txt: str, duration: int = 1000) -> None:
         pass
 
+
+class SimulatedPlayer(BasePlayer):
+    """ Play nothing on a virtual clock which runs `speedup` times faster,
+        e.g. to binge whole playlists in tests
+    """
+
+    def __init__(
+        self,
+        speedup: float = 1., tick: float = 1., jitter: float = 0.,
+        quit_rate: float = 0., preload: bool = True,
+        default_duration: int = 60, seed: Optional[int] = None
+    ) -> None:
+        self.speedup = speedup
+        self.tick = tick  # virtual seconds between position reports
+        self.jitter = jitter  # relative variation of tick length
+        self.quit_rate = quit_rate  # fraction of videos quit midway
+        self.supports_preload = preload
+        self.default_duration = default_duration
+        self.rng = random.Random(seed)
+
+        self.title = None  # type: Optional[str]
+        self.pos = 0.
+        self.duration = 0.
+        self.quit_at = None  # type: Optional[float]
+        self.paused = False
+        self.queue = []  # type: List[str]
+
+        self.clock = 0.  # total virtual playback time
+        self.finished = []  # type: List[str]
+
+        self._generation = 0
+        self._closing = False
+        self._cond = threading.Condition()
+        self._thread = None  # type: Optional[threading.Thread]
+
+    def setup(
+        self,
+        time_callback: Callable[[float], None],
+        event_callback: Callable[[PlayerEvent], None],
+        disable_video: bool = False
+    ) -> None:
+        self.time_callback = time_callback
+        self.event_callback = event_callback
+
+        # set up again (e.g. new playlist): keep the running clock
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _lookup_duration(self, title: str) -> float:
+        player = getattr(getattr(self, 'controller', None), 'player', None)
+        vid = getattr(player, 'current_vid', None)
+        if vid is not None and vid.title == title:
+            return vid.duration
+
+        playlist = getattr(player, 'playlist', None)
+        if playlist is not None:
+            _, vid = playlist.get_video_by_title(title)
+            if vid is not None:
+                return vid.duration
+        return self.default_duration
+
+    def _start(self, title: str, start: float = 0) -> None:
+        """ Begin playback of `title`, lock must be held
+        """
+        self.title = title
+        self.pos = start
+        self.duration = self._lookup_duration(title)
+        self.quit_at = self.rng.uniform(start, self.duration) \
+            if self.rng.random() < self.quit_rate else None
+        self.paused = False
+
+        self._generation += 1
+        self._cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closing \
+                        and (self.title is None or self.paused):
+                    self._cond.wait()
+                if self._closing:
+                    return
+
+                generation = self._generation
+                step = self.tick * (
+                    1 + self.rng.uniform(-self.jitter, self.jitter))
+                self._cond.wait(step / self.speedup)
+
+                # video was changed, paused or stopped while waiting
+                if self._closing or self.paused \
+                        or generation != self._generation:
+                    continue
+
+                self.pos = min(self.pos + step, self.duration)
+                self.clock += step
+                pos = self.pos
+
+                events = []
+                if self.quit_at is not None and pos >= self.quit_at:
+                    self.title = None
+                    events.append(PlayerEvent.VIDEO_QUIT)
+                elif pos >= self.duration:
+                    self.finished.append(self.title)
+                    self.title = None
+                    events.append(PlayerEvent.VIDEO_OVER)
+
+                    if len(self.queue) > 0:
+                        self._start(self.queue.pop(0))
+                        events.append(PlayerEvent.VIDEO_NEXT)
+
+            if len(events) == 0:
+                self.time_callback(pos)
+            for ev in events:
+                self.event_callback(ev)
+
+    def play_video(self, vid: str, title: str = '', start: int = 0) -> None:
+        with self._cond:
+            self.queue.clear()
+            self._start(title or vid, start)
+
+    def queue_video(self, vid: str, title: str = '') -> bool:
+        with self._cond:
+            if self.title is None:
+                return False
+            self.queue.append(title or vid)
+            return True
+
+    def clear_queue(self) -> None:
+        with self._cond:
+            self.queue.clear()
+
+    def toggle_pause(self) -> None:
+        with self._cond:
+            self.paused = not self.paused
+            self._cond.notify_all()
+
     def shutdown(self) -> None:
-        self.server.stop()
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
 
     def display_text(self, txt: str, duration: int = 1000) -> None:
         pass
@@ -0,0 +1,291 @@
+"""
+Resolve playlists in worker processes, so hanging plugins can be killed
+"""
+
+import os
+import time
+import signal
+import logging
+import threading
+import concurrent.futures
+
+from logzero import logger
+
+from typing import (  # noqa: F401
+    Any, Callable, Dict, Hashable, List, Optional, Set, Tuple,
+    TYPE_CHECKING)
+
+from . import metrics
+
+if TYPE_CHECKING:
+    from .plugins import Playlist  # noqa: F401
+
+
+# seconds a playlist may take to load, None waits forever
+DEFAULT_TIMEOUT = 120.  # type: Optional[float]
+DEFAULT_WORKERS = 2
+
+
+class SingleFlight:
+    """ Let concurrent calls with the same key share one execution
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls = {}  # type: Dict[Hashable, concurrent.futures.Future]
+
+    def do(
+        self, key: Hashable, func: Callable[..., Any], *args: Any
+    ) -> Tuple[Any, bool]:
+        """ Return result of `func(*args)` and whether it was shared
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if future is None:
+                future = self._calls[key] = concurrent.futures.Future()
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = func(*args)
+        except BaseException as err:
+            future.set_exception(err)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+def _serve(conn: Any, log_file: Optional[str], log_level: int) -> None:
+    """ Main loop of worker process
+    """
+    import pickle
+    import logzero
+    from .utils import resolve_playlist
+
+    # never write to the terminal while it belongs to the UI
+    logzero.setup_default_logger(
+        logfile=log_file, level=log_level,
+        disableStderrLogger=log_file is not None)
+
+    while True:
+        try:
+            _id = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+
+        try:
+            plugin_name, playlist = resolve_playlist(_id)
+            reply = ('ok', plugin_name, playlist.dumps())  # type: Any
+        except ValueError as err:  # no plugin could handle id
+            reply = ('error', err)
+        except Exception as err:
+            logzero.logger.exception(f'Loading "{_id}" failed')
+            try:
+                pickle.dumps(err)
+            except Exception:
+                err = RuntimeError(f'{type(err).__name__}: {err}')
+            reply = ('error', err)
+        conn.send(reply)
+
+
+class _Worker:
+    def __init__(self, ctx: Any, log_file: Optional[str], log_level: int):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_serve, args=(child_conn, log_file, log_level),
+            name='vydia-plugin', daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.cancelled = False
+
+    def kill(self) -> None:
+        # `Process.kill` needs Python 3.7
+        try:
+            os.kill(self.process.pid, getattr(
+                signal, 'SIGKILL', signal.SIGTERM))
+        except ProcessLookupError:  # exited already
+            pass
+        self.process.join(1)
+
+    def close(self) -> None:
+        if self.process.is_alive():
+            self.kill()
+        self.conn.close()
+
+
+class PluginPool:
+    """ Run plugins in up to `workers` processes, which are started
+        on demand and killed on timeout or cancellation
+    """
+
+    def __init__(
+        self,
+        workers: int = DEFAULT_WORKERS, start_method: str = 'spawn'
+    ) -> None:
+        import multiprocessing
+        self._ctx = multiprocessing.get_context(start_method)
+
+        self._slots = threading.BoundedSemaphore(workers)
+        self._lock = threading.Lock()
+        self._idle = []  # type: List[_Worker]
+        self._busy = set()  # type: Set[_Worker]
+        self._closed = False
+
+    def __enter__(self) -> 'PluginPool':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def _checkout(self) -> _Worker:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('Plugin pool is closed')
+            while len(self._idle) > 0:
+                worker = self._idle.pop()
+                if worker.process.is_alive():
+                    break
+                worker.close()
+            else:
+                worker = _Worker(self._ctx, *_log_config())
+            self._busy.add(worker)
+            return worker
+
+    def _checkin(self, worker: _Worker, reuse: bool) -> None:
+        with self._lock:
+            self._busy.discard(worker)
+            if reuse and not self._closed:
+                self._idle.append(worker)
+                return
+        worker.close()
+
+    def resolve(
+        self, _id: str, timeout: Optional[float] = None
+    ) -> Tuple[str, bytes]:
+        """ Plugin name and serialized playlist (see `Playlist.loads`)
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f'No plugin worker available for "{_id}"')
+
+        try:
+            worker = self._checkout()
+            reuse = False
+            try:
+                worker.conn.send(_id)
+                remaining = None if deadline is None \
+                    else max(0, deadline - time.monotonic())
+                if not worker.conn.poll(remaining):
+                    raise TimeoutError(
+                        f'Loading "{_id}" took longer than {timeout}s')
+                reply = worker.conn.recv()
+                reuse = True
+            except TimeoutError:
+                raise
+            except (EOFError, OSError) as err:
+                if worker.cancelled:
+                    raise concurrent.futures.CancelledError(
+                        f'Loading "{_id}" was cancelled')
+                raise RuntimeError(f'Plugin worker died: {err!r}')
+            finally:
+                self._checkin(worker, reuse)
+        finally:
+            self._slots.release()
+
+        if reply[0] == 'error':
+            raise reply[1]
+        _, plugin_name, data = reply
+        return plugin_name, data
+
+    def cancel(self) -> int:
+        """ Kill workers of all running loads, return their number
+        """
+        with self._lock:
+            busy = list(self._busy)
+        for worker in busy:
+            worker.cancelled = True
+            worker.kill()
+        return len(busy)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            workers = self._idle + list(self._busy)
+            self._idle = []
+        for worker in workers:
+            worker.close()
+
+
+def _log_config() -> Tuple[Optional[str], int]:
+    """ Workers log to the same file as we do (if any)
+    """
+    from .log_queue import iter_handlers
+
+    log_file = None
+    for handler in iter_handlers(logger):
+        if isinstance(handler, logging.FileHandler):
+            log_file = handler.baseFilename
+    return log_file, logger.level
+
+
+_pool = None  # type: Optional[PluginPool]
+_pool_lock = threading.Lock()
+_flights = SingleFlight()
+
+
+def get_pool() -> PluginPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            import atexit
+            _pool = PluginPool(DEFAULT_WORKERS)
+            atexit.register(_pool.close)
+        return _pool
+
+
+def configure(
+    timeout: Optional[float] = DEFAULT_TIMEOUT, workers: int = DEFAULT_WORKERS
+) -> None:
+    """ Set defaults of pool, before first use
+    """
+    global DEFAULT_TIMEOUT, DEFAULT_WORKERS
+    DEFAULT_TIMEOUT = timeout
+    DEFAULT_WORKERS = workers
+
+
+def cancel() -> int:
+    """ Stop all running loads, they raise `CancelledError`
+    """
+    return _pool.cancel() if _pool is not None else 0
+
+
+def load_playlist(
+    _id: str, timeout: Optional[float] = None
+) -> Tuple[str, 'Playlist']:
+    """ Resolve playlist in worker process, concurrent loads of
+        the same id are shared
+    """
+    from .plugins import Playlist
+
+    def resolve() -> Tuple[str, bytes]:
+        start = time.perf_counter()
+        plugin_name, data = get_pool().resolve(
+            _id, timeout if timeout is not None else DEFAULT_TIMEOUT)
+        metrics.observe(
+            'plugin_resolve_seconds', time.perf_counter() - start,
+            plugin=plugin_name)
+        return plugin_name, data
+
+    (plugin_name, data), shared = _flights.do(_id, resolve)
+    if shared:
+        logger.info(f'Shared in-flight load of "{_id}"')
+        metrics.inc('plugin_loads_shared')
+
+    # each caller gets its own copy
+    return plugin_name, Playlist.loads(data)
@@ -3,69 +3,138 @@ Plugins for video backends
 """
 
 import os
+import bisect
+import pickle
 import random
+import functools
 import collections
 from abc import ABC, abstractmethod
 
-from typing import Any, List, Tuple, Optional, Type, Callable  # noqa: F401
+from typing import (  # noqa: F401
+    Any, Dict, List, Set, Tuple, Optional, Type, Callable)
 
-import pafy
+from .utils import get_video_duration, file_fingerprint
 
-from hachoir.parser import createParser
-from hachoir.metadata import extractMetadata
 
-from .utils import get_video_duration
+# `id` identifies video across renames, falls back to title if unset
+VideoData = collections.namedtuple(
+    'VideoData', ['title', 'duration', 'get_file_stream', 'get_info', 'id']
+)  # type: Tuple[str, int, Callable[[], str], Callable[[], str], Optional[str]]
+VideoData.__new__.__defaults__ = (None,)  # `defaults=` needs Python 3.7
 
 
-VideoData = collections.namedtuple(
-    'VideoData', ['title', 'duration', 'get_file_stream', 'get_info']
-)  # type: Tuple[str, int, Callable[[], str], Callable[[], str]]
+# details are only fetched when asked for, keep the last few around
+INFO_CACHE_SIZE = 64
+
+
+def get_youtube_stream(videoid: str) -> str:
+    import pafy
+    return pafy.new(videoid).getbest().url
+
+
+@functools.lru_cache(maxsize=INFO_CACHE_SIZE)
+def get_youtube_info(videoid: str) -> str:
+    import pafy
+
+    obj = pafy.new(videoid)
+    return f'Title: {obj.title}\n' + \
+        f'Author: {obj.author}\n' + \
+        f'Published: {obj.published}\n' + \
+        f'Description: {obj.description}'
+
+
+@functools.lru_cache(maxsize=INFO_CACHE_SIZE)
+def get_file_info(path: str) -> str:
+    from hachoir.parser import createParser
+    from hachoir.metadata import extractMetadata
+
+    with createParser(path) as parser:
+        try:
+            metadata = extractMetadata(parser)
+        except Exception as err:
+            return f'No video-data found ({err})'
+    return '\n'.join(metadata.exportPlaintext())
 
 
 class Video(object):
+    # many thousands of these may be alive
+    __slots__ = ('_obj',)
+
     @classmethod
     def from_pafy(cls: Type['Video'], obj: Any) -> 'Video':
-        def format_info() -> str:
-            return f'Title: {obj.title}\n' + \
-                f'Author: {obj.author}\n' + \
-                f'Published: {obj.published}\n' + \
-                f'Description: {obj.description}'
-
+        # only keep id of (rather large) pafy object
         return cls(VideoData(
             title=obj.title,
             duration=obj.length,
-            get_file_stream=lambda: obj.getbest().url,
-            get_info=format_info
+            get_file_stream=functools.partial(
+                get_youtube_stream, obj.videoid),
+            get_info=functools.partial(get_youtube_info, obj.videoid),
+            id=f'yt:{obj.videoid}'
         ))
 
     @classmethod
     def from_filepath(cls: Type['Video'], path: str) -> 'Video':
-        def format_info() -> str:
-            with createParser(path) as parser:
-                try:
-                    metadata = extractMetadata(parser)
-                except Exception as err:
-                    return f'No video-data found ({err})'
-            return '\n'.join(metadata.exportPlaintext())
-
         return cls(VideoData(
             title=os.path.basename(path),
             duration=get_video_duration(path),
-            get_file_stream=lambda: path,
-            get_info=format_info
+            get_file_stream=functools.partial(str, path),
+            get_info=functools.partial(get_file_info, path),
+            id=f'fs:{file_fingerprint(path)}'
         ))
 
     def __init__(self, obj: VideoData) -> None:
         self._obj = obj
 
+    @property
+    def id(self) -> str:
+        return self._obj.id or self._obj.title
+
     def __getattr__(self, key: str) -> Any:
-        return self._obj._asdict()[key]
+        if key == '_obj':  # not yet set, e.g. while unpickling
+            raise AttributeError(key)
+        return getattr(self._obj, key)
+
+    def to_compact(self) -> Tuple[Any, ...]:
+        """ (title, duration, id, source kind, source argument),
+            unknown sources are kept as is
+        """
+        obj = self._obj
+        stream, info = obj.get_file_stream, obj.get_info
+        for kind, funcs in VIDEO_SOURCES.items():
+            if isinstance(stream, functools.partial) \
+                    and isinstance(info, functools.partial) \
+                    and (stream.func, info.func) == funcs \
+                    and stream.args == info.args:
+                return obj.title, obj.duration, obj.id, kind, stream.args[0]
+        return obj.title, obj.duration, obj.id, None, obj
+
+    @classmethod
+    def from_compact(cls: Type['Video'], row: Tuple[Any, ...]) -> 'Video':
+        title, duration, vid_id, kind, arg = row
+        if kind is None:
+            return cls(arg)
+
+        stream, info = VIDEO_SOURCES[kind]
+        return cls(VideoData(
+            title=title, duration=duration,
+            get_file_stream=functools.partial(stream, arg),
+            get_info=functools.partial(info, arg),
+            id=vid_id
+        ))
+
+
+# how streams and details of videos are obtained
+VIDEO_SOURCES = {
+    'file': (str, get_file_info),
+    'youtube': (get_youtube_stream, get_youtube_info)
+}  # type: Dict[str, Tuple[Callable[[str], str], Callable[[str], str]]]
 
 
 class Playlist(List['Video']):
     def __init__(self) -> None:
         self._id = None
         self._title = ''
+        self._positions = {}  # type: Dict[str, int]
         super().__init__()
 
     @property
@@ -86,6 +155,7 @@ class Playlist(List['Video']):
     def reverse(self) -> None:
         tmp = self[:]
         self.clear()
+        self._positions.clear()
 
         for v in reversed(tmp):
             self.append(v)
@@ -94,6 +164,7 @@ class Playlist(List['Video']):
         tmp = self[:]
         self.clear()
 
+        self._positions.clear()
         random.shuffle(tmp)
         for v in tmp:
             self.append(v)
@@ -106,6 +177,45 @@ class Playlist(List['Video']):
                 return i, vid
         return None, None
 
+    def get_video_by_id(
+        self, vid_id: str
+    ) -> Tuple[Optional[int], Optional[Video]]:
+        i = self._positions.get(vid_id)
+        if i is None or i >= len(self) or self[i].id != vid_id:
+            # (re)build index, first video wins for duplicate files
+            self._positions.clear()
+            for i, vid in enumerate(self):
+                self._positions.setdefault(vid.id, i)
+            i = self._positions.get(vid_id)
+
+        if i is None:
+            return None, None
+        return i, self[i]
+
+    def find_video(
+        self, entry: Dict[str, str]
+    ) -> Tuple[Optional[int], Optional[Video]]:
+        """ Look up video referenced by state entry,
+            which only stores title if written before ids existed
+        """
+        if 'id' in entry:
+            return self.get_video_by_id(entry['id'])
+        return self.get_video_by_title(entry['title'])
+
+    def dumps(self) -> bytes:
+        """ Serialize without pickling every video object
+        """
+        return pickle.dumps(
+            (self._id, self._title, [vid.to_compact() for vid in self]),
+            protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def loads(cls: Type['Playlist'], data: bytes) -> 'Playlist':
+        pl = cls()
+        pl._id, pl._title, rows = pickle.loads(data)
+        pl.extend(Video.from_compact(row) for row in rows)
+        return pl
+
 
 class BasePlugin(ABC):
     @abstractmethod
@@ -117,29 +227,86 @@ class BasePlugin(ABC):
 
 class FilesystemPlugin(BasePlugin):
     def extract_playlist(self, url: str) -> Optional[Playlist]:
-        url = os.path.abspath(url)
-        if not os.path.exists(url):
+        import concurrent.futures
+        from .scan import ScanOptions, split_query, scan_media
+
+        # e.g. `https://www.youtube.com/playlist?list=...`
+        if '://' in url:
             return None
 
+        path, query = split_query(url)
+        if not os.path.isdir(path):
+            return None
+        try:
+            options = ScanOptions.from_query(query)
+        except ValueError as err:
+            from logzero import logger
+            logger.warning(f'Ignoring "{url}": {err}')
+            return None
+
+        query = url[len(path):]
+        path = os.path.abspath(path)
+
         pl = Playlist()
-        pl._id = url
-        pl._title = url
+        pl._id = path + query
+        pl._title = path
 
-        paths = []
-        for entry in os.scandir(url):
-            if entry.is_dir():
-                print(f'Skipping {entry.path}')
-                continue
-            paths.append(entry.path)
+        paths = scan_media(path, options)
 
-        for fp in sorted(paths):
-            pl.append(Video.from_filepath(fp))
+        # probing durations dominates on network mounts
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=options.workers) as executor:
+            for vid in executor.map(Video.from_filepath, paths):
+                pl.append(vid)
 
         return pl
 
+    @staticmethod
+    def apply_changes(
+        playlist: Playlist, added: Set[str], removed: Set[str]
+    ) -> Playlist:
+        """ Copy of `playlist` with files changed on disk, only new files
+            are probed (renamed ones keep their duration)
+        """
+        root = playlist.title
+        by_path = {vid.get_file_stream(): vid for vid in playlist}
+        gone = {by_path[p] for p in removed if p in by_path}
+        moved = {vid.id: vid for vid in gone}
+
+        new = []
+        for path in sorted(added, key=lambda p: os.path.relpath(p, root)):
+            vid_id = f'fs:{file_fingerprint(path)}'
+            if vid_id in moved and moved[vid_id].get_file_stream() != path:
+                new.append(Video(moved[vid_id]._obj._replace(
+                    title=os.path.basename(path),
+                    get_file_stream=functools.partial(str, path),
+                    get_info=functools.partial(get_file_info, path))))
+            else:
+                new.append(Video.from_filepath(path))
+
+        kept = [vid for vid in playlist if vid not in gone]
+        keys = [os.path.relpath(vid.get_file_stream(), root) for vid in kept]
+        if keys == sorted(keys):
+            # keep order of scan (unless reversed or shuffled)
+            for vid in new:
+                key = os.path.relpath(vid.get_file_stream(), root)
+                i = bisect.bisect(keys, key)
+                keys.insert(i, key)
+                kept.insert(i, vid)
+        else:
+            kept.extend(new)
+
+        pl = Playlist()
+        pl._id = playlist._id
+        pl._title = playlist._title
+        pl.extend(kept)
+        return pl
+
 
 class YoutubePlugin(BasePlugin):
     def extract_playlist(self, url: str) -> Optional[Playlist]:
+        import pafy
+
         try:
             res = pafy.get_playlist2(url)
         except ValueError:
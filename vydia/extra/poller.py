@@ -0,0 +1,99 @@
+"""
+Background polling with adaptive intervals
+"""
+
+import time
+import threading
+
+from logzero import logger
+
+from typing import Callable, Optional
+
+
+class AdaptivePoller:
+    """ Call `func` periodically in a background thread
+
+        Polls every `fast` seconds for `burst` seconds after `boost()`
+        (e.g. right after loading or seeking), every `slow` seconds in
+        steady state and not at all while idle.
+    """
+
+    def __init__(
+        self,
+        func: Callable[[], None],
+        fast: float = .25, slow: float = 2, burst: float = 5
+    ) -> None:
+        self.func = func
+        self.fast = fast
+        self.slow = slow
+        self.burst = burst
+
+        self._cond = threading.Condition()
+        self._idle = True
+        self._stopped = False
+        self._fast_until = 0.
+
+        self._thread = None  # type: Optional[threading.Thread]
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def boost(self) -> None:
+        """ Poll fast for a while
+        """
+        with self._cond:
+            self._idle = False
+            self._fast_until = time.monotonic() + self.burst
+            self._cond.notify()
+
+    def steady(self) -> None:
+        """ Poll slowly (unless currently boosted)
+        """
+        with self._cond:
+            self._idle = False
+            self._cond.notify()
+
+    def idle(self) -> None:
+        """ Stop polling until next `boost` or `steady`
+        """
+        with self._cond:
+            self._idle = True
+            self._fast_until = 0.
+
+    def stop(self, timeout: Optional[float] = 2) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+        if self._thread is not None \
+                and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _interval(self) -> Optional[float]:
+        if self._idle:
+            return None
+        return self.fast if time.monotonic() < self._fast_until \
+            else self.slow
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stopped and self._idle:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+
+            try:
+                self.func()
+            except Exception:
+                logger.exception('Polling failed')
+
+            with self._cond:
+                interval = self._interval()
+                if interval is not None and not self._stopped:
+                    self._cond.wait(interval)
@@ -0,0 +1,195 @@
+"""
+Opt-in cProfile/tracemalloc sessions and their summaries
+"""
+
+import os
+import json
+import time
+import threading
+import functools
+
+from pathlib import Path
+
+from logzero import logger
+
+from typing import Any, Callable, Dict, List, Optional, TypeVar  # noqa: F401
+
+
+F = TypeVar('F', bound=Callable[..., Any])
+
+_active = None  # type: Optional[ProfileSession]
+
+
+def get_profile_dir() -> Path:
+    from appdirs import AppDirs
+    return Path(AppDirs('vydia', 'kpj').user_log_dir) / 'profiles'
+
+
+class ProfileSession:
+    """ Profile calling thread (and functions passed through `wrap`
+        in other threads) while active, dump results to `directory`
+
+        Each thread gets its own `cpu-<thread>.prof`, tracemalloc
+        snapshots at start and end are stored as `memory-*.snap`.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[Path] = None,
+        trace_memory: bool = False, memory_frames: int = 10
+    ) -> None:
+        name = time.strftime('%Y%m%d-%H%M%S') + f'-{os.getpid()}'
+        self.directory = Path(directory or get_profile_dir()) / name
+        self.trace_memory = trace_memory
+        self.memory_frames = memory_frames
+
+        self._profiles = {}  # type: Dict[str, Any]
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._owner = None  # type: Optional[threading.Thread]
+
+    def __enter__(self) -> 'ProfileSession':
+        global _active
+
+        if _active is not None:
+            raise RuntimeError('Another profile session is active')
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        logger.info(f'Profiling to "{self.directory}"')
+
+        if self.trace_memory:
+            import tracemalloc
+            tracemalloc.start(self.memory_frames)
+            tracemalloc.take_snapshot().dump(
+                str(self.directory / 'memory-start.snap'))
+
+        self._start = time.time()
+        self._owner = threading.current_thread()
+        self._local.profile = self._get_profile(self._owner.name)
+        self._local.profile.enable()
+
+        _active = self
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        global _active
+        _active = None
+
+        self._local.profile.disable()
+
+        if self.trace_memory:
+            import tracemalloc
+            tracemalloc.take_snapshot().dump(
+                str(self.directory / 'memory-end.snap'))
+            tracemalloc.stop()
+
+        with self._lock:
+            for thread_name, profile in self._profiles.items():
+                profile.dump_stats(
+                    str(self.directory / f'cpu-{thread_name}.prof'))
+
+        with open(self.directory / 'session.json', 'w') as fd:
+            json.dump({
+                'start': self._start,
+                'duration': time.time() - self._start,
+                'trace_memory': self.trace_memory,
+                'threads': sorted(self._profiles)
+            }, fd, indent=2)
+
+    def _get_profile(self, thread_name: str) -> Any:
+        import cProfile
+        with self._lock:
+            return self._profiles.setdefault(thread_name, cProfile.Profile())
+
+    def wrap(self, func: F) -> F:
+        """ Profile calls of `func` when they happen in other threads
+        """
+        @functools.wraps(func)
+        def profiled(*args: Any, **kwargs: Any) -> Any:
+            thread = threading.current_thread()
+            if thread is self._owner or _active is not self:
+                return func(*args, **kwargs)
+
+            profile = getattr(self._local, 'profile', None)
+            if profile is None:
+                profile = self._local.profile = self._get_profile(thread.name)
+
+            try:
+                profile.enable()
+            except ValueError:
+                # profilers are global since Python 3.12,
+                # calls are recorded by the owner's profile then
+                return func(*args, **kwargs)
+
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+        return profiled  # type: ignore
+
+
+def wrap(func: F) -> F:
+    """ Profile `func` in active session, return it unchanged otherwise
+    """
+    if _active is None:
+        return func
+    return _active.wrap(func)
+
+
+def list_sessions(directory: Optional[Path] = None) -> List[Path]:
+    directory = Path(directory or get_profile_dir())
+    if not directory.is_dir():
+        return []
+    return sorted(
+        p for p in directory.iterdir() if (p / 'session.json').exists())
+
+
+def summarize(
+    session: Path, limit: int = 20, sort: str = 'cumulative'
+) -> Dict[str, Any]:
+    """ Hottest functions (over all threads) and largest allocators
+    """
+    import pstats
+
+    with open(session / 'session.json') as fd:
+        info = json.load(fd)
+
+    stats = None  # type: Optional[pstats.Stats]
+    for fname in sorted(session.glob('cpu-*.prof')):
+        if stats is None:
+            stats = pstats.Stats(str(fname))
+        else:
+            stats.add(str(fname))
+
+    key = {'cumulative': 3, 'tottime': 2, 'calls': 1}[sort]
+    functions = []
+    if stats is not None:
+        entries = sorted(
+            stats.stats.items(),  # type: ignore
+            key=lambda item: item[1][key], reverse=True)
+        for (fname, line, func), (_, calls, tottime, cumtime, _) \
+                in entries[:limit]:
+            functions.append({
+                'function': f'{fname}:{line}({func})',
+                'calls': calls, 'tottime': tottime, 'cumtime': cumtime})
+
+    allocators = []  # type: List[Dict[str, Any]]
+    if (session / 'memory-end.snap').exists():
+        import tracemalloc
+
+        end = tracemalloc.Snapshot.load(str(session / 'memory-end.snap'))
+        start = tracemalloc.Snapshot.load(str(session / 'memory-start.snap'))
+        for stat in end.compare_to(start, 'lineno')[:limit]:
+            frame = stat.traceback[0]
+            allocators.append({
+                'location': f'{frame.filename}:{frame.lineno}',
+                'size': stat.size, 'size_diff': stat.size_diff,
+                'count': stat.count})
+
+    return {
+        'session': session.name,
+        'duration': info['duration'],
+        'threads': info['threads'],
+        'functions': functions,
+        'allocators': allocators
+    }
@@ -0,0 +1,216 @@
+"""
+Parallel directory traversal which only yields media files
+"""
+
+import os
+import time
+import fnmatch
+import concurrent.futures
+import urllib.parse
+
+from logzero import logger
+
+from typing import (  # noqa: F401
+    Any, Dict, Iterable, List, Optional, Set, Tuple)
+
+
+MEDIA_EXTENSIONS = frozenset([
+    '.3gp', '.avi', '.flv', '.m2ts', '.m4v', '.mkv', '.mov', '.mp4',
+    '.mpeg', '.mpg', '.mts', '.ogv', '.ts', '.vob', '.webm', '.wmv',
+    '.aac', '.flac', '.m4a', '.mp3', '.oga', '.ogg', '.opus', '.wav', '.wma'])
+
+
+class ScanOptions:
+    """ Options of directory playlists, given as query suffix of path,
+        e.g. `/media/show?recursive&include=season*/*&exclude=*sample*`
+    """
+
+    def __init__(
+        self,
+        recursive: bool = False,
+        include: Iterable[str] = (), exclude: Iterable[str] = (),
+        extensions: Iterable[str] = MEDIA_EXTENSIONS,
+        timeout: float = 10, workers: int = 8
+    ) -> None:
+        self.recursive = recursive
+        self.include = list(include)
+        self.exclude = list(exclude)
+        self.extensions = frozenset(
+            ext.lower() if ext.startswith('.') else f'.{ext.lower()}'
+            for ext in extensions)
+        self.timeout = timeout
+        self.workers = workers
+
+    @classmethod
+    def from_query(cls, query: str) -> 'ScanOptions':
+        params = urllib.parse.parse_qs(query, keep_blank_values=True)
+
+        unknown = set(params) - {
+            'recursive', 'include', 'exclude', 'ext', 'timeout', 'workers'}
+        if len(unknown) > 0:
+            raise ValueError(f'Unknown options: {", ".join(sorted(unknown))}')
+
+        def split(key: str) -> List[str]:
+            return [
+                item for value in params.get(key, [])
+                for item in value.split(',') if item != '']
+
+        kwargs = {
+            'recursive': 'recursive' in params,
+            'include': split('include'), 'exclude': split('exclude')
+        }  # type: Dict[str, Any]
+        if 'ext' in params:
+            kwargs['extensions'] = split('ext')
+        if 'timeout' in params:
+            kwargs['timeout'] = float(params['timeout'][-1])
+        if 'workers' in params:
+            kwargs['workers'] = int(params['workers'][-1])
+        return cls(**kwargs)
+
+    def is_media(self, rel_path: str) -> bool:
+        if os.path.splitext(rel_path)[1].lower() not in self.extensions:
+            return False
+        if len(self.include) > 0 and not _matches(rel_path, self.include):
+            return False
+        return not self.is_excluded(rel_path)
+
+    def is_excluded(self, rel_path: str) -> bool:
+        return _matches(rel_path, self.exclude)
+
+
+def _matches(rel_path: str, patterns: List[str]) -> bool:
+    """ Patterns without `/` apply to name, others to whole relative path
+    """
+    name = os.path.basename(rel_path)
+    return any(
+        fnmatch.fnmatch(rel_path if '/' in pat else name, pat)
+        for pat in patterns)
+
+
+def split_query(url: str) -> Tuple[str, str]:
+    """ Separate path and query (paths containing `?` take precedence)
+    """
+    if os.path.exists(url) or '?' not in url:
+        return url, ''
+
+    path, query = url.rsplit('?', 1)
+    return path, query
+
+
+def split_location(url: str) -> Tuple[str, ScanOptions]:
+    """ Separate path and parsed options
+    """
+    path, query = split_query(url)
+    return path, ScanOptions.from_query(query)
+
+
+DirKey = Tuple[int, int]
+
+
+def scan_directory(
+    path: str
+) -> Tuple[List[str], List[Tuple[str, DirKey]]]:
+    """ Return files and (directory, (device, inode)) in `path`,
+        hidden ones are skipped
+    """
+    files, dirs = [], []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.name.startswith('.'):
+                continue
+            try:
+                if entry.is_dir():
+                    stat = entry.stat()
+                    dirs.append((entry.path, (stat.st_dev, stat.st_ino)))
+                elif entry.is_file():
+                    files.append(entry.path)
+            except OSError as err:
+                logger.warning(f'Skipping "{entry.path}": {err}')
+    return files, dirs
+
+
+def scan_media(
+    root: str, options: ScanOptions,
+    executor: Optional[concurrent.futures.Executor] = None
+) -> List[str]:
+    """ Collect media files below `root` (sorted by relative path),
+        directories are scanned in parallel and skipped when they do
+        not respond within `options.timeout` seconds
+    """
+    own_executor = executor is None
+    if executor is None:
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=options.workers, thread_name_prefix='vydia-scan')
+
+    media = []  # type: List[str]
+    pending = {}  # type: Dict[concurrent.futures.Future, str]
+    # queued directories only start to time out once a worker picks them up
+    started = {}  # type: Dict[str, float]
+
+    # symlinks may lead to directories seen before
+    visited = set()  # type: Set[DirKey]
+
+    def scan(path: str) -> Tuple[List[str], List[Tuple[str, DirKey]]]:
+        started[path] = time.monotonic()
+        return scan_directory(path)
+
+    def submit(path: str) -> None:
+        assert executor is not None
+        pending[executor.submit(scan, path)] = path
+
+    try:
+        stat = os.stat(root)
+        visited.add((stat.st_dev, stat.st_ino))
+        submit(root)
+        while len(pending) > 0:
+            deadlines = [
+                started[path] + options.timeout
+                for path in pending.values() if path in started]
+            wait_time = min(deadlines) - time.monotonic() \
+                if len(deadlines) > 0 else options.timeout
+            done, _ = concurrent.futures.wait(
+                pending, timeout=max(0, wait_time),
+                return_when=concurrent.futures.FIRST_COMPLETED)
+
+            for future in done:
+                path = pending.pop(future)
+                try:
+                    files, dirs = future.result()
+                except OSError as err:
+                    if path == root:
+                        raise
+                    logger.warning(f'Skipping "{path}": {err}')
+                    continue
+
+                for fname in files:
+                    if options.is_media(os.path.relpath(fname, root)):
+                        media.append(fname)
+                if options.recursive:
+                    for dname, key in dirs:
+                        if key not in visited and not options.is_excluded(
+                                os.path.relpath(dname, root)):
+                            visited.add(key)
+                            submit(dname)
+
+            # abandon stalled directories (their thread finishes later)
+            now = time.monotonic()
+            for future, path in list(pending.items()):
+                if path in started and not future.done() \
+                        and started[path] + options.timeout <= now:
+                    if path == root:
+                        raise TimeoutError(
+                            f'"{root}" did not respond within '
+                            f'{options.timeout}s')
+                    logger.warning(
+                        f'Skipping "{path}": no response within '
+                        f'{options.timeout}s')
+                    future.cancel()
+                    del pending[future]
+    finally:
+        # queued directories are not needed anymore (e.g. on timeout)
+        for future in pending:
+            future.cancel()
+        if own_executor:
+            executor.shutdown(wait=False)
+
+    return sorted(media, key=lambda fname: os.path.relpath(fname, root))
@@ -0,0 +1,143 @@
+"""
+Incremental fuzzy search over titles
+"""
+
+import re
+import collections
+
+from typing import Dict, FrozenSet, List, Optional, Sequence  # noqa: F401
+
+
+class TitleIndex:
+    """ Prebuilt n-gram index for ranked fuzzy title lookups
+    """
+    # n-grams in more than this share of titles (e.g. a common
+    # "Show S01E01 - " prefix) do not help to rank them
+    COMMON_SHARE = .05
+    COMMON_MIN = 500
+
+    def __init__(self, titles: Sequence[str], n: int = 3) -> None:
+        self.n = n
+        self.source = list(titles)
+        self.titles = [t.lower() for t in titles]
+
+        self.postings = collections.defaultdict(
+            list)  # type: Dict[str, List[int]]
+        self.title_prefixes = collections.defaultdict(
+            list)  # type: Dict[str, List[int]]
+        self.word_prefixes = collections.defaultdict(
+            list)  # type: Dict[str, List[int]]
+
+        for i, tit in enumerate(self.titles):
+            for gram in self._ngrams(tit):
+                self.postings[gram].append(i)
+
+            # queries shorter than n are matched against word starts
+            starts = {tit[:k] for k in range(1, self.n)}
+            for pref in starts:
+                self.title_prefixes[pref].append(i)
+            for word in re.split(r'\W+', tit):
+                for pref in {word[:k] for k in range(1, self.n)} - starts:
+                    if pref:
+                        self.word_prefixes[pref].append(i)
+                        starts.add(pref)
+
+        self.common_limit = max(
+            self.COMMON_MIN, int(len(self.titles) * self.COMMON_SHARE))
+        # n-grams of all titles do not narrow anything down (None)
+        self.common = {
+            gram: frozenset(postings)
+            if len(postings) < len(self.titles) else None
+            for gram, postings in self.postings.items()
+            if len(postings) > self.common_limit
+        }  # type: Dict[str, Optional[FrozenSet[int]]]
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def _ngrams(self, text: str) -> set:
+        return {text[i:i+self.n] for i in range(len(text) - self.n + 1)}
+
+    def search(self, query: str, min_match: float = .6) -> List[int]:
+        """ Return title indices ranked by how well they match `query`
+
+            Short queries match title and word starts only,
+            longer ones only inspect titles sharing enough n-grams.
+        """
+        query = query.lower().strip()
+        if len(query) == 0:
+            return []
+
+        if len(query) < self.n:
+            return self.title_prefixes.get(query, []) \
+                + self.word_prefixes.get(query, [])
+
+        grams = [gram for gram in self._ngrams(query)
+                 if gram not in self.common]
+        if len(grams) == 0:
+            return self._search_common(query)
+
+        hits = collections.Counter()  # type: collections.Counter
+        for gram in grams:
+            hits.update(self.postings.get(gram, ()))
+
+        threshold = max(1, int(len(grams) * min_match))
+        scored = []
+        for i, cnt in hits.items():
+            if cnt < threshold:
+                continue
+
+            tit = self.titles[i]
+            score = cnt / len(grams)
+            if query in tit:
+                score += 1
+                if tit.startswith(query):
+                    score += .5
+            scored.append((-score, i))
+
+        scored.sort()
+        return [i for _, i in scored]
+
+    def _search_common(self, query: str) -> List[int]:
+        """ Titles containing all (common) n-grams of `query`, in order
+        """
+        sets = sorted(
+            ((self.common[gram], gram) for gram in self._ngrams(query)
+             if self.common[gram] is not None),
+            key=lambda x: len(x[0]))
+        if len(sets) == 0:
+            return list(range(len(self.titles)))
+
+        rarest, gram = sets[0]
+        matches = rarest.intersection(*(s for s, _ in sets[1:]))
+        if len(matches) == len(rarest):
+            return list(self.postings[gram])  # already sorted
+        return sorted(matches)
+
+
+class SearchState:
+    """ Ranked matches of the current query and the cursor into them
+    """
+
+    def __init__(self, index: TitleIndex) -> None:
+        self.index = index
+        self.query = ''
+        self.matches = []  # type: List[int]
+        self.pos = 0
+
+    def update(self, query: str) -> List[int]:
+        self.query = query
+        self.matches = self.index.search(query)
+        self.pos = 0
+        return self.matches
+
+    def current(self) -> int:
+        if len(self.matches) == 0:
+            raise IndexError('No matches')
+        return self.matches[self.pos]
+
+    def step(self, shift: int) -> int:
+        if len(self.matches) == 0:
+            raise IndexError('No matches')
+        self.pos = (self.pos + shift) % len(self.matches)
+        return self.matches[self.pos]
@@ -2,13 +2,13 @@
 Various utility functions
 """
 
+import os
 import time
-import datetime
 
-from typing import Iterable, Type, Tuple, Dict, Any, TYPE_CHECKING
+from . import metrics
 
-from hachoir.parser import createParser
-from hachoir.metadata import extractMetadata
+from typing import (
+    Iterable, Type, Tuple, Dict, Any, List, Optional, TYPE_CHECKING)
 
 if TYPE_CHECKING:
     from .plugins import BasePlugin, Playlist  # noqa: F401
@@ -23,12 +23,11 @@ def get_plugins() -> Iterable[Type['BasePlugin']]:
 
 
 def ts2sec(ts: str) -> int:
-    x = time.strptime(ts, '%H:%M:%S')
-    sec = datetime.timedelta(
-        hours=x.tm_hour,
-        minutes=x.tm_min,
-        seconds=x.tm_sec).total_seconds()
-    return int(sec)
+    # much faster than `time.strptime`, which dominated row building
+    hours, minutes, seconds = (int(x) for x in ts.split(':'))
+    if not (0 <= minutes < 60 and 0 <= seconds < 62):
+        raise ValueError(f'Invalid timestamp "{ts}"')
+    return hours * 3600 + minutes * 60 + seconds
 
 
 def sec2ts(sec: int) -> str:
@@ -36,7 +35,10 @@ def sec2ts(sec: int) -> str:
 
 
 def get_video_duration(fname: str) -> int:
-    with createParser(fname) as parser:
+    from hachoir.parser import createParser
+    from hachoir.metadata import extractMetadata
+
+    with metrics.timer('media_probe_seconds'), createParser(fname) as parser:
         try:
             metadata = extractMetadata(parser)
         except Exception:
@@ -45,15 +47,69 @@ def get_video_duration(fname: str) -> int:
     return metadata.get('duration').seconds
 
 
-def load_playlist(_id: str) -> Tuple[str, 'Playlist']:
+def file_fingerprint(path: str, block_size: int = 4096) -> str:
+    """ Identify file by size and hash of first and last block,
+        which survives renames without reading whole file
+    """
+    import hashlib
+
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        size = os.fstat(fd).st_size
+        digest = hashlib.sha1(os.pread(fd, block_size, 0))
+        if size > block_size:
+            digest.update(
+                os.pread(fd, block_size, max(block_size, size - block_size)))
+    finally:
+        os.close(fd)
+    return f'{size:x}-{digest.hexdigest()[:16]}'
+
+
+def load_playlist(
+    _id: str, timeout: Optional[float] = None
+) -> Tuple[str, 'Playlist']:
+    """ Resolve playlist in worker process (see `plugin_pool`)
+    """
+    from .plugin_pool import load_playlist
+    return load_playlist(_id, timeout=timeout)
+
+
+def resolve_playlist(_id: str) -> Tuple[str, 'Playlist']:
+    """ Ask all plugins in this process
+    """
     for Plg in get_plugins():
-        plugin = Plg()
-        playlist = plugin.extract_playlist(_id)
+        playlist = Plg().extract_playlist(_id)
         if playlist is not None:
             return (Plg.__name__, playlist)
     raise ValueError(f'Playlist "{_id}" could not be loaded')
 
 
+def parse_range(spec: str, length: int) -> List[int]:
+    """ Turn 1-based, inclusive ranges like `1-40`, `3,5-`, `-10`
+        or `all` into (0-based) indices of a list of `length`
+    """
+    if spec.strip().lower() == 'all':
+        return list(range(length))
+
+    indices = []  # type: List[int]
+    for part in spec.split(','):
+        part = part.strip()
+        try:
+            if '-' in part:
+                start_s, end_s = part.split('-', 1)
+                start = int(start_s) if start_s.strip() else 1
+                end = int(end_s) if end_s.strip() else length
+            else:
+                start = end = int(part)
+        except ValueError:
+            raise ValueError(f'Invalid range "{part}"')
+
+        if not 1 <= start <= end <= length:
+            raise ValueError(f'Range "{part}" is not within 1-{length}')
+        indices.extend(range(start - 1, end))
+    return sorted(set(indices))
+
+
 def nested_dict_update(
     cur_dict: Dict[Any, Any],
     update_data: Dict[Any, Any]
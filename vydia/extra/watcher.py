@@ -0,0 +1,371 @@
+"""
+Report media files appearing in or vanishing from playlist directories
+"""
+
+import os
+import time
+import errno
+import select
+import struct
+import threading
+from abc import ABC, abstractmethod
+
+from logzero import logger
+
+from typing import (  # noqa: F401
+    Any, Callable, Dict, Iterable, Optional, Set)
+
+from .scan import ScanOptions, scan_directory, scan_media
+from .poller import AdaptivePoller
+
+
+# (added, removed), paths in both were replaced
+ChangeCallback = Callable[[Set[str], Set[str]], None]
+
+# see inotify(7)
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x1000000
+IN_EXCL_UNLINK = 0x4000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_EXCL_UNLINK)
+
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class BaseWatcher(ABC):
+    """ Call `callback(added, removed)` from a background thread when
+        media files below `root` change, `known` are the files present
+        when watching starts
+    """
+
+    def __init__(
+        self,
+        root: str, options: ScanOptions, callback: ChangeCallback,
+        known: Iterable[str] = ()
+    ) -> None:
+        self.root = root
+        self.options = options
+        self.callback = callback
+        self.known = set(known)
+
+        self._added = set()  # type: Set[str]
+        self._removed = set()  # type: Set[str]
+
+    def __enter__(self) -> 'BaseWatcher':
+        self.start()
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.stop()
+
+    @abstractmethod
+    def start(self) -> None:
+        pass
+
+    @abstractmethod
+    def stop(self) -> None:
+        pass
+
+    def _is_media(self, path: str) -> bool:
+        rel_path = os.path.relpath(path, self.root)
+        return not os.path.basename(path).startswith('.') \
+            and self.options.is_media(rel_path)
+
+    def _file_added(self, path: str) -> None:
+        if path in self.known:
+            self._removed.add(path)
+        self._added.add(path)
+
+    def _file_removed(self, path: str) -> None:
+        self._added.discard(path)
+        if path in self.known:
+            self._removed.add(path)
+
+    def _diff(self, current: Set[str]) -> None:
+        for path in self.known - current:
+            self._file_removed(path)
+        for path in current - self.known:
+            self._file_added(path)
+
+    def _flush(self) -> None:
+        added, removed = self._added, self._removed
+        self._added, self._removed = set(), set()
+        if len(added) == 0 and len(removed) == 0:
+            return
+
+        self.known -= removed
+        self.known |= added
+        logger.info(
+            f'"{self.root}" changed: {len(added)} added, '
+            f'{len(removed)} removed')
+        try:
+            self.callback(added, removed)
+        except Exception:
+            logger.exception('Handling directory changes failed')
+
+
+class PollingWatcher(BaseWatcher):
+    """ Rescan directory every `interval` seconds
+    """
+
+    def __init__(
+        self,
+        root: str, options: ScanOptions, callback: ChangeCallback,
+        known: Iterable[str] = (), interval: float = 5
+    ) -> None:
+        super().__init__(root, options, callback, known)
+        self.poller = AdaptivePoller(self._poll, fast=interval, slow=interval)
+
+    def start(self) -> None:
+        self.poller.start()
+        self.poller.steady()
+
+    def stop(self) -> None:
+        self.poller.stop()
+
+    def _poll(self) -> None:
+        self._diff(set(scan_media(self.root, self.options)))
+        self._flush()
+
+
+class InotifyWatcher(BaseWatcher):
+    """ Sleep until the kernel reports changes, then wait `debounce`
+        seconds (at most `max_delay`) for more before reporting them
+    """
+
+    def __init__(
+        self,
+        root: str, options: ScanOptions, callback: ChangeCallback,
+        known: Iterable[str] = (),
+        debounce: float = .2, max_delay: float = .8
+    ) -> None:
+        super().__init__(root, options, callback, known)
+        self.debounce = debounce
+        self.max_delay = max_delay
+
+        self._libc = _load_libc()
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise _os_error('inotify_init1')
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        # `_run` closes the descriptors itself when it fails
+        self._closed = False
+        self._close_lock = threading.Lock()
+
+        self._watches = {}  # type: Dict[int, str]
+        self._thread = None  # type: Optional[threading.Thread]
+
+        try:
+            if options.recursive:
+                self._add_tree(root, report=False)
+            else:
+                self._add_watch(root)
+        except OSError:
+            self._close()
+            raise
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name='vydia-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            self._close()
+            return
+
+        with self._close_lock:
+            if not self._closed:
+                os.write(self._wakeup_w, b'x')
+        self._thread.join(2)
+        self._thread = None
+
+    def _close(self) -> None:
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            for fd in (self._fd, self._wakeup_r, self._wakeup_w):
+                os.close(fd)
+
+    def _add_watch(self, path: str) -> None:
+        wd = self._libc.inotify_add_watch(
+            self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            raise _os_error(path)
+        self._watches[wd] = path
+
+    def _add_tree(self, path: str, report: bool = True) -> None:
+        """ Watch `path` and its subdirectories, report media files
+            which were created before the watch was in place
+        """
+        todo = [path]
+        while len(todo) > 0:
+            cur = todo.pop()
+            self._add_watch(cur)
+            try:
+                files, dirs = scan_directory(cur)
+            except OSError as err:
+                logger.warning(f'Cannot watch "{cur}": {err}')
+                continue
+
+            if report:
+                for fname in files:
+                    if self._is_media(fname):
+                        self._file_added(fname)
+            todo.extend(
+                dname for dname, _ in dirs
+                if not self.options.is_excluded(
+                    os.path.relpath(dname, self.root)))
+
+    def _forget_tree(self, path: str) -> None:
+        prefix = path + os.sep
+        for fname in list(self.known | self._added):
+            if fname.startswith(prefix):
+                self._file_removed(fname)
+
+        for wd, dname in list(self._watches.items()):
+            if dname == path or dname.startswith(prefix):
+                # fails for deleted directories, which is fine
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._watches[wd]
+
+    def _run(self) -> None:
+        poller = select.poll()
+        poller.register(self._fd, select.POLLIN)
+        poller.register(self._wakeup_r, select.POLLIN)
+
+        try:
+            deadline = None  # type: Optional[float]
+            while True:
+                if deadline is None:
+                    timeout = None  # type: Optional[float]
+                else:
+                    timeout = max(0, min(
+                        self.debounce, deadline - time.monotonic()))
+
+                ready = [
+                    fd for fd, _ in poller.poll(
+                        None if timeout is None else timeout * 1000)]
+                if self._wakeup_r in ready:
+                    return
+
+                if self._fd in ready:
+                    self._read_events()
+                    if deadline is None:
+                        deadline = time.monotonic() + self.max_delay
+                    if time.monotonic() < deadline:
+                        continue
+
+                self._flush()
+                deadline = None
+        except Exception:
+            logger.exception(f'Watching "{self.root}" failed')
+        finally:
+            self._close()
+
+    def _read_events(self) -> None:
+        try:
+            buf = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+
+        offset = 0
+        while offset < len(buf):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(buf, offset)
+            offset += EVENT_HEADER.size
+            name = buf[offset:offset + length].rstrip(b'\0')
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                logger.warning(f'Missed changes in "{self.root}", rescanning')
+                self._diff(set(scan_media(self.root, self.options)))
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+
+            directory = self._watches.get(wd)
+            if directory is None:
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                if directory == self.root:
+                    logger.warning(f'"{self.root}" is gone')
+                continue
+
+            path = os.path.join(directory, os.fsdecode(name))
+            self._handle_event(path, mask)
+
+    def _handle_event(self, path: str, mask: int) -> None:
+        if os.path.basename(path).startswith('.'):
+            return
+
+        if mask & IN_ISDIR:
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                self._forget_tree(path)
+            elif mask & (IN_CREATE | IN_MOVED_TO) and self.options.recursive \
+                    and not self.options.is_excluded(
+                        os.path.relpath(path, self.root)):
+                try:
+                    self._add_tree(path)
+                except OSError as err:
+                    logger.warning(f'Cannot watch "{path}": {err}')
+        elif self._is_media(path):
+            # files are only complete once written (or moved in)
+            if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                self._file_added(path)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self._file_removed(path)
+
+
+def _load_libc() -> Any:
+    import ctypes
+    import ctypes.util
+
+    name = ctypes.util.find_library('c')
+    if name is None:
+        raise OSError('libc not found')
+    libc = ctypes.CDLL(name, use_errno=True)
+    if not hasattr(libc, 'inotify_init1'):
+        raise OSError('inotify is not supported')
+
+    libc.inotify_add_watch.argtypes = [
+        ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    return libc
+
+
+def _os_error(what: str) -> OSError:
+    import ctypes
+    err = ctypes.get_errno()
+    msg = os.strerror(err)
+    if err == errno.ENOSPC:
+        msg += ' (raise fs.inotify.max_user_watches)'
+    return OSError(err, f'{what}: {msg}')
+
+
+def create_watcher(
+    root: str, options: ScanOptions, callback: ChangeCallback,
+    known: Iterable[str] = (), poll_interval: float = 5
+) -> BaseWatcher:
+    """ Use inotify where available, poll otherwise
+    """
+    try:
+        return InotifyWatcher(root, options, callback, known)
+    except (OSError, AttributeError) as err:
+        logger.info(f'Polling "{root}" for changes: {err}')
+        return PollingWatcher(
+            root, options, callback, known, interval=poll_interval)
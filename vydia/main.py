@@ -2,21 +2,33 @@
 Main interface
 """
 
-from typing import Any
+from pathlib import Path
+
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
 
 import click
 
-from .extra.player import BasePlayer
+if TYPE_CHECKING:
+    from .extra.player import BasePlayer  # noqa: F401
+    from .extra.discovery import DeviceCache  # noqa: F401
 
 
-def get_player(remote: str) -> BasePlayer:
+def get_player(remote: str, ipc: bool = False) -> 'BasePlayer':
     """ Yield local or airplay Player, depending on given specification
     """
-    player: BasePlayer
+    player: 'BasePlayer'
+    if len(remote) > 0:
+        try:
+            remote = get_device_cache().resolve(remote)
+        except ValueError as err:  # unknown or ambiguous device name
+            raise click.ClickException(str(err))
     server_type, url = (remote.split('::')
                         if len(remote) > 0 else ('local', None))
 
-    if server_type == 'local':
+    if server_type == 'local' and ipc:
+        from .extra.player import IPCPlayer
+        player = IPCPlayer()
+    elif server_type == 'local':
         from .extra.player import LocalPlayer
         player = LocalPlayer()
     elif server_type.lower() == 'airplay':
@@ -40,50 +52,457 @@ def get_player(remote: str) -> BasePlayer:
 @click.option(
     '--titles/--no-titles', default=True,
     help='Display title at beginning of each video.')
+@click.option(
+    '--preload/--no-preload', default=True,
+    help='Queue up next video early for gapless playback.')
+@click.option(
+    '--ipc/--no-ipc', default=False,
+    help='Run mpv as separate process (controlled via JSON-IPC).')
 @click.option(
     '--remote', default='',
     help='Use remote server if specified '
-         '(format: "airplay::<ip>:<port>", "dlna::<url>").')
+         '(format: "airplay::<ip>:<port>", "dlna::<url>", or name/index '
+         'as shown by list-devices).')
+@click.option(
+    '--watch/--no-watch', default=False, envvar='VYDIA_WATCH',
+    help='Pick up files added to or removed from directory playlists.')
+@click.option(
+    '--plugin-timeout', default=120., show_default=True,
+    envvar='VYDIA_PLUGIN_TIMEOUT',
+    help='Seconds after which loading a playlist is aborted (0 to wait '
+         'forever).')
+@click.option(
+    '--state-gc/--no-state-gc', default=False, envvar='VYDIA_STATE_GC',
+    help='Clean up progress of vanished videos in the background '
+         '(see "state gc").')
+@click.option(
+    '--log-json', is_flag=True, envvar='VYDIA_LOG_JSON',
+    help='Write log file as JSON lines (including timings).')
+@click.option(
+    '--checkpoint-interval', default=10., show_default=True,
+    help='Seconds between saves of playback position (0 to disable).')
+@click.option(
+    '--profile', is_flag=True, envvar='VYDIA_PROFILE',
+    help='Record cProfile stats of session in log directory '
+         '(see "profile report").')
+@click.option(
+    '--profile-memory', is_flag=True, envvar='VYDIA_PROFILE_MEMORY',
+    help='Also record tracemalloc snapshots when profiling.')
+@click.option(
+    '--metrics', is_flag=True, envvar='VYDIA_METRICS',
+    help='Record timings and counters (see "stats").')
+@click.option(
+    '--metrics-port', type=int, envvar='VYDIA_METRICS_PORT',
+    help='Also serve metrics to Prometheus at '
+         'http://localhost:<port>/metrics.')
 @click.pass_context
-def main(ctx: Any, video: bool, titles: bool, remote: str) -> None:
+def main(
+    ctx: Any,
+    video: bool, titles: bool, preload: bool, ipc: bool, remote: str,
+    watch: bool, plugin_timeout: float, state_gc: bool, log_json: bool,
+    checkpoint_interval: float,
+    profile: bool, profile_memory: bool,
+    metrics: bool, metrics_port: Optional[int]
+) -> None:
     config = {
         'show_video': video,
-        'show_titles': titles
+        'show_titles': titles,
+        'preload': preload,
+        'watch': watch,
+        'state_gc': state_gc,
+        'log_json': log_json,
+        'checkpoint_interval': checkpoint_interval
     }
 
+    ctx.obj = {'config': config, 'remote': remote, 'ipc': ipc}
+
+    from .extra import plugin_pool
+    plugin_pool.configure(timeout=plugin_timeout or None)
+
+    if profile and ctx.invoked_subcommand != 'profile':
+        from .extra.profiling import ProfileSession
+        ctx.with_resource(ProfileSession(trace_memory=profile_memory))
+
+    if (metrics or metrics_port is not None) \
+            and ctx.invoked_subcommand != 'stats':
+        from .extra import metrics as metrics_module
+        metrics_module.enable()
+        ctx.with_resource(metrics_module.MetricsWriter(
+            metrics_module.get_metrics_dir()))
+
+        if metrics_port is not None:
+            from .extra.metrics_server import MetricsServer
+            ctx.with_resource(MetricsServer(metrics_port))
+
     if ctx.invoked_subcommand is None:
         from .core.controller import Controller
-        with Controller(get_player(remote), config) as c:
+        from .core.daemon import DaemonPlayer, get_daemon_client
+
+        # let a running daemon play videos instead of starting a new player
+        client = get_daemon_client() if len(remote) == 0 else None
+        if client is not None:
+            client.close()
+            player = DaemonPlayer()  # type: BasePlayer
+        else:
+            player = get_player(remote, ipc)
+
+        with Controller(player, config) as c:
             c.main()
 
 
+def call_daemon(method: str, **params: Any) -> Any:
+    """ Run command in daemon, exit if none is running
+    """
+    from .core.daemon import DaemonError, get_daemon_client
+
+    client = get_daemon_client()
+    if client is None:
+        raise click.ClickException('No running daemon found (see "daemon")')
+
+    try:
+        return client.call(method, **params)
+    except DaemonError as err:
+        raise click.ClickException(str(err))
+    finally:
+        client.close()
+
+
+def print_progress(info: Dict[str, Any]) -> None:
+    if info['title'] is None:
+        print('Nothing playing')
+    else:
+        print(f'{info["playlist"] or "<external>"}: "{info["title"]}" '
+              f'({info["timestamp"]})')
+
+
+@main.command(help='Run headless player for instant commands.')
+@click.pass_obj
+def daemon(obj: Dict[str, Any]) -> None:
+    from .core.daemon import run_daemon
+    run_daemon(get_player(obj['remote'], obj['ipc']), obj['config'])
+
+
 @main.command(help='Add new playlist by id.')
 @click.argument('playlist', nargs=-1, required=True)
 def add_playlist(playlist: str) -> None:
     from .core.model import Model
+    from .core.daemon import DaemonError, get_daemon_client
 
+    client = get_daemon_client()
     for pl in playlist:
-        result = Model().add_new_playlist(pl)
+        if client is not None:
+            try:
+                result = client.call('add', playlist=pl)
+                result = (result['title'], result['plugin'])
+            except DaemonError:
+                result = None
+        else:
+            result = Model().add_new_playlist(pl)
+
         if result is None:
             print(f'Playlist "{pl}" could not be added')
         else:
             title, plugin = result
             print(f'Added "{title}" using {plugin}')
 
+    if client is not None:
+        client.close()
+
+
+@main.command(name='list', help='List playlists or videos of playlist.')
+@click.argument('playlist', required=False)
+def list_(playlist: Optional[str]) -> None:
+    if playlist is None:
+        for name in call_daemon('list'):
+            print(name)
+    else:
+        for vid in call_daemon('list', playlist=playlist):
+            print(f'#{vid["index"]}: {vid["title"]} '
+                  f'({vid["timestamp"]})')
+
+
+@main.command(help='Play playlist in daemon (resumes last video).')
+@click.argument('playlist')
+@click.argument('video', required=False)
+def play(playlist: str, video: Optional[str]) -> None:
+    params = {'playlist': playlist}  # type: Dict[str, Any]
+    if video is not None:
+        params['video'] = int(video) if video.isdigit() else video
+    print_progress(call_daemon('play', **params))
+
+
+def print_continue_list(entries: List[Dict[str, Any]]) -> None:
+    from .extra.utils import sec2ts
+
+    if len(entries) == 0:
+        print('Nothing to continue (playlists show up once loaded)')
+    for i, entry in enumerate(entries):
+        status = f'at {entry["timestamp"]}' \
+            if entry['status'] == 'in-progress' else 'up next'
+        print(f'#{i+1}: {entry["playlist"]}: "{entry["title"]}" '
+              f'({status}, {sec2ts(entry["duration"])})')
+
+
+def play_in_foreground(obj: Dict[str, Any], entry: int) -> None:
+    """ Play from continue-watching list until player is closed
+        or playlist is over
+    """
+    import threading
+    from .core.daemon import Daemon, DaemonError
+
+    daemon = Daemon(get_player(obj['remote'], obj['ipc']), obj['config'])
+    done = threading.Event()
+
+    def handle(method: str, params: Dict[str, Any]) -> None:
+        if method == 'stopped' or (
+                method == 'event' and params['name'] == 'VIDEO_QUIT'):
+            done.set()
+    daemon.subscribe(handle)
+
+    try:
+        print_progress(daemon.rpc_continue(entry=entry))
+        done.wait()
+    except DaemonError as err:
+        raise click.ClickException(str(err))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.shutdown()
+
+
+@main.command(
+    name='next',
+    help='Skip to next video in daemon, or continue watching: play '
+         'ENTRY (default: first) of the list shown by "--list", without '
+         'running a daemon if there is none.')
+@click.argument('entry', type=int, required=False)
+@click.option(
+    '--list', 'list_', is_flag=True,
+    help='List unfinished and next unwatched videos of all playlists, '
+         'most recently watched first.')
+@click.pass_obj
+def next_(obj: Dict[str, Any], entry: Optional[int], list_: bool) -> None:
+    from .core.daemon import DaemonError, get_daemon_client
+
+    client = get_daemon_client()
+    if client is None:
+        if list_:
+            from .core.model import Model
+            print_continue_list(Model().get_continue_watching())
+        else:
+            play_in_foreground(obj, (entry or 1) - 1)
+        return
+
+    try:
+        if list_:
+            print_continue_list(client.call('continue.list'))
+            return
+
+        progress = client.call('progress')
+        if entry is None and progress['playlist'] is not None:
+            print_progress(client.call('next'))
+        else:
+            print_progress(client.call('continue', entry=(entry or 1) - 1))
+    except DaemonError as err:
+        raise click.ClickException(str(err))
+    finally:
+        client.close()
+
+
+@main.command(help='Toggle pause in daemon.')
+def pause() -> None:
+    call_daemon('pause')
+
+
+@main.command(help='Show what daemon is currently playing.')
+def progress() -> None:
+    print_progress(call_daemon('progress'))
+
+
+@main.command(help='Reload playlist in daemon.')
+@click.argument('playlist')
+def refresh(playlist: str) -> None:
+    info = call_daemon('refresh', playlist=playlist)
+    print(f'Reloaded "{info["title"]}" ({info["count"]} videos)')
+
+
+@main.command(help='Show metrics of running daemon or last session.')
+@click.option(
+    '--prometheus', is_flag=True, help='Print Prometheus text format.')
+def stats(prometheus: bool) -> None:
+    from .extra import metrics
+    from .extra.utils import sec2ts
+    from .core.daemon import get_daemon_client
+
+    client = get_daemon_client()
+    if client is not None:
+        try:
+            snap = client.call('stats')
+        finally:
+            client.close()
+    else:
+        snap = metrics.load(metrics.get_metrics_dir())
+
+    if snap is None or len(snap['counters']) + len(snap['histograms']) == 0:
+        raise click.ClickException(
+            'No metrics recorded (run with "--metrics")')
+
+    if prometheus:
+        print(metrics.to_prometheus(snap), end='')
+        return
+
+    def fmt_name(entry: Dict[str, Any]) -> str:
+        labels = ','.join(f'{k}={v}' for k, v in entry['labels'].items())
+        return f'{entry["name"]}{{{labels}}}' if labels else entry['name']
+
+    uptime = max(snap['updated'] - snap['started'], 1e-9)
+    print(f'Process {snap["pid"]}, recorded for {sec2ts(int(uptime))}')
+
+    print(f'\n{"latency":<50} {"count":>7} {"mean":>9} '
+          f'{"p50":>9} {"p95":>9}')
+    for hist in snap['histograms']:
+        p50, p95 = (
+            metrics.quantile(hist, q, snap['buckets']) for q in (.5, .95))
+        print(f'{fmt_name(hist):<50} {hist["count"]:>7} '
+              f'{hist["sum"] / hist["count"] * 1000:>7.1f}ms '
+              f'<{p50 * 1000:>6.0f}ms <{p95 * 1000:>6.0f}ms')
+
+    print(f'\n{"counter":<50} {"value":>12} {"per second":>12}')
+    for counter in snap['counters']:
+        print(f'{fmt_name(counter):<50} {counter["value"]:>12.0f} '
+              f'{counter["value"] / uptime:>12.2f}')
+
+
+@main.group(help='Maintain stored playback state.')
+def state() -> None:
+    pass
+
+
+@state.command(
+    help='Drop progress of videos which vanished from their playlists '
+         'more than RETENTION days ago, and rewrite state compactly.')
+@click.option(
+    '--retention', default=30., show_default=True,
+    help='Days to keep progress of vanished videos around.')
+@click.option(
+    '--dry-run', is_flag=True, help='Only report what would be done.')
+def gc(retention: float, dry_run: bool) -> None:
+    from .core.model import Model
+    from .core.daemon import DaemonError, get_daemon_client
+
+    # let a running daemon do it, as it owns the state
+    retention_sec = retention * 24 * 60 * 60
+    client = get_daemon_client()
+    if client is not None:
+        try:
+            stats = client.call(
+                'state.gc', retention=retention_sec, dry_run=dry_run)
+        except DaemonError as err:
+            raise click.ClickException(str(err))
+        finally:
+            client.close()
+    else:
+        stats = Model().collect_garbage(retention_sec, dry_run=dry_run)
+
+    print(f'Checked {stats["playlists"]} playlists: '
+          f'{stats["orphaned"]} episodes newly vanished, '
+          f'{stats["restored"]} reappeared, {stats["removed"]} removed, '
+          f'{stats["caches_removed"]} stale caches removed')
+    reclaimed = stats['bytes_before'] - stats['bytes_after']
+    print(f'{"Would reclaim" if dry_run else "Reclaimed"} '
+          f'{reclaimed / 1024:.1f}KB '
+          f'({stats["bytes_before"] / 1024:.1f}KB -> '
+          f'{stats["bytes_after"] / 1024:.1f}KB)')
+
+
+@main.group(help='Inspect recorded profiling sessions.')
+def profile() -> None:
+    pass
+
+
+@profile.command(name='list', help='List recorded sessions.')
+def profile_list() -> None:
+    from .extra.profiling import list_sessions
+    for session in list_sessions():
+        print(session)
+
+
+@profile.command(
+    help='Summarize hottest functions and largest allocators of session '
+         '(default: latest).')
+@click.argument('session', required=False, type=click.Path(file_okay=False))
+@click.option('--limit', default=20, show_default=True)
+@click.option(
+    '--sort', default='cumulative', show_default=True,
+    type=click.Choice(['cumulative', 'tottime', 'calls']))
+def report(session: Optional[str], limit: int, sort: str) -> None:
+    from .extra.profiling import list_sessions, summarize
+
+    if session is None:
+        sessions = list_sessions()
+        if len(sessions) == 0:
+            raise click.ClickException('No profiling sessions recorded')
+        path = sessions[-1]
+    else:
+        path = Path(session)
+        if not (path / 'session.json').exists():
+            raise click.ClickException(f'No profiling session at "{path}"')
+
+    summary = summarize(path, limit=limit, sort=sort)
+    print(f'Session {summary["session"]} ({summary["duration"]:.1f}s, '
+          f'threads: {", ".join(summary["threads"])})')
+
+    print(f'\nHottest functions (by {sort}):')
+    print(f'{"calls":>10} {"tottime":>9} {"cumtime":>9}  function')
+    for func in summary['functions']:
+        print(f'{func["calls"]:>10} {func["tottime"]:>9.3f} '
+              f'{func["cumtime"]:>9.3f}  {func["function"]}')
+
+    if len(summary['allocators']) > 0:
+        print('\nLargest allocators (growth during session):')
+        print(f'{"size":>10} {"growth":>10} {"blocks":>8}  location')
+        for alloc in summary['allocators']:
+            print(f'{alloc["size"] / 1024:>8.1f}KB '
+                  f'{alloc["size_diff"] / 1024:>+8.1f}KB '
+                  f'{alloc["count"]:>8}  {alloc["location"]}')
+
+
+def get_device_cache() -> 'DeviceCache':
+    from appdirs import AppDirs
+    from .extra.discovery import DeviceCache
+    return DeviceCache(
+        Path(AppDirs('vydia', 'kpj').user_data_dir) / 'devices.json')
+
+
+def print_devices(kind: Optional[str], refresh: bool) -> None:
+    devices = get_device_cache().get_devices(refresh=refresh)
+    for i, dev in enumerate(devices):
+        if kind is None or dev.kind == kind:
+            print(f'#{i+1}: {dev.name} [{dev.spec}] ({dev.model})')
+
+
+@main.command(help='List available airplay and DLNA devices.')
+@click.option(
+    '--refresh', is_flag=True,
+    help='Scan network even if cached devices are available.')
+def list_devices(refresh: bool) -> None:
+    print_devices(None, refresh)
+
 
 @main.command(help='List available airplay devices.')
-def list_airplay_devices() -> None:
-    from airplay import AirPlay
-    for i, ap in enumerate(AirPlay.find(fast=False)):
-        info = ap.server_info()
-        print(f'#{i+1}: {ap.host}:{ap.port} ({info["model"]})')
+@click.option(
+    '--refresh', is_flag=True,
+    help='Scan network even if cached devices are available.')
+def list_airplay_devices(refresh: bool) -> None:
+    print_devices('airplay', refresh)
 
 
 @main.command(help='List available DLNA devices.')
-def list_dlna_devices() -> None:
-    from nanodlna import devices
-    for i, dev in enumerate(devices.get_devices()):
-        print(f'#{i+1}: {dev["friendly_name"]} ({dev["location"]})')
+@click.option(
+    '--refresh', is_flag=True,
+    help='Scan network even if cached devices are available.')
+def list_dlna_devices(refresh: bool) -> None:
+    print_devices('dlna', refresh)
 
 
 if __name__ == '__main__':
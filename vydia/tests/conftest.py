@@ -0,0 +1,76 @@
+import queue
+import threading
+import socketserver
+import http.server
+
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterator, List, Type  # noqa: F401
+
+import pytest
+
+from ..extra.player import BasePlayer
+
+
+class FakeHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """ Local HTTP server whose state is shared with its handlers
+    """
+    daemon_threads = True
+
+
+@pytest.fixture
+def recorder() -> Dict[str, queue.Queue]:
+    return {'pos': queue.Queue(), 'events': queue.Queue()}
+
+
+@pytest.fixture
+def http_server() -> Iterator[Callable[..., FakeHTTPServer]]:
+    """ Start server for given handler class in background,
+        keyword arguments become attributes of the server
+    """
+    servers = []  # type: List[FakeHTTPServer]
+
+    def start(
+        handler: Type[http.server.BaseHTTPRequestHandler], **state: Any
+    ) -> FakeHTTPServer:
+        srv = FakeHTTPServer(('127.0.0.1', 0), handler)
+        for key, value in state.items():
+            setattr(srv, key, value)
+
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        servers.append(srv)
+        return srv
+
+    yield start
+
+    for srv in servers:
+        srv.shutdown()
+        srv.server_close()
+
+
+@pytest.fixture
+def start_player(
+    recorder: Dict[str, queue.Queue]
+) -> Iterator[Callable[..., BasePlayer]]:
+    """ Set up player reporting to `recorder` with short polling
+        intervals, keyword arguments become attributes of the
+        controller's player queue
+    """
+    players = []  # type: List[BasePlayer]
+
+    def start(pl: BasePlayer, **queue_state: Any) -> BasePlayer:
+        if hasattr(pl, 'FAST_POLL'):
+            pl.FAST_POLL = .01
+            pl.SLOW_POLL = .05
+            pl.POLL_BURST = .1
+        if len(queue_state) > 0:
+            pl.set_controller(SimpleNamespace(
+                player=SimpleNamespace(**queue_state)))
+
+        pl.setup(recorder['pos'].put, recorder['events'].put)
+        players.append(pl)
+        return pl
+
+    yield start
+
+    for pl in players:
+        pl.shutdown()
@@ -0,0 +1,174 @@
+import time
+import queue
+import plistlib
+import http.server
+
+from types import SimpleNamespace
+from typing import Any, Callable, Dict
+
+import pytest
+
+from ..extra.player import AirPlayer, PlayerEvent
+from .conftest import FakeHTTPServer
+
+
+class FakeAirPlayHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def _reply(self, body: bytes = b'', ctype: str = '') -> None:
+        self.send_response(200)
+        if len(ctype) > 0:
+            self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        self.server.requests.append(self.path)
+
+        if self.path == '/playback-info':
+            self.server.position += 1
+            self._reply(plistlib.dumps({
+                'position': float(self.server.position),
+                'duration': 100., 'rate': self.server.rate
+            }), 'text/x-apple-plist+xml')
+        else:
+            self._reply()
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.requests.append(self.path)
+
+        if self.path == '/reverse':
+            self.server.connections -= 1
+            self._push_events()
+        elif self.path.startswith('/rate?value='):
+            self.server.rate = float(self.path.split('=')[1])
+            self._reply()
+        else:
+            self._reply()
+
+    def _push_events(self) -> None:
+        self.send_response(101)
+        self.send_header('Upgrade', 'PTTH/1.0')
+        self.send_header('Connection', 'Upgrade')
+        self.end_headers()
+        self.wfile.flush()
+
+        while True:
+            event = self.server.events.get()
+            if event is None:
+                break
+
+            body = plistlib.dumps(event)
+            self.wfile.write(
+                b'POST /event HTTP/1.1\r\n'
+                b'Content-Type: text/x-apple-plist+xml\r\n'
+                + f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+            self.wfile.flush()
+
+            # wait for acknowledgement
+            while self.rfile.readline() not in (b'\r\n', b''):
+                pass
+        self.close_connection = True
+
+
+@pytest.fixture
+def server(http_server: Callable[..., FakeHTTPServer]) -> FakeHTTPServer:
+    srv = http_server(
+        FakeAirPlayHandler, connections=0, position=0, rate=1.,
+        requests=[], events=queue.Queue())
+    yield srv
+    srv.events.put(None)
+
+
+@pytest.fixture
+def player(
+    server: FakeHTTPServer, start_player: Callable[..., AirPlayer]
+) -> AirPlayer:
+    return start_player(
+        AirPlayer(*server.server_address),
+        ts=0, current_vid=SimpleNamespace(duration=100))
+
+
+def test_adaptive_polling(
+    server: FakeHTTPServer, player: AirPlayer,
+    recorder: Dict[str, queue.Queue]
+) -> None:
+    # nothing is polled before a video is loaded
+    time.sleep(.1)
+    assert '/playback-info' not in server.requests
+
+    player.play_video('http://example.com/video.mp4', start=50)
+    assert recorder['pos'].get(timeout=2) == 1.
+    assert recorder['pos'].get(timeout=2) == 2.
+
+    # polls are fast right after loading and slow afterwards
+    time.sleep(.1)
+    before = server.requests.count('/playback-info')
+    time.sleep(.2)
+    after = server.requests.count('/playback-info')
+    assert 1 <= after - before <= 6
+
+    # all commands share a single connection
+    assert server.connections == 1
+
+    player.shutdown()
+    assert not player.poller.running
+    assert not player._event_thread.is_alive()
+    assert server.requests[-1] == '/stop'
+
+
+def test_events(
+    server: FakeHTTPServer, player: AirPlayer,
+    recorder: Dict[str, queue.Queue]
+) -> None:
+    player.play_video('http://example.com/video.mp4')
+
+    server.rate = 0.
+    server.events.put({'category': 'video', 'state': 'paused'})
+    time.sleep(.1)
+    assert player.paused
+
+    # while paused, nothing is polled
+    before = server.requests.count('/playback-info')
+    time.sleep(.1)
+    assert server.requests.count('/playback-info') == before
+
+    player.toggle_pause()
+    assert server.requests[-1] == '/rate?value=1.0'
+    assert not player.paused
+
+    player.controller.player.ts = 30
+    server.events.put({'category': 'video', 'state': 'stopped'})
+    assert recorder['events'].get(timeout=2) is PlayerEvent.VIDEO_QUIT
+
+    player.controller.player.ts = 98
+    server.events.put({'category': 'video'})
+    server.events.put({'category': 'photo', 'state': 'stopped'})
+    server.events.put({'category': 'video', 'state': 'stopped'})
+    assert recorder['events'].get(timeout=2) is PlayerEvent.VIDEO_OVER
+
+    player.shutdown()
+
+
+def test_setup_again(
+    player: AirPlayer, recorder: Dict[str, queue.Queue]
+) -> None:
+    poller, thread = player.poller, player._event_thread
+    player.setup(recorder['pos'].put, recorder['events'].put)
+
+    # listeners of first setup are gone
+    assert not poller.running
+    thread.join(2)
+    assert not thread.is_alive()
+    assert player.poller.running and player._event_thread.is_alive()
+
+    player.shutdown()
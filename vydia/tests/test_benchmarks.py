@@ -0,0 +1,32 @@
+import os
+
+import pytest
+
+from ..benchmarks import BENCHMARKS, run_benchmarks, compare_results
+from ..benchmarks.memory import measure_playlist
+
+
+def test_smoke(tmpdir: str) -> None:
+    results = run_benchmarks(str(tmpdir), scale=.001, repeat=1, min_time=0)
+
+    assert set(results['results']) == set(BENCHMARKS)
+    assert 'model.update_state' in BENCHMARKS
+    for res in results['results'].values():
+        assert res['min'] > 0
+    assert os.path.isfile(os.path.join(tmpdir, 'model.load_state/state.json'))
+
+
+def test_compare() -> None:
+    def make(**timings: float) -> dict:
+        return {'results': {k: {'min': v} for k, v in timings.items()}}
+
+    rows = compare_results(
+        make(a=1., b=1., c=1.), make(a=1.05, b=2., d=1.), threshold=.1)
+    assert rows == [
+        ('a', 1., 1.05, pytest.approx(.05), False), ('b', 1., 2., 1., True)]
+
+
+def test_playlist_memory() -> None:
+    report = measure_playlist(500)
+    assert report['videos'] == 500
+    assert 0 < report['retained_per_video'] < 2000
@@ -0,0 +1,62 @@
+from typing import List, Tuple
+
+from ..core.checkpoint import Checkpointer
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_checkpointer(**kwargs: int) -> Tuple[Checkpointer, Clock, List]:
+    writes = []  # type: List[Tuple[str, str, str, int]]
+    clock = Clock()
+    cp = Checkpointer(
+        lambda *args: writes.append(args), clock=clock, **kwargs)
+    return cp, clock, writes
+
+
+def test_interval_and_threshold() -> None:
+    cp, clock, writes = make_checkpointer(interval=10, threshold=5)
+
+    # one position update per second
+    for ts in range(30):
+        clock.now = ts
+        cp.update('pl', 'id', 'ep', ts)
+    assert writes == [('pl', 'id', 'ep', 0), ('pl', 'id', 'ep', 10), ('pl', 'id', 'ep', 20)]
+
+    # paused: position does not move, nothing is written
+    for _ in range(30):
+        clock.now += 1
+        cp.update('pl', 'id', 'ep', 29)
+    assert len(writes) == 4 and writes[-1] == ('pl', 'id', 'ep', 29)
+
+    # already saved elsewhere
+    cp.saved('pl', 'id', 'ep', 100)
+    clock.now += 100
+    assert not cp.update('pl', 'id', 'ep', 101)
+
+
+def test_pause_and_seek_are_written_immediately() -> None:
+    cp, clock, writes = make_checkpointer(interval=10, threshold=5)
+
+    cp.update('pl', 'id', 'ep', 0)
+    clock.now = 6
+    assert cp.update('pl', 'id', 'ep', 6, force=True)
+
+    clock.now = 7
+    assert cp.update('pl', 'id', 'ep', 300)
+    assert writes[-1] == ('pl', 'id', 'ep', 300)
+
+
+def test_write_cap() -> None:
+    cp, clock, writes = make_checkpointer(
+        interval=1, threshold=0, max_per_minute=3)
+
+    for ts in range(120):
+        clock.now = ts
+        cp.update('pl', 'id', 'ep', ts)
+    assert [w[3] for w in writes] == [0, 1, 2, 60, 61, 62]
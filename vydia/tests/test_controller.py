@@ -0,0 +1,98 @@
+import os
+import time
+import asyncio
+import threading
+
+from typing import Any, Iterator, List, Tuple  # noqa: F401
+
+import pytest
+import urwid
+
+from ..core.model import Model
+from ..core.controller import Controller
+from ..benchmarks.tui import HeadlessScreen, StubPlayer
+
+
+@pytest.fixture
+def controller(tmpdir: str) -> Iterator[Controller]:
+    model = Model(
+        state_fname=os.path.join(tmpdir, 'state.json'),
+        log_fname=os.path.join(tmpdir, 'log.txt'))
+    model.update_state('shows', {'id': '/videos', 'episodes': {}})
+
+    with Controller(
+        StubPlayer(),
+        {'show_video': False, 'show_titles': False, 'preload': False},
+        screen=HeadlessScreen(), model=model
+    ) as c:
+        c.view.show_playlist_overview()
+        yield c
+
+
+def info_text(controller: Controller) -> str:
+    return controller.view.widget.info_bar.text
+
+
+def test_task_result_on_ui_thread(controller: Controller) -> None:
+    results = []  # type: List[Tuple[int, int]]
+    ticks = []  # type: List[float]
+
+    def slow() -> int:
+        time.sleep(.3)
+        return 42
+
+    def tick() -> None:
+        ticks.append(time.monotonic())
+        if len(ticks) < 5:
+            controller.aloop.call_later(.02, tick)
+
+    task = controller.run_task(
+        slow, msg='Thinking',
+        callback=lambda res: results.append((res, threading.get_ident())))
+    assert 'Thinking...' in info_text(controller)
+
+    # loop keeps serving other callbacks while task runs
+    controller.aloop.call_soon(tick)
+    controller.aloop.run_until_complete(task)
+
+    assert results == [(42, threading.get_ident())]
+    assert len(ticks) == 5 and ticks[-1] < time.monotonic() - .1
+    assert len(controller.tasks) == 0
+
+
+def test_cancel_task(controller: Controller) -> None:
+    results = []  # type: List[Any]
+    task = controller.run_task(
+        time.sleep, .2, msg='Sleeping', callback=results.append)
+
+    # escape cancels running tasks instead of quitting
+    controller._unhandled_input('esc')
+    with pytest.raises(asyncio.CancelledError):
+        controller.aloop.run_until_complete(task)
+
+    assert info_text(controller) == 'Cancelled: Sleeping'
+    assert results == []
+    with pytest.raises(urwid.ExitMainLoop):
+        controller._unhandled_input('esc')
+
+
+def test_failing_task(controller: Controller) -> None:
+    def fail() -> None:
+        raise OSError('disk on fire')
+
+    controller.aloop.run_until_complete(controller.run_task(fail))
+    assert info_text(controller) == 'Error: disk on fire'
+
+
+def test_call_in_ui(controller: Controller) -> None:
+    seen = []  # type: List[int]
+
+    worker = threading.Thread(
+        target=controller.call_in_ui,
+        args=(lambda: seen.append(threading.get_ident()),))
+    worker.start()
+    worker.join()
+    assert seen == []
+
+    controller.aloop.run_until_complete(asyncio.sleep(.01))
+    assert seen == [threading.get_ident()]
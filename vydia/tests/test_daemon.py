@@ -0,0 +1,284 @@
+import os
+import time
+import functools
+import queue
+import threading
+
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterator, List, Tuple  # noqa: F401
+
+import pytest
+
+from ..core import daemon as daemon_module
+from ..core.model import Model
+from ..core.daemon import (
+    Daemon, DaemonClient, DaemonError, DaemonPlayer, DaemonServer,
+    get_daemon_client)
+from ..extra.player import BasePlayer, PlayerEvent
+from ..extra.plugins import Playlist, Video, VideoData, get_file_info
+
+
+class RecordingPlayer(BasePlayer):
+    def __init__(self) -> None:
+        self.calls = []  # type: List[Tuple[Any, ...]]
+
+    def setup(
+        self,
+        time_callback: Callable[[float], None],
+        event_callback: Callable[[PlayerEvent], None],
+        disable_video: bool = False
+    ) -> None:
+        self.time_callback = time_callback
+        self.event_callback = event_callback
+        self.calls.append(('setup',))
+
+    def play_video(self, vid: str, title: str = '', start: int = 0) -> None:
+        self.calls.append(('play', vid, start))
+
+    def toggle_pause(self) -> None:
+        self.calls.append(('pause',))
+
+    def shutdown(self) -> None:
+        self.calls.append(('shutdown',))
+
+    def display_text(self, txt: str, duration: int = 1000) -> None:
+        self.calls.append(('text', txt))
+
+
+def make_playlist(_id: str) -> Tuple[str, Playlist]:
+    pl = Playlist()
+    for i in range(3):
+        pl.append(Video(VideoData(
+            title=f'ep{i}', duration=100,
+            get_file_stream=lambda i=i: f'/videos/ep{i}.mp4',
+            get_info=lambda: '', id=f'fs:{i}')))
+    return 'FakePlugin', pl
+
+
+@pytest.fixture
+def backend() -> RecordingPlayer:
+    return RecordingPlayer()
+
+
+@pytest.fixture
+def server(
+    tmpdir: str, backend: RecordingPlayer, monkeypatch: pytest.MonkeyPatch
+) -> Iterator[DaemonServer]:
+    monkeypatch.setattr(daemon_module, 'load_playlist', make_playlist)
+
+    model = Model(
+        state_fname=os.path.join(tmpdir, 'state.json'),
+        log_fname=os.path.join(tmpdir, 'log.txt'))
+    model.update_state('shows', {'id': '/videos', 'episodes': {}})
+
+    daemon = Daemon(
+        backend, {'show_video': False, 'show_titles': False}, model=model)
+    server = DaemonServer(os.path.join(tmpdir, 'daemon.sock'), daemon)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(server: DaemonServer) -> Iterator[DaemonClient]:
+    client = DaemonClient(server.path)
+    yield client
+    client.close()
+
+
+def test_socket_setup(server: DaemonServer) -> None:
+    assert oct(os.stat(server.path).st_mode & 0o777) == '0o600'
+
+    # only one daemon may own the socket
+    with pytest.raises(DaemonError):
+        DaemonServer(server.path, server.daemon)
+
+    client = get_daemon_client(server.path)
+    assert client is not None
+    client.close()
+    assert get_daemon_client(server.path.parent / 'missing.sock') is None
+
+
+def test_commands(
+    server: DaemonServer, client: DaemonClient, backend: RecordingPlayer
+) -> None:
+    assert client.call('list') == ['shows']
+    assert [v['title'] for v in client.call('list', playlist='shows')] == \
+        ['ep0', 'ep1', 'ep2']
+
+    info = client.call('play', playlist='shows')
+    assert info['title'] == 'ep0'
+    assert backend.calls[-1] == ('play', '/videos/ep0.mp4', 0)
+
+    backend.time_callback(42.)
+    assert client.call('progress')['timestamp'] == '00:00:42'
+
+    client.call('pause')
+    assert backend.calls[-1] == ('pause',)
+
+    assert client.call('next')['title'] == 'ep1'
+    assert server.daemon.model.get_playlist_info('shows')['episodes'] == {
+        'fs:0': {'title': 'ep0', 'current_timestamp': '00:00:42'}}
+
+    # finished videos advance automatically, until the playlist ends
+    backend.event_callback(PlayerEvent.VIDEO_OVER)
+    assert client.call('progress')['title'] == 'ep2'
+    backend.event_callback(PlayerEvent.VIDEO_OVER)
+    assert client.call('progress')['title'] == 'ep2'
+
+    # resume where we left off
+    assert client.call('play', playlist='shows', video=0) == {
+        'playlist': 'shows', 'title': 'ep0', 'duration': 100,
+        'timestamp': '00:00:42', 'external': False}
+
+
+def test_loading_is_cached(
+    client: DaemonClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    loads = []  # type: List[str]
+
+    def counting_load(_id: str) -> Tuple[str, Playlist]:
+        loads.append(_id)
+        return make_playlist(_id)
+    monkeypatch.setattr(daemon_module, 'load_playlist', counting_load)
+
+    client.call('list', playlist='shows')
+    client.call('play', playlist='shows', video='ep1')
+    assert loads == ['/videos']
+
+    assert client.call('refresh', playlist='shows')['count'] == 3
+    assert loads == ['/videos', '/videos']
+
+
+def make_file_playlist(directory: str) -> Playlist:
+    pl = Playlist()
+    pl._id = '/videos'
+    for i in range(3):
+        path = os.path.join(directory, f'ep{i}.mp4')
+        open(path, 'w').close()
+        pl.append(Video(VideoData(
+            title=f'ep{i}', duration=100,
+            get_file_stream=functools.partial(str, path),
+            get_info=functools.partial(get_file_info, path), id=f'fs:{i}')))
+    return pl
+
+
+def test_continue(
+    server: DaemonServer, client: DaemonClient, backend: RecordingPlayer,
+    tmpdir: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    pl = make_file_playlist(str(tmpdir))
+    server.daemon.model.cache_playlist('shows', pl)
+    server.daemon.model.save_progress('shows', 'fs:0', 'ep0', 100)
+
+    loads = []  # type: List[str]
+    moved = tmpdir.mkdir('moved')
+
+    def load(_id: str) -> Tuple[str, Playlist]:
+        loads.append(_id)
+        return 'FakePlugin', make_file_playlist(str(moved))
+    monkeypatch.setattr(daemon_module, 'load_playlist', load)
+
+    entries = client.call('continue.list')
+    assert [(e['title'], e['status']) for e in entries] == [('ep1', 'next')]
+
+    # cached playlist is enough to play and advance
+    assert client.call('continue')['title'] == 'ep1'
+    assert backend.calls[-1] == ('play', str(tmpdir / 'ep1.mp4'), 0)
+    backend.time_callback(30.)
+    backend.event_callback(PlayerEvent.VIDEO_OVER)
+    assert backend.calls[-1] == ('play', str(tmpdir / 'ep2.mp4'), 0)
+    assert loads == []
+
+    # files are gone, ask plugin where they are
+    server.daemon.playlists.clear()
+    os.remove(tmpdir / 'ep1.mp4')
+    assert client.call('continue')['title'] == 'ep1'
+    assert backend.calls[-1] == ('play', str(moved / 'ep1.mp4'), 30)
+    assert loads == ['/videos']
+
+    with pytest.raises(DaemonError, match='No entry #5'):
+        client.call('continue', entry=4)
+
+
+def test_errors(client: DaemonClient) -> None:
+    with pytest.raises(DaemonError, match='not found'):
+        client.call('foo')
+    with pytest.raises(DaemonError, match='Unknown playlist'):
+        client.call('play', playlist='nope')
+    with pytest.raises(DaemonError, match='No video playing'):
+        client.call('next')
+    with pytest.raises(DaemonError, match='unexpected keyword'):
+        client.call('progress', foo=1)
+
+    # connection survives errors
+    client.sock.sendall(b'not json\n')
+    assert b'Parse error' in client.rfile.readline()
+    assert client.call('list') == ['shows']
+
+
+def test_command_latency(client: DaemonClient) -> None:
+    client.call('list', playlist='shows')
+
+    start = time.perf_counter()
+    for _ in range(100):
+        client.call('progress')
+    assert (time.perf_counter() - start) / 100 < .01
+
+
+def test_thin_client(server: DaemonServer, backend: RecordingPlayer) -> None:
+    events = queue.Queue()  # type: queue.Queue[Any]
+
+    player = DaemonPlayer(server.path)
+    player.set_controller(SimpleNamespace(player=SimpleNamespace(
+        current_vid=SimpleNamespace(duration=100))))
+    player.setup(events.put, events.put)
+
+    # subscription is set up asynchronously
+    for _ in range(100):
+        if len(server.daemon._subscribers) > 0:
+            break
+        time.sleep(.01)
+
+    player.play_video('/videos/other.mp4', 'other', start=5)
+    assert backend.calls[-1] == ('play', '/videos/other.mp4', 5)
+    assert server.daemon.external
+    assert server.daemon.current_vid.duration == 100
+
+    backend.time_callback(7.)
+    assert events.get(timeout=1) == 7.
+
+    # the thin client decides what to play next itself
+    backend.event_callback(PlayerEvent.VIDEO_OVER)
+    assert events.get(timeout=1) == PlayerEvent.VIDEO_OVER
+    assert backend.calls[-1] == ('play', '/videos/other.mp4', 5)
+
+    player.toggle_pause()
+    assert backend.calls[-1] == ('pause',)
+    player.shutdown()
+    assert ('shutdown',) not in backend.calls
+
+
+def test_notification_payload(server: DaemonServer) -> None:
+    received = queue.Queue()  # type: queue.Queue[Tuple[str, Dict]]
+
+    listener = DaemonClient(server.path)
+    threading.Thread(
+        target=listener.listen,
+        args=(lambda m, p: received.put((m, p)),), daemon=True).start()
+    for _ in range(100):
+        if len(server.daemon._subscribers) > 0:
+            break
+        time.sleep(.01)
+
+    client = DaemonClient(server.path)
+    client.call('play', playlist='shows')
+    client.close()
+
+    method, params = received.get(timeout=1)
+    assert method == 'playing'
+    assert params['title'] == 'ep0'
+    listener.close()
@@ -0,0 +1,114 @@
+import os
+import time
+import json
+import importlib
+
+from typing import List
+
+import click
+import pytest
+
+from ..extra import discovery
+from ..extra.discovery import Device, DeviceCache
+
+# `vydia.main` is shadowed by the click group in the package namespace
+main_module = importlib.import_module('vydia.main')
+
+
+AIRPLAY_DEV = Device('airplay', 'Living Room', '10.0.0.2:7000', 'AppleTV3,2')
+DLNA_DEV = Device('dlna', 'Kitchen TV', 'http://10.0.0.3/desc.xml', 'ACME')
+
+
+@pytest.fixture
+def scans(monkeypatch: pytest.MonkeyPatch) -> List[str]:
+    calls = []  # type: List[str]
+
+    def fake_airplay(timeout: float) -> List[Device]:
+        calls.append('airplay')
+        time.sleep(.2)
+        return [AIRPLAY_DEV]
+
+    def fake_dlna(timeout: float) -> List[Device]:
+        calls.append('dlna')
+        time.sleep(.2)
+        return [DLNA_DEV]
+
+    def broken(timeout: float) -> List[Device]:
+        raise OSError('no network')
+
+    monkeypatch.setattr(discovery, 'SCANNERS', {
+        'airplay': fake_airplay, 'dlna': fake_dlna, 'broken': broken})
+    return calls
+
+
+@pytest.fixture
+def cache(tmpdir: str) -> DeviceCache:
+    return DeviceCache(os.path.join(tmpdir, 'devices.json'), ttl=60)
+
+
+def test_concurrent_discovery(scans: List[str]) -> None:
+    start = time.perf_counter()
+    devices = discovery.discover(timeout=1)
+
+    assert time.perf_counter() - start < .35
+    assert devices == [AIRPLAY_DEV, DLNA_DEV]
+
+
+def test_cache(scans: List[str], cache: DeviceCache) -> None:
+    assert cache.load() is None
+
+    assert cache.get_devices() == [AIRPLAY_DEV, DLNA_DEV]
+    assert cache.get_devices() == [AIRPLAY_DEV, DLNA_DEV]
+    assert len(scans) == 2
+
+    cache.get_devices(refresh=True)
+    assert len(scans) == 4
+
+    # expired entries trigger a new scan
+    with open(cache.fname) as fd:
+        data = json.load(fd)
+    data['timestamp'] -= 120
+    with open(cache.fname, 'w') as fd:
+        json.dump(data, fd)
+
+    assert cache.load() is None
+    cache.get_devices()
+    assert len(scans) == 6
+
+
+def test_empty_scan_is_not_cached(
+    scans: List[str], cache: DeviceCache, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(discovery, 'SCANNERS', {
+        'broken': discovery.SCANNERS['broken']})
+    assert cache.get_devices() == []
+    assert cache.load() is None
+
+    # left behind by older versions
+    cache.save([])
+    monkeypatch.setattr(discovery, 'SCANNERS', {
+        'airplay': lambda timeout: [AIRPLAY_DEV]})
+    assert cache.get_devices() == [AIRPLAY_DEV]
+    assert cache.load() == [AIRPLAY_DEV]
+
+
+def test_resolve(scans: List[str], cache: DeviceCache) -> None:
+    assert cache.resolve('dlna::http://foo') == 'dlna::http://foo'
+    assert len(scans) == 0
+
+    assert cache.resolve('1') == 'airplay::10.0.0.2:7000'
+    assert cache.resolve('#2') == 'dlna::http://10.0.0.3/desc.xml'
+    assert cache.resolve('kitchen tv') == 'dlna::http://10.0.0.3/desc.xml'
+    assert len(scans) == 2
+
+    with pytest.raises(ValueError):
+        cache.resolve('Bedroom')
+
+
+def test_unknown_remote(
+    scans: List[str], cache: DeviceCache, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(main_module, 'get_device_cache', lambda: cache)
+
+    with pytest.raises(click.ClickException, match='Bedroom'):
+        main_module.get_player('Bedroom')
@@ -0,0 +1,173 @@
+import time
+import queue
+import http.server
+import xml.etree.ElementTree as ET
+
+from types import SimpleNamespace
+from typing import Any, Callable, Dict
+
+import pytest
+
+from ..extra.player import DLNAPlayer, PlayerEvent
+from ..extra.dlna_client import parse_duration
+from ..extra.utils import sec2ts
+from .conftest import FakeHTTPServer
+
+
+DESCRIPTION = '''<?xml version="1.0"?>
+<root xmlns="urn:schemas-upnp-org:device-1-0">
+  <device>
+    <deviceType>urn:schemas-upnp-org:device:MediaRenderer:1</deviceType>
+    <friendlyName>Fake Renderer</friendlyName>
+    <serviceList>
+      <service>
+        <serviceType>urn:schemas-upnp-org:service:AVTransport:1</serviceType>
+        <controlURL>/AVTransport/control</controlURL>
+      </service>
+    </serviceList>
+  </device>
+</root>'''
+
+RESPONSE = '''<?xml version="1.0"?>
+<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">
+  <s:Body>
+    <u:{action}Response xmlns:u="urn:schemas-upnp-org:service:AVTransport:1">
+      {args}
+    </u:{action}Response>
+  </s:Body>
+</s:Envelope>'''
+
+
+class FakeRendererHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def _reply(self, body: str) -> None:
+        data = body.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        self.server.connections -= 1
+        self.close_connection = True
+        self._reply(DESCRIPTION)
+
+    def do_POST(self) -> None:
+        srv = self.server
+        action = self.headers['SOAPACTION'].strip('"').split('#')[1]
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        params = {
+            node.tag: node.text for node in ET.fromstring(body).iter()}
+        srv.actions.append(action)
+
+        args = ''
+        if action == 'SetAVTransportURI':
+            srv.uri = params['CurrentURI']
+            srv.state = 'STOPPED'
+            srv.position = 0
+        elif action == 'Play':
+            srv.state = 'PLAYING'
+        elif action == 'Pause':
+            srv.state = 'PAUSED_PLAYBACK'
+        elif action == 'Stop':
+            srv.state = 'STOPPED'
+        elif action == 'Seek':
+            srv.position = parse_duration(params['Target'])
+        elif action == 'GetTransportInfo':
+            args = f'<CurrentTransportState>{srv.state}</CurrentTransportState>'
+        elif action == 'GetPositionInfo':
+            if srv.state == 'PLAYING':
+                srv.position = min(srv.position + 1, srv.duration)
+            args = (
+                f'<TrackDuration>{sec2ts(srv.duration)}</TrackDuration>'
+                f'<RelTime>{sec2ts(srv.position)}</RelTime>')
+
+        self._reply(RESPONSE.format(action=action, args=args))
+
+
+@pytest.fixture
+def server(http_server: Callable[..., FakeHTTPServer]) -> FakeHTTPServer:
+    return http_server(
+        FakeRendererHandler, connections=0, actions=[],
+        state='NO_MEDIA_PRESENT', uri=None, position=0, duration=100)
+
+
+@pytest.fixture
+def player(
+    server: FakeHTTPServer, start_player: Callable[..., DLNAPlayer]
+) -> DLNAPlayer:
+    host, port = server.server_address
+    return start_player(
+        DLNAPlayer(f'http://{host}:{port}/description.xml'),
+        current_vid=SimpleNamespace(duration=100))
+
+
+def test_parse_duration() -> None:
+    assert parse_duration('0:01:02') == 62
+    assert parse_duration('01:00:00.500') == 3600
+    assert parse_duration('NOT_IMPLEMENTED') == 0
+
+
+def test_resume_and_progress(
+    server: FakeHTTPServer, player: DLNAPlayer,
+    recorder: Dict[str, queue.Queue]
+) -> None:
+    # idle until something is played
+    time.sleep(.1)
+    assert server.actions == []
+
+    player.play_video('http://example.com/video.mp4', start=42)
+    assert server.uri == 'http://example.com/video.mp4'
+    assert recorder['pos'].get(timeout=2) == 43
+    assert server.actions[:4] == [
+        'SetAVTransportURI', 'Play', 'GetTransportInfo', 'Seek']
+
+    player.toggle_pause()
+    assert server.state == 'PAUSED_PLAYBACK'
+    player.toggle_pause()
+    assert server.state == 'PLAYING'
+
+    # all actions share a single connection
+    assert server.connections == 1
+
+
+def test_end_of_video(
+    server: FakeHTTPServer, player: DLNAPlayer,
+    recorder: Dict[str, queue.Queue]
+) -> None:
+    player.play_video('http://example.com/video.mp4', start=50)
+    recorder['pos'].get(timeout=2)
+
+    server.state = 'STOPPED'
+    assert recorder['events'].get(timeout=2) is PlayerEvent.VIDEO_QUIT
+
+    player.play_video('http://example.com/video.mp4', start=97)
+    while recorder['pos'].get(timeout=2) < 100:
+        pass
+    server.state = 'STOPPED'
+    assert recorder['events'].get(timeout=2) is PlayerEvent.VIDEO_OVER
+
+    # polling stops between videos
+    time.sleep(.05)
+    count = len(server.actions)
+    time.sleep(.1)
+    assert len(server.actions) == count
+
+
+def test_setup_again(
+    player: DLNAPlayer, recorder: Dict[str, queue.Queue]
+) -> None:
+    poller = player.poller
+    player.setup(recorder['pos'].put, recorder['events'].put)
+
+    assert not poller.running
+    assert player.poller is not poller and player.poller.running
@@ -0,0 +1,98 @@
+import os
+import http.client
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from typing import Dict, Tuple
+
+import pytest
+
+from ..extra.fileserver import get_file_server, parse_range
+
+
+@pytest.fixture
+def video(tmpdir: str) -> Tuple[str, bytes]:
+    content = os.urandom(3 * 1024 * 1024 + 17)
+    path = os.path.join(tmpdir, 'my video.mp4')
+    with open(path, 'wb') as fd:
+        fd.write(content)
+    return path, content
+
+
+def request(
+    url: str, method: str = 'GET', headers: Dict[str, str] = {},
+    conn: http.client.HTTPConnection = None
+) -> http.client.HTTPResponse:
+    parts = urllib.parse.urlparse(url)
+    conn = conn or http.client.HTTPConnection(parts.hostname, parts.port)
+    conn.request(method, parts.path, headers=headers)
+    return conn.getresponse()
+
+
+def test_parse_range() -> None:
+    assert parse_range('', 100) is None
+    assert parse_range('bytes=0-', 100) == (0, 99)
+    assert parse_range('bytes=10-19', 100) == (10, 19)
+    assert parse_range('bytes=90-200', 100) == (90, 99)
+    assert parse_range('bytes=-10', 100) == (90, 99)
+    assert parse_range('bytes=0-1,5-6', 100) is None
+
+    with pytest.raises(ValueError):
+        parse_range('bytes=100-', 100)
+
+
+def test_full_and_ranged_requests(video: Tuple[str, bytes]) -> None:
+    path, content = video
+    url = get_file_server('127.0.0.1').add_file(path)
+    assert url.endswith('/my%20video.mp4')
+
+    resp = request(url)
+    assert resp.status == 200
+    assert resp.getheader('Content-Type') == 'video/mp4'
+    assert resp.getheader('Accept-Ranges') == 'bytes'
+    assert resp.read() == content
+
+    resp = request(url, headers={'Range': 'bytes=1000-1999'})
+    assert resp.status == 206
+    assert resp.getheader('Content-Range') == f'bytes 1000-1999/{len(content)}'
+    assert resp.read() == content[1000:2000]
+
+    resp = request(url, headers={'Range': f'bytes={len(content)}-'})
+    assert resp.status == 416
+    resp.read()
+
+    resp = request(url, method='HEAD')
+    assert resp.status == 200
+    assert int(resp.getheader('Content-Length')) == len(content)
+    assert resp.read() == b''
+
+    assert request(url.rsplit('/', 2)[0] + '/unknown/x').status == 404
+
+
+def test_keep_alive(video: Tuple[str, bytes]) -> None:
+    path, content = video
+    url = get_file_server('127.0.0.1').add_file(path)
+
+    parts = urllib.parse.urlparse(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port)
+    for start in (0, 5000, len(content) - 10):
+        resp = request(
+            url, headers={'Range': f'bytes={start}-'}, conn=conn)
+        assert resp.read() == content[start:]
+    assert conn.sock is not None
+
+
+def test_concurrent_clients_share_server(video: Tuple[str, bytes]) -> None:
+    path, content = video
+    server = get_file_server('127.0.0.1')
+    assert get_file_server('127.0.0.1') is server
+
+    url = server.add_file(path)
+    offsets = [i * 100_000 for i in range(16)]
+
+    def fetch(start: int) -> bytes:
+        return request(url, headers={'Range': f'bytes={start}-'}).read()
+
+    with ThreadPoolExecutor(8) as pool:
+        for start, data in zip(offsets, pool.map(fetch, offsets)):
+            assert data == content[start:]
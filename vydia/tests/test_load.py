@@ -0,0 +1,36 @@
+from ..benchmarks.load import run_binge
+from ..extra.player import SimulatedPlayer
+
+
+def test_binge(tmpdir: str) -> None:
+    report = run_binge(str(tmpdir), n_episodes=50, timeout=60)
+
+    assert report['episodes'] == 50
+    assert report['last_saved']['title'].startswith('00049 ')
+
+    # one state write per episode change
+    assert report['state_writes_per_episode'] <= 1
+    assert report['redraws_per_episode'] < 5
+    assert 'memory_growth' in report
+
+
+def test_binge_without_preload(tmpdir: str) -> None:
+    report = run_binge(
+        str(tmpdir), n_episodes=20, preload=False, trace_memory=False,
+        timeout=60)
+
+    assert report['episodes'] == 20
+    assert 'memory_growth' not in report
+
+
+def test_setup_again() -> None:
+    player = SimulatedPlayer()
+    player.setup(print, print)
+    thread = player._thread
+
+    player.setup(print, print)
+    assert player._thread is thread
+
+    player.shutdown()
+    thread.join(1)
+    assert not thread.is_alive()
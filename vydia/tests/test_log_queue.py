@@ -0,0 +1,110 @@
+import json
+import time
+import logging
+import threading
+
+from ..extra.log_queue import QueueLogging, iter_handlers
+
+
+class SlowHandler(logging.Handler):
+    def __init__(self, delay: float = 0, gate: threading.Event = None):
+        super().__init__()
+        self.delay = delay
+        self.gate = gate
+        self.messages = []  # type: list
+        self.threads = set()  # type: set
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self.gate is not None:
+            self.gate.wait(5)
+        time.sleep(self.delay)
+        self.threads.add(threading.get_ident())
+        self.messages.append(record.getMessage())
+
+
+def make_logger(name: str, *handlers: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger(f'vydia-test-{name}')
+    logger.handlers = list(handlers)
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    return logger
+
+
+def test_writes_in_background() -> None:
+    handler = SlowHandler(delay=.01)
+    logger = make_logger('background', handler)
+
+    with QueueLogging(logger) as ql:
+        assert list(iter_handlers(logger)) == [handler]
+
+        start = time.perf_counter()
+        for i in range(50):
+            logger.info(f'record {i}')
+        assert time.perf_counter() - start < .25
+
+    assert handler.messages == [f'record {i}' for i in range(50)]
+    assert threading.get_ident() not in handler.threads
+    assert ql.handler.dropped == 0
+    assert logger.handlers == [handler]
+
+
+def test_drops_when_full() -> None:
+    gate = threading.Event()
+    handler = SlowHandler(gate=gate)
+    logger = make_logger('full', handler)
+
+    with QueueLogging(logger, maxsize=10) as ql:
+        for i in range(50):
+            logger.warning(f'record {i}')
+        dropped = ql.handler.dropped
+        gate.set()
+
+    # one record may be stuck in handler, the others are queued
+    assert 39 <= dropped <= 40
+    warning = f'Dropped {dropped} log records ({dropped} in total), ' \
+        'logging is too slow'
+    # drops are reported as soon as listener gets to it
+    assert warning in handler.messages[:2]
+    handler.messages.remove(warning)
+    assert len(handler.messages) == 50 - dropped
+    assert handler.messages[0] == 'record 0'
+
+
+def test_json_lines(tmpdir: str) -> None:
+    fname = str(tmpdir / 'log.jsonl')
+    handler = logging.FileHandler(fname)
+    formatter = handler.formatter
+    logger = make_logger('json', handler)
+
+    with QueueLogging(logger, json_lines=True):
+        logger.info('Loaded', extra={'duration': .5})
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            logger.exception('Failed')
+    handler.close()
+
+    with open(fname) as fd:
+        first, second = [json.loads(line) for line in fd]
+    assert first['message'] == 'Loaded'
+    assert first['duration'] == .5
+    assert first['level'] == 'INFO'
+    assert first['queue_delay'] >= 0
+    assert 'ValueError: boom' in second['exception']
+    assert handler.formatter is formatter
+
+
+def test_reinstall() -> None:
+    handler = SlowHandler()
+    logger = make_logger('reinstall', handler)
+
+    first = QueueLogging(logger)
+    first.start()
+    logger.info('first')
+
+    with QueueLogging(logger):
+        assert list(iter_handlers(logger)) == [handler]
+        logger.info('second')
+
+    assert handler.messages == ['first', 'second']
+    assert logger.handlers == [handler]
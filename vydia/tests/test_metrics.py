@@ -0,0 +1,76 @@
+import urllib.request
+
+from pathlib import Path
+
+import pytest
+
+from click.testing import CliRunner
+
+from ..main import main
+from ..extra import metrics
+from ..extra.metrics_server import MetricsServer
+from ..benchmarks.load import run_binge
+
+
+@pytest.fixture
+def enabled_metrics():
+    metrics.reset()
+    metrics.enable()
+    yield
+    metrics.disable()
+    metrics.reset()
+
+
+def test_disabled_is_noop() -> None:
+    metrics.reset()
+    metrics.inc('redraws')
+    with metrics.timer('state_save_seconds'):
+        pass
+
+    snap = metrics.snapshot()
+    assert snap['counters'] == [] and snap['histograms'] == []
+
+
+def test_counters_and_histograms(enabled_metrics: None) -> None:
+    metrics.inc('redraws')
+    metrics.inc('redraws', 2)
+    for value in (.0005, .02, .02, 100):
+        metrics.observe('playback_start_seconds', value, backend='Local')
+
+    snap = metrics.snapshot()
+    assert snap['counters'] == [
+        {'name': 'redraws', 'labels': {}, 'value': 3}]
+
+    hist, = snap['histograms']
+    assert hist['labels'] == {'backend': 'Local'}
+    assert hist['count'] == 4 and hist['buckets'][-1] == 1
+    assert metrics.quantile(hist, .5, snap['buckets']) == .025
+    assert metrics.quantile(hist, 1, snap['buckets']) == float('inf')
+
+    text = metrics.to_prometheus(snap)
+    assert 'vydia_redraws_total 3' in text
+    assert 'vydia_playback_start_seconds_bucket{backend="Local",le="+Inf"} 4' \
+        in text
+    assert 'vydia_playback_start_seconds_count{backend="Local"} 4' in text
+
+
+def test_server(enabled_metrics: None) -> None:
+    metrics.inc('redraws')
+    with MetricsServer(0) as server:
+        url = f'http://127.0.0.1:{server.server_address[1]}/metrics'
+        with urllib.request.urlopen(url) as resp:
+            assert b'vydia_redraws_total 1' in resp.read()
+
+
+def test_binge_instrumentation(tmpdir: str, enabled_metrics: None) -> None:
+    run_binge(str(tmpdir), n_episodes=10, trace_memory=False, timeout=60)
+
+    snap = metrics.snapshot()
+    names = {entry['name']: entry for entry in snap['histograms']}
+    assert names['state_save_seconds']['count'] >= 10
+    assert names['playback_start_seconds']['labels'] == {
+        'backend': 'SimulatedPlayer'}
+    assert 'stream_resolve_seconds' in names
+
+    metrics.write(Path(tmpdir))
+    assert metrics.load(Path(tmpdir))['counters'] == snap['counters']
@@ -3,6 +3,7 @@ import os
 import pytest
 
 from ..core.model import Model
+from ..extra.plugins import Playlist, Video, VideoData
 
 
 @pytest.fixture
@@ -31,3 +32,234 @@ def test_state_update(model: Model) -> None:
     model.update_state('pl01', {'id': 'qux', 'foo': {'bar': 42, 'baz': 13}})
     assert model._load_state() == {
         'pl01': {'id': 'qux', 'foo': {'bar': 42, 'baz': 13}}, 'pl02': {'id': 'ABC'}}
+
+
+def test_save_progress(model: Model) -> None:
+    model.update_state('pl01', {'id': '123', 'episodes': {}})
+
+    model.save_progress('pl01', 'id01', 'ep01', 62)
+    model.save_progress('pl01', 'id02', 'ep02', 3)
+    assert model.get_current_video('pl01') == {
+        'id': 'id02', 'title': 'ep02', 'timestamp': '00:00:03'}
+    assert model.get_playlist_info('pl01')['episodes'] == {
+        'id01': {'title': 'ep01', 'current_timestamp': '00:01:02'},
+        'id02': {'title': 'ep02', 'current_timestamp': '00:00:03'}}
+
+
+def test_mark_watched(model: Model) -> None:
+    model.update_state('pl01', {'id': '123', 'episodes': {}})
+    model.save_progress('pl01', 'id02', 'ep02', 30)
+
+    saves = []
+    save_state = model._save_state
+    model._save_state = lambda *args: (saves.append(1), save_state(*args))
+
+    videos = [(f'id{i:02}', f'ep{i:02}', 60) for i in range(1, 5)]
+    state = model.mark_watched('pl01', videos[:3])
+    assert len(saves) == 1
+    assert state == model._load_state()['pl01']
+    assert {k: v['current_timestamp'] for k, v in state['episodes'].items()} \
+        == {'id01': '00:01:00', 'id02': '00:01:00', 'id03': '00:01:00'}
+
+    # toggle each one
+    state = model.mark_watched('pl01', videos[2:], watched=None)
+    assert state['episodes']['id03']['current_timestamp'] == '00:00:00'
+    assert state['episodes']['id04'] == {
+        'title': 'ep04', 'current_timestamp': '00:01:00'}
+
+    state = model.mark_watched('pl01', videos, watched=False)
+    assert all(
+        ep['current_timestamp'] == '00:00:00'
+        for ep in state['episodes'].values())
+    assert len(saves) == 3
+
+
+def test_checkpoint_journal(model: Model) -> None:
+    model.update_state('pl01', {'id': '123', 'episodes': {}})
+    model.save_progress('pl01', 'id01', 'ep01', 62)
+    state_size = os.path.getsize(model.STATE_FILE)
+
+    model.checkpoint_progress('pl01', 'id01', 'ep01', 70)
+    model.checkpoint_progress('pl01', 'id02', 'ep02', 5)
+    model.checkpoint_progress('deleted', 'id01', 'ep01', 5)
+
+    # state file is untouched, journal holds single entries
+    assert os.path.getsize(model.STATE_FILE) == state_size
+    with open(model.JOURNAL_FILE, 'a') as fd:
+        fd.write('{"playlist": "pl01", "ti')
+
+    assert model.get_current_video('pl01') == {
+        'id': 'id02', 'title': 'ep02', 'timestamp': '00:00:05'}
+    assert model.get_playlist_info('pl01')['episodes'] == {
+        'id01': {'title': 'ep01', 'current_timestamp': '00:01:10'},
+        'id02': {'title': 'ep02', 'current_timestamp': '00:00:05'}}
+    assert 'deleted' not in model.get_playlist_list()
+
+    # full save compacts journal
+    model.save_progress('pl01', 'id03', 'ep03', 1)
+    assert not os.path.exists(model.JOURNAL_FILE)
+    assert model.get_playlist_info('pl01')['episodes']['id01'] == {
+        'title': 'ep01', 'current_timestamp': '00:01:10'}
+
+
+def test_journal_of_other_process(model: Model) -> None:
+    other = Model(state_fname=model.STATE_FILE, log_fname=model.LOG_FILE)
+    model.update_state('pl01', {'id': '123', 'episodes': {}})
+    model.checkpoint_progress('pl01', 'id01', 'ep01', 10)
+
+    # other process checkpoints between load and full save
+    state = model._load_state()
+    other.checkpoint_progress('pl01', 'id02', 'ep02', 20)
+    state['pl01']['id'] = '456'
+    model._save_state(state)
+
+    with open(model.JOURNAL_FILE) as fd:
+        assert len(fd.readlines()) == 1
+    assert other.get_playlist_info('pl01')['id'] == '456'
+    assert other.get_playlist_info('pl01')['episodes'] == {
+        'id01': {'title': 'ep01', 'current_timestamp': '00:00:10'},
+        'id02': {'title': 'ep02', 'current_timestamp': '00:00:20'}}
+
+
+def test_checkpoint_journal_is_bounded(model: Model) -> None:
+    model.JOURNAL_MAX_ENTRIES = 10
+    model.update_state('pl01', {'id': '123', 'episodes': {}})
+
+    for ts in range(25):
+        model.checkpoint_progress('pl01', 'id01', 'ep01', ts)
+    with open(model.JOURNAL_FILE) as fd:
+        assert len(fd.readlines()) == 5
+    assert model.get_current_video('pl01')['timestamp'] == '00:00:24'
+
+
+def test_migrate_title_keys(model: Model) -> None:
+    pl = Playlist()
+    for i in range(3):
+        pl.append(Video(VideoData(
+            title=f'ep{i}', duration=60, get_file_stream=lambda: '',
+            get_info=lambda: '', id=f'id{i}')))
+
+    # as written by older versions
+    model.update_state('pl01', {
+        'id': '123',
+        'episodes': {
+            'ep0': {'current_timestamp': '00:01:00'},
+            'ep1': {'current_timestamp': '00:00:10'},
+            'gone': {'current_timestamp': '00:00:01'}},
+        'current': {'title': 'ep1', 'timestamp': '00:00:10'}})
+
+    assert model.migrate_episodes('pl01', pl) == 3
+    assert model.get_playlist_info('pl01')['episodes'] == {
+        'id0': {'title': 'ep0', 'current_timestamp': '00:01:00'},
+        'id1': {'title': 'ep1', 'current_timestamp': '00:00:10'},
+        'gone': {'current_timestamp': '00:00:01'}}
+    assert pl.find_video(model.get_current_video('pl01')) == (1, pl[1])
+
+    assert model.migrate_episodes('pl01', pl) == 0
+
+
+def test_state_gc(model: Model, monkeypatch) -> None:  # type: ignore
+    from ..core import model as model_module
+    from ..benchmarks.data import make_pafy_items
+
+    pl = Playlist()
+    pl._id = '123'
+    pl.extend(Video.from_pafy(item) for item in make_pafy_items(3))
+    model.update_state('pl01', {'id': '123', 'episodes': {}})
+    model.update_state('pl02', {'id': '456', 'episodes': {}})
+    for vid_id in ['yt:00000000000', 'yt:00000000005', 'yt:00000000006']:
+        model.save_progress('pl01', vid_id, vid_id, 10)
+        model.save_progress('pl02', vid_id, vid_id, 10)
+    model.save_progress('pl01', 'yt:00000000001', 'current', 5)
+
+    model.cache_playlist('pl01', pl)
+    model.cache_playlist('deleted', pl)
+    assert [vid.id for vid in model.get_cached_playlist('pl01')] == \
+        [vid.id for vid in pl]
+    assert model.get_cached_playlist('pl02') is None
+
+    monkeypatch.setattr(model_module.time, 'time', lambda: 1000)
+    stats = model.collect_garbage(retention=100)
+    assert stats['playlists'] == 1
+    assert (stats['orphaned'], stats['removed']) == (2, 0)
+    assert stats['caches_removed'] == 1
+    assert stats['bytes_after'] == os.path.getsize(model.STATE_FILE)
+    assert stats['bytes_after'] < stats['bytes_before']
+
+    # vanished videos are only marked at first
+    episodes = model.get_playlist_info('pl01')['episodes']
+    assert episodes['yt:00000000005']['orphaned_since'] == 1000
+    assert 'orphaned_since' not in episodes['yt:00000000000']
+    assert 'orphaned_since' not in episodes['yt:00000000001']
+    # playlists which were never loaded are left alone
+    assert len(model.get_playlist_info('pl02')['episodes']) == 3
+
+    # video reappeared
+    pl.extend(Video.from_pafy(item) for item in make_pafy_items(6)[5:])
+    model.cache_playlist('pl01', pl)
+    monkeypatch.setattr(model_module.time, 'time', lambda: 1100)
+    stats = model.collect_garbage(retention=100, dry_run=True)
+    assert (stats['restored'], stats['removed']) == (1, 1)
+    assert 'yt:00000000006' in model.get_playlist_info('pl01')['episodes']
+
+    model.collect_garbage(retention=100)
+    episodes = model.get_playlist_info('pl01')['episodes']
+    assert sorted(episodes) == [
+        'yt:00000000000', 'yt:00000000001', 'yt:00000000005']
+    assert 'orphaned_since' not in episodes['yt:00000000005']
+
+    model.delete_playlist_by_name('pl01')
+    assert model.get_cached_playlist('pl01') is None
+
+
+def test_continue_watching(model: Model, monkeypatch) -> None:  # type: ignore
+    from ..core import model as model_module
+    from ..benchmarks.data import make_pafy_items
+
+    items = make_pafy_items(3)
+    for item in items:
+        item.length = 100
+    playlists = {}
+    for pid in ['pl01', 'pl02', 'pl03']:
+        pl = playlists[pid] = Playlist()
+        pl._id = pid
+        pl.extend(Video.from_pafy(item) for item in items)
+        model.update_state(pid, {'id': pid, 'episodes': {}})
+        model.cache_playlist(pid, pl)
+    assert model.get_continue_watching() == []
+
+    clock = iter(range(1000, 2000))
+    monkeypatch.setattr(model_module.time, 'time', lambda: next(clock))
+    model.save_progress('pl01', pl[0].id, pl[0].title, 30)
+    model.save_progress('pl02', pl[1].id, pl[1].title, 100)
+    model.checkpoint_progress('pl01', pl[0].id, pl[0].title, 40)
+
+    entries = model.get_continue_watching()
+    assert [(e['playlist'], e['title'], e['timestamp'], e['status'])
+            for e in entries] == [
+        ('pl01', pl[0].title, '00:00:40', 'in-progress'),
+        ('pl02', pl[2].title, '00:00:00', 'next')]
+
+    # playlist is not looked at while watching the same video
+    def fail(pid: str) -> None:
+        raise AssertionError(f'Loaded "{pid}"')
+    monkeypatch.setattr(model, 'get_cached_playlist', fail)
+    model.checkpoint_progress('pl02', pl[2].id, pl[2].title, 5)
+    assert [(e['playlist'], e['timestamp'], e['status'])
+            for e in model.get_continue_watching()] == [
+        ('pl02', '00:00:05', 'in-progress'),
+        ('pl01', '00:00:40', 'in-progress')]
+    model.save_progress('pl02', pl[2].id, pl[2].title, 10)
+    assert model.get_continue_watching()[0]['timestamp'] == '00:00:10'
+    monkeypatch.undo()
+
+    # finished playlists drop out, index is read by other processes
+    model.mark_watched('pl02', [(pl[2].id, pl[2].title, 100)])
+    model.delete_playlist_by_name('pl01')
+    assert model.get_continue_watching() == []
+    assert Model(state_fname=model.STATE_FILE).get_continue_watching() == []
+
+    model.save_progress('pl03', pl[0].id, pl[0].title, 50)
+    other = Model(state_fname=model.STATE_FILE)
+    assert [e['playlist'] for e in other.get_continue_watching()] == ['pl03']
+    assert not os.path.exists(model.JOURNAL_FILE)
@@ -0,0 +1,188 @@
+import os
+import json
+import queue
+import socket
+import threading
+
+from typing import Any, Callable, Dict, List
+
+import pytest
+
+from ..extra.mpv_ipc import MPVIPCClient, MPVIPCError
+from ..extra.player import IPCPlayer, PlayerEvent
+
+
+class FakeMPVServer:
+    """ Scripted stand-in for mpv's IPC socket
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.commands = queue.Queue()  # type: queue.Queue
+        self.replies = {
+            'get_property': {'mpv-version': 'mpv 0.35.1'}
+        }  # type: Dict[str, Any]
+
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(1)
+        self.conn = None  # type: Any
+
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self) -> None:
+        self.conn, _ = self.server.accept()
+        with self.conn.makefile('rb') as fd:
+            for line in fd:
+                msg = json.loads(line)
+                self.commands.put(msg['command'])
+
+                name, *args = msg['command']
+                data = self.replies.get(name)
+                if isinstance(data, dict):
+                    data = data.get(args[0])
+                self.send({
+                    'request_id': msg['request_id'],
+                    'error': 'success', 'data': data})
+
+    def send(self, msg: Dict[str, Any]) -> None:
+        self.conn.sendall((json.dumps(msg) + '\n').encode())
+
+    def next_command(self, name: str) -> List[Any]:
+        while True:
+            cmd = self.commands.get(timeout=2)
+            if cmd[0] == name:
+                return cmd
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+        self.server.close()
+
+
+@pytest.fixture
+def server(tmpdir: str) -> FakeMPVServer:
+    srv = FakeMPVServer(os.path.join(tmpdir, 'mpv.sock'))
+    yield srv
+    srv.close()
+
+
+@pytest.fixture
+def player(
+    server: FakeMPVServer, start_player: Callable[..., IPCPlayer]
+) -> IPCPlayer:
+    return start_player(IPCPlayer(socket_path=server.path))
+
+
+def test_property_observation(
+    server: FakeMPVServer, player: IPCPlayer,
+    recorder: Dict[str, queue.Queue]
+) -> None:
+    _, obs_id, prop = server.next_command('observe_property')
+    assert prop == 'time-pos'
+
+    server.send({
+        'event': 'property-change', 'id': obs_id,
+        'name': 'time-pos', 'data': 42.5})
+    assert recorder['pos'].get(timeout=2) == 42.5
+
+
+def test_end_file_reasons(
+    server: FakeMPVServer, player: IPCPlayer,
+    recorder: Dict[str, queue.Queue]
+) -> None:
+    player.play_video('/tmp/foo.mkv', 'Foo', start=10)
+    assert server.next_command('loadfile') == [
+        'loadfile', '/tmp/foo.mkv', 'replace', 'start=10']
+
+    # file started by `play_video` is not reported as advance
+    server.send({'event': 'start-file', 'playlist_entry_id': 1})
+    server.send({'event': 'end-file', 'reason': 'eof'})
+    assert recorder['events'].get(timeout=2) is PlayerEvent.VIDEO_OVER
+
+    server.send({'event': 'start-file', 'playlist_entry_id': 2})
+    assert recorder['events'].get(timeout=2) is PlayerEvent.VIDEO_NEXT
+
+    server.send({'event': 'end-file', 'reason': 'stop'})
+    assert recorder['events'].get(timeout=2) is PlayerEvent.VIDEO_QUIT
+
+    server.send({'event': 'end-file', 'reason': 'quit'})
+    server.send({'event': 'end-file', 'reason': 'eof'})
+    assert recorder['events'].get(timeout=2) is PlayerEvent.VIDEO_OVER
+
+
+def test_setup_reuses_mpv(
+    server: FakeMPVServer, player: IPCPlayer,
+    recorder: Dict[str, queue.Queue]
+) -> None:
+    client = player.client
+    events = queue.Queue()  # type: queue.Queue
+    player.setup(recorder['pos'].put, events.put)
+    assert player.client is client
+
+    server.send({'event': 'end-file', 'reason': 'stop'})
+    assert events.get(timeout=2) is PlayerEvent.VIDEO_QUIT
+    assert recorder['events'].empty()
+
+
+def test_commands(server: FakeMPVServer, player: IPCPlayer) -> None:
+    player.toggle_pause()
+    assert server.next_command('cycle') == ['cycle', 'pause']
+
+    server.replies['get_property']['playlist-count'] = 1
+    player.queue_video('/tmp/a,b.mkv', 'A, B')
+    assert server.next_command('loadfile') == [
+        'loadfile', '/tmp/a,b.mkv', 'append',
+        'force-media-title=%4%A, B']
+
+    # idle mpv would start queued file right away
+    server.replies['get_property']['playlist-count'] = 0
+    player.queue_video('/tmp/c.mkv')
+    player.display_text('hello', 500)
+    assert server.next_command('get_property') == [
+        'get_property', 'playlist-count']
+    assert server.commands.get(timeout=2) == ['show-text', 'hello', 500]
+    assert player._pending_loads == 0
+
+
+def test_crash_is_reported(
+    server: FakeMPVServer, player: IPCPlayer,
+    recorder: Dict[str, queue.Queue]
+) -> None:
+    server.next_command('observe_property')
+    server.conn.shutdown(socket.SHUT_RDWR)
+
+    assert recorder['events'].get(timeout=2) is PlayerEvent.VIDEO_QUIT
+    assert not player.client.connected
+
+    # pipe is still ours to close after the reader stopped
+    client = player.client
+    fds = (client._wakeup_r, client._wakeup_w)
+    client.close()
+    client.close()
+    for fd in fds:
+        with pytest.raises(OSError):
+            os.fstat(fd)
+
+
+def test_failed_connect_closes_pipe(tmpdir: str) -> None:
+    fds_before = set(os.listdir('/proc/self/fd'))
+
+    client = MPVIPCClient(os.path.join(tmpdir, 'missing.sock'))
+    with pytest.raises(MPVIPCError):
+        client.connect(timeout=.1)
+    client.close()
+
+    assert set(os.listdir('/proc/self/fd')) == fds_before
+
+
+def test_key_bindings() -> None:
+    pl = IPCPlayer(mpv_binary='/usr/bin/mpv')
+    pl.disable_video = True
+
+    cmd = pl._build_command('/tmp/mpv.sock', '/tmp/input.conf')
+    assert cmd[0] == '/usr/bin/mpv'
+    assert '--input-ipc-server=/tmp/mpv.sock' in cmd
+    assert '--input-conf=/tmp/input.conf' in cmd
+    assert '--vo=null' in cmd
+    assert 'q' in IPCPlayer.STOP_KEYS
@@ -0,0 +1,130 @@
+import time
+import functools
+import threading
+import concurrent.futures
+
+import pytest
+
+from ..extra import utils, plugin_pool
+from ..extra.plugin_pool import PluginPool, SingleFlight
+from ..extra.plugins import (
+    Playlist, Video, VideoData, get_file_info, get_youtube_info)
+from ..benchmarks.data import make_media_dir, make_pafy_items
+
+
+def fake_resolve(_id: str):  # type: ignore
+    if _id.startswith('sleep'):
+        time.sleep(float(_id.split(':')[1]))
+    elif _id == 'unknown':
+        raise ValueError(f'Playlist "{_id}" could not be loaded')
+
+    pl = Playlist()
+    pl._id = pl._title = _id
+    pl.extend(Video.from_pafy(item) for item in make_pafy_items(3))
+    return 'FakePlugin', pl
+
+
+@pytest.fixture
+def pool(monkeypatch):  # type: ignore
+    # forked workers inherit patched resolver
+    monkeypatch.setattr(utils, 'resolve_playlist', fake_resolve)
+    with PluginPool(workers=2, start_method='fork') as pool:
+        yield pool
+
+
+def test_single_flight() -> None:
+    flights = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def load(key: str) -> str:
+        calls.append(key)
+        release.wait(5)
+        return key.upper()
+
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        futures = [
+            executor.submit(flights.do, 'a', load, 'a') for _ in range(3)]
+        time.sleep(.1)
+        release.set()
+        results = [f.result() for f in futures]
+
+    assert calls == ['a']
+    assert sorted(results) == [('A', False), ('A', True), ('A', True)]
+
+    # later calls run again
+    assert flights.do('a', load, 'a') == ('A', False)
+    assert len(calls) == 2
+
+
+def test_compact_serialization(tmpdir: str) -> None:
+    pl = utils.resolve_playlist(make_media_dir(str(tmpdir), n_files=3))[1]
+    pl.append(Video.from_pafy(make_pafy_items(1)[0]))
+    pl.append(Video(VideoData(
+        title='custom', duration=3,
+        get_file_stream=functools.partial(str, 'stream'),
+        get_info=functools.partial(str, 'info'))))
+
+    copy = Playlist.loads(pl.dumps())
+    assert (copy.id, copy.title) == (pl.id, pl.title)
+    assert [(v.title, v.duration, v.id) for v in copy] == \
+        [(v.title, v.duration, v.id) for v in pl]
+    assert copy[0].get_file_stream() == pl[0].get_file_stream()
+    assert copy[0].get_info.func is get_file_info
+    assert copy[3].get_info.func is get_youtube_info
+    assert copy[4].get_info() == 'info'
+
+
+def test_resolve(pool: PluginPool) -> None:
+    plugin_name, data = pool.resolve('list')
+    assert plugin_name == 'FakePlugin'
+    assert [vid.id for vid in Playlist.loads(data)] == [
+        'yt:00000000000', 'yt:00000000001', 'yt:00000000002']
+
+    with pytest.raises(ValueError, match='could not be loaded'):
+        pool.resolve('unknown')
+
+    # workers are reused
+    assert len(pool._idle) == 1
+
+
+def test_timeout(pool: PluginPool) -> None:
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        pool.resolve('sleep:30', timeout=.5)
+    assert time.monotonic() - start < 5
+
+    # hanging worker was replaced
+    assert len(pool._idle) == 0
+    assert pool.resolve('list', timeout=10)[0] == 'FakePlugin'
+
+
+def test_cancel(pool: PluginPool) -> None:
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+        future = executor.submit(pool.resolve, 'sleep:30')
+        while len(pool._busy) == 0:
+            time.sleep(.01)
+        assert pool.cancel() == 1
+
+        with pytest.raises(concurrent.futures.CancelledError):
+            future.result(timeout=5)
+
+
+def test_shared_loads(pool: PluginPool, monkeypatch) -> None:  # type: ignore
+    monkeypatch.setattr(plugin_pool, '_pool', pool)
+    resolve = pool.resolve
+    calls = []
+
+    def counting_resolve(*args):  # type: ignore
+        calls.append(args[0])
+        return resolve(*args)
+    monkeypatch.setattr(pool, 'resolve', counting_resolve)
+
+    with concurrent.futures.ThreadPoolExecutor(3) as executor:
+        results = list(executor.map(
+            plugin_pool.load_playlist, ['sleep:.5'] * 3))
+
+    assert calls == ['sleep:.5']
+    # everybody gets own copy
+    assert len({id(pl) for _, pl in results}) == 3
+    assert all(len(pl) == 3 for _, pl in results)
@@ -0,0 +1,85 @@
+import gc
+import os
+import weakref
+
+from ..extra.utils import file_fingerprint
+from ..extra.plugins import FilesystemPlugin, Playlist, Video, VideoData
+from ..benchmarks.data import make_media_dir, make_pafy_items
+
+
+def write(path: str, content: bytes) -> str:
+    with open(path, 'wb') as fd:
+        fd.write(content)
+    return path
+
+
+def test_file_fingerprint(tmpdir: str) -> None:
+    head, middle, tail = b'h' * 4096, b'm' * 10_000, b't' * 4096
+    fname = write(os.path.join(tmpdir, 'a.mp4'), head + middle + tail)
+    fp = file_fingerprint(fname)
+
+    # survives renames
+    os.rename(fname, os.path.join(tmpdir, 'b.mp4'))
+    assert file_fingerprint(os.path.join(tmpdir, 'b.mp4')) == fp
+
+    # only size, head and tail are considered
+    assert file_fingerprint(write(
+        os.path.join(tmpdir, 'c.mp4'), head + b'x' * 10_000 + tail)) == fp
+    assert file_fingerprint(write(
+        os.path.join(tmpdir, 'd.mp4'), head + middle + b'x' * 4096)) != fp
+    assert file_fingerprint(write(
+        os.path.join(tmpdir, 'e.mp4'), head + middle[1:] + tail)) != fp
+
+    # small files are hashed completely
+    assert file_fingerprint(write(os.path.join(tmpdir, 'f'), b'abc')) != \
+        file_fingerprint(write(os.path.join(tmpdir, 'g'), b'abd'))
+
+
+def test_fingerprint_reads_little(tmpdir: str) -> None:
+    fname = os.path.join(tmpdir, 'huge.mkv')
+    with open(fname, 'wb') as fd:
+        fd.truncate(50 * 2**30)  # sparse
+    assert file_fingerprint(fname).startswith(f'{50 * 2**30:x}-')
+
+
+def test_filesystem_ids(tmpdir: str) -> None:
+    make_media_dir(str(tmpdir), n_files=2)
+
+    pl = FilesystemPlugin().extract_playlist(str(tmpdir))
+    ids = [vid.id for vid in pl]
+    assert all(vid_id.startswith('fs:') for vid_id in ids)
+    assert len(set(ids)) == 2
+
+    os.rename(
+        os.path.join(tmpdir, '00000.wav'), os.path.join(tmpdir, 'x.wav'))
+    renamed = FilesystemPlugin().extract_playlist(str(tmpdir))
+    assert renamed.get_video_by_id(ids[0])[1].title == 'x.wav'
+
+
+def test_get_video_by_id() -> None:
+    pl = Playlist()
+    for i in range(5):
+        pl.append(Video(VideoData(
+            title=f'ep{i}', duration=1, get_file_stream=lambda: '',
+            get_info=lambda: '', id=f'id{i}' if i < 4 else None)))
+
+    assert pl.get_video_by_id('id3') == (3, pl[3])
+    assert pl.get_video_by_id('ep4') == (4, pl[4])
+    assert pl.get_video_by_id('missing') == (None, None)
+
+    pl.reverse()
+    assert pl.get_video_by_id('id3') == (1, pl[1])
+    assert pl.find_video({'id': 'id0', 'title': 'ep0'}) == (4, pl[4])
+    assert pl.find_video({'title': 'ep1'}) == (3, pl[3])
+
+
+def test_pafy_objects_are_not_retained() -> None:
+    items = make_pafy_items(10)
+    refs = [weakref.ref(item) for item in items]
+    videos = [Video.from_pafy(item) for item in items]
+    del items
+    gc.collect()
+
+    assert all(ref() is None for ref in refs)
+    assert videos[3].id == 'yt:00000000003'
+    assert not hasattr(videos[3], '__dict__')
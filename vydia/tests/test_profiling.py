@@ -0,0 +1,52 @@
+import threading
+
+from click.testing import CliRunner
+
+from ..main import main
+from ..extra import profiling
+from ..extra.profiling import ProfileSession, list_sessions, summarize
+
+
+def busy_main_thread() -> int:
+    return sum(i * i for i in range(10_000))
+
+
+def busy_worker() -> list:
+    return [str(i) for i in range(10_000)]
+
+
+def test_session(tmpdir: str) -> None:
+    result = []
+
+    with ProfileSession(directory=tmpdir, trace_memory=True) as session:
+        busy_main_thread()
+
+        thread = threading.Thread(
+            target=profiling.wrap(lambda: result.append(busy_worker())),
+            name='worker')
+        thread.start()
+        thread.join()
+
+    assert len(result[0]) == 10_000
+    assert profiling.wrap(busy_worker) is busy_worker
+
+    assert list_sessions(tmpdir) == [session.directory]
+    assert (session.directory / 'cpu-worker.prof').exists()
+
+    summary = summarize(session.directory, limit=1000)
+    assert summary['threads'] == ['MainThread', 'worker']
+
+    functions = ' '.join(func['function'] for func in summary['functions'])
+    assert 'busy_main_thread' in functions and 'busy_worker' in functions
+    assert len(summary['allocators']) > 0
+
+
+def test_report_command(tmpdir: str) -> None:
+    with ProfileSession(directory=tmpdir) as session:
+        busy_main_thread()
+
+    result = CliRunner().invoke(
+        main, ['profile', 'report', str(session.directory), '--limit', '5'])
+    assert result.exit_code == 0
+    assert 'Hottest functions (by cumulative)' in result.output
+    assert 'Largest allocators' not in result.output
@@ -0,0 +1,149 @@
+import os
+import time
+import threading
+
+import pytest
+
+from ..extra import scan
+from ..extra import plugins
+from ..extra.scan import ScanOptions, split_location, scan_media
+from ..extra.plugins import FilesystemPlugin
+from ..benchmarks.data import make_media_dir
+
+
+def touch(*parts: str) -> str:
+    path = os.path.join(*parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'w').close()
+    return path
+
+
+def names(root: str, paths: list) -> list:
+    return [os.path.relpath(p, root) for p in paths]
+
+
+@pytest.fixture
+def library(tmpdir: str) -> str:
+    root = str(tmpdir)
+    for rel in [
+        'ep1.mkv', 'ep2.MP4', 'ep1.srt', 'cover.jpg', '.hidden.mkv',
+        'season2/ep1.mkv', 'season2/info.nfo', 'season2/ep1-sample.mkv',
+        'season2/extras/making-of.webm', '.trash/old.mkv'
+    ]:
+        touch(root, rel)
+    return root
+
+
+def test_from_query() -> None:
+    opts = ScanOptions.from_query(
+        'recursive&include=season*,ep*&exclude=*sample*&ext=mkv,.webm'
+        '&timeout=2.5&workers=3')
+    assert opts.recursive
+    assert opts.include == ['season*', 'ep*']
+    assert opts.exclude == ['*sample*']
+    assert opts.extensions == {'.mkv', '.webm'}
+    assert (opts.timeout, opts.workers) == (2.5, 3)
+
+    assert not ScanOptions.from_query('').recursive
+    with pytest.raises(ValueError):
+        ScanOptions.from_query('recursiv')
+
+
+def test_split_location(tmpdir: str) -> None:
+    path, opts = split_location(f'{tmpdir}?recursive&exclude=*x*')
+    assert path == str(tmpdir)
+    assert opts.recursive and opts.exclude == ['*x*']
+
+    # existing paths are never split
+    odd = os.path.join(str(tmpdir), 'what?')
+    os.mkdir(odd)
+    assert split_location(odd)[0] == odd
+
+
+def test_foreign_ids(tmpdir: str) -> None:
+    plugin = FilesystemPlugin()
+    assert plugin.extract_playlist(
+        'https://www.youtube.com/playlist?list=PL0123456789') is None
+    assert plugin.extract_playlist(
+        os.path.join(str(tmpdir), 'missing?recursive')) is None
+    assert plugin.extract_playlist(f'{tmpdir}?list=foo') is None
+
+
+def test_flat_scan(library: str) -> None:
+    assert names(library, scan_media(library, ScanOptions())) == \
+        ['ep1.mkv', 'ep2.MP4']
+
+
+def test_recursive_scan(library: str) -> None:
+    opts = ScanOptions(recursive=True, exclude=['*sample*'])
+    assert names(library, scan_media(library, opts)) == [
+        'ep1.mkv', 'ep2.MP4', 'season2/ep1.mkv',
+        'season2/extras/making-of.webm']
+
+    # excluded directories are not entered
+    opts = ScanOptions(recursive=True, exclude=['season2/extras'])
+    assert 'season2/extras/making-of.webm' not in names(
+        library, scan_media(library, opts))
+
+    opts = ScanOptions(recursive=True, include=['season2/*'], extensions=['mkv'])
+    assert names(library, scan_media(library, opts)) == [
+        'season2/ep1-sample.mkv', 'season2/ep1.mkv']
+
+
+def test_symlink_loop(library: str) -> None:
+    os.symlink(library, os.path.join(library, 'season2', 'loop'))
+    found = names(library, scan_media(library, ScanOptions(recursive=True)))
+    assert len(found) == len(set(os.path.realpath(p) for p in found))
+
+
+def test_stalled_directory(library: str, monkeypatch) -> None:
+    release = threading.Event()
+    scan_directory = scan.scan_directory
+
+    def slow(path: str):  # type: ignore
+        if path.endswith('extras'):
+            release.wait(5)
+        return scan_directory(path)
+    monkeypatch.setattr(scan, 'scan_directory', slow)
+
+    start = time.monotonic()
+    found = names(library, scan_media(
+        library, ScanOptions(recursive=True, timeout=.2)))
+    release.set()
+
+    assert time.monotonic() - start < 2
+    assert 'season2/ep1.mkv' in found
+    assert 'season2/extras/making-of.webm' not in found
+
+
+def test_stalled_root(tmpdir: str, monkeypatch) -> None:
+    release = threading.Event()
+    monkeypatch.setattr(
+        scan, 'scan_directory', lambda path: release.wait(5))
+
+    with pytest.raises(TimeoutError):
+        scan_media(str(tmpdir), ScanOptions(timeout=.1))
+    release.set()
+
+
+def test_only_media_is_probed(library: str, monkeypatch) -> None:
+    make_media_dir(os.path.join(library, 'season2'), n_files=2)
+    probed = []
+    get_video_duration = plugins.get_video_duration
+
+    def probe(fname: str) -> int:
+        probed.append(os.path.relpath(fname, library))
+        return get_video_duration(fname) if fname.endswith('.wav') else 0
+    monkeypatch.setattr(plugins, 'get_video_duration', probe)
+
+    url = f'{library}?recursive&exclude=*sample*'
+    pl = FilesystemPlugin().extract_playlist(url)
+
+    assert pl._id == url
+    assert pl._title == library
+    assert [vid.title for vid in pl] == [
+        'ep1.mkv', 'ep2.MP4', '00000.wav', '00001.wav', 'ep1.mkv',
+        'making-of.webm']
+    assert sorted(probed) == sorted([
+        'ep1.mkv', 'ep2.MP4', 'season2/00000.wav', 'season2/00001.wav',
+        'season2/ep1.mkv', 'season2/extras/making-of.webm'])
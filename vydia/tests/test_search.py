@@ -0,0 +1,74 @@
+import random
+import timeit
+
+import pytest
+
+from ..extra.search import TitleIndex, SearchState
+
+
+@pytest.fixture
+def index() -> TitleIndex:
+    return TitleIndex([
+        'The Office S01E01.mkv',
+        'Breaking Bad S01E01.mkv',
+        'Breaking Bad S01E02.mkv',
+        'Bad Breaks.mp4',
+        'office party.avi'
+    ])
+
+
+def test_ranking(index: TitleIndex) -> None:
+    assert index.search('') == []
+    assert index.search('breaking bad')[:2] == [1, 2]
+    assert index.search('OFFICE') == [4, 0]
+    assert index.search('s01e02')[0] == 2
+
+    # tolerate typos
+    assert 1 in index.search('braking bad')
+
+
+def test_short_queries(index: TitleIndex) -> None:
+    assert index.search('b') == [1, 2, 3]
+    assert index.search('of') == [4, 0]
+    assert index.search('xy') == []
+
+
+def test_match_navigation(index: TitleIndex) -> None:
+    state = SearchState(index)
+    assert state.update('bad') == [3, 1, 2]
+    assert state.current() == 3
+
+    assert state.step(1) == 1
+    assert state.step(1) == 2
+    assert state.step(1) == 3
+    assert state.step(-1) == 2
+
+    state.update('zzz')
+    with pytest.raises(IndexError):
+        state.step(1)
+
+
+def test_keystroke_latency() -> None:
+    rng = random.Random(42)
+    words = [
+        ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz')
+                for _ in range(rng.randint(3, 8)))
+        for _ in range(3000)]
+    titles = [
+        f'Show S{i % 20:02d}E{i % 99:02d} - '
+        + ' '.join(rng.choice(words) for _ in range(4))
+        for i in range(50_000)]
+    index = TitleIndex(titles)
+
+    # typed from the start, i.e. through the prefix shared by all titles
+    query = titles[1234]
+    durations = []
+    for i in range(1, len(query) + 1):
+        # best of a few runs to filter out scheduling noise
+        durations.append(min(
+            timeit.repeat(lambda: index.search(query[:i]),
+                          number=1, repeat=3)))
+
+    assert index.search(query)[0] == 1234
+    assert max(durations) < .01, \
+        f'"{query[:durations.index(max(durations)) + 1]}" was slowest'
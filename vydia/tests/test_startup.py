@@ -0,0 +1,61 @@
+import os
+import sys
+import subprocess
+
+from typing import Dict, Tuple
+
+import pytest
+
+
+# generous by default as wall-clock limits are flaky on loaded machines
+IMPORT_BUDGET_MS = float(os.environ.get('VYDIA_IMPORT_BUDGET_MS', 300))
+
+HEAVY_MODULES = ['pafy', 'youtube_dl', 'hachoir', 'urwid', 'mpv', 'airplay',
+                 'nanodlna']
+
+
+def import_times(code: str) -> Dict[str, Tuple[int, int]]:
+    """ Run `code` in fresh interpreter and return
+        {module: (self_us, cumulative_us)} as reported by `-X importtime`
+    """
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        universal_newlines=True)
+
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cum_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cum_us))
+    return times
+
+
+def format_report(times: Dict[str, Tuple[int, int]], n: int = 10) -> str:
+    slowest = sorted(times.items(), key=lambda x: -x[1][0])[:n]
+    return '\n'.join(
+        f'{self_us / 1000:7.2f}ms  {name}' for name, (self_us, _) in slowest)
+
+
+@pytest.mark.parametrize('code', [
+    'import vydia.main',
+    'from vydia.main import main; main(["add-playlist", "--help"])',
+    'from vydia.main import main; main(["progress", "--help"])'
+])
+def test_no_heavy_imports(code: str) -> None:
+    times = import_times(code)
+    assert 'vydia.main' in times
+
+    loaded = {name.split('.')[0] for name in times}
+    assert loaded.isdisjoint(HEAVY_MODULES), format_report(times)
+
+
+def test_import_budget() -> None:
+    # take best of a few runs to filter out noise
+    runs = [import_times('import vydia.main') for _ in range(3)]
+    best = min(runs, key=lambda t: t['vydia'][1])
+
+    total_ms = best['vydia'][1] / 1000
+    assert total_ms < IMPORT_BUDGET_MS, \
+        f'Importing vydia took {total_ms:.1f}ms:\n' + format_report(best)
@@ -0,0 +1,204 @@
+import os
+import shutil
+import asyncio
+import functools
+
+from typing import List, Tuple  # noqa: F401
+
+import pytest
+
+from ..core import controller as controller_module
+from ..extra.plugins import Playlist, Video, VideoData
+from ..benchmarks.tui import TUIHarness
+from ..benchmarks import data
+
+
+def test_scripted_session(tmpdir: str) -> None:
+    with TUIHarness(str(tmpdir), n_videos=60, size=(80, 20)) as h:
+        assert any('Synthetic' in line for line in h.screen.text())
+
+        h.press('enter')
+        assert len(h.controller.player.item_list) == 60
+        assert any(line.startswith('< 00002.wav') for line in h.screen.text())
+
+        # focus is on last played video
+        assert h.controller.view.widget.vid_list.get_focus()[1] == 2
+
+        h.press('down', 'w')
+        vid = h.controller.player.playlist[3]
+        assert vid.id.startswith('fs:')
+        assert h.model.get_playlist_info('Synthetic')['episodes'] == {
+            vid.id: {'title': '00003.wav', 'current_timestamp': '00:00:00'}}
+
+        h.press('c')
+        h.press('>')
+        assert h.player.calls == [
+            ('play', '00002.wav', 0), ('play', '00003.wav', 0)]
+        assert 'Starting "00003.wav": done' in h.screen.text()[-1]
+
+        h.press('/', *'0042', 'enter')
+        assert h.controller.view.widget.vid_list.get_focus()[1] == 42
+
+    report = h.report()
+    assert report['frames'] > 0 and report['widgets'] > 60
+    assert report['redraws_per_second'] > 0
+    assert [step['label'] for step in report['steps']] == [
+        'enter', 'down w', 'c', '>', '/ 0 0 4 2 enter']
+
+    # opening playlist builds one row per video, scrolling builds nothing
+    assert report['steps'][0]['widgets'] >= 60
+
+
+def test_scenario(tmpdir: str) -> None:
+    with TUIHarness(str(tmpdir), n_videos=30) as h:
+        h.run_scenario()
+
+    steps = {step['label']: step for step in h.report()['steps']}
+    assert steps['scroll 20 rows']['widgets'] == 0
+    assert steps['scroll 20 rows']['redraws'] >= 1
+
+
+def test_position_checkpoints(tmpdir: str) -> None:
+    with TUIHarness(str(tmpdir), n_videos=10, size=(80, 20)) as h:
+        h.press('enter', 'c')
+        state_size = os.path.getsize(h.model.STATE_FILE)
+
+        for pos in (1., 2., 30.):
+            h.player.time_callback(pos)
+            h.wait()
+        h.controller.state_executor.submit(lambda: None).result()
+
+        # seek was journaled without rewriting state file
+        assert os.path.getsize(h.model.STATE_FILE) == state_size
+        assert h.model.get_current_video('Synthetic') == {
+            'id': h.controller.player.playlist[2].id,
+            'title': '00002.wav', 'timestamp': '00:00:30'}
+
+
+def test_watch_directory(tmpdir: str) -> None:
+    with TUIHarness(str(tmpdir), n_videos=20, size=(80, 20)) as h:
+        h.controller.config['watch'] = True
+        h.press('enter')
+        media_dir = h.model.get_playlist_info('Synthetic')['id']
+
+        def wait_for(cond) -> None:  # type: ignore
+            for _ in range(100):
+                if cond():
+                    return
+                h.controller.aloop.run_until_complete(asyncio.sleep(.02))
+                h.wait()
+            raise AssertionError('Timed out')
+
+        wait_for(lambda: h.controller.player.watcher is not None)
+        widgets = h.widgets.count
+
+        shutil.copy(
+            os.path.join(media_dir, '00003.wav'),
+            os.path.join(media_dir, '00003b.wav'))
+        wait_for(lambda: len(h.controller.player.item_list) == 21)
+        assert h.controller.player.playlist[4].title == '00003b.wav'
+        # only the new row was built
+        assert h.widgets.count - widgets < 10
+
+        os.remove(os.path.join(media_dir, '00010.wav'))
+        wait_for(lambda: len(h.controller.player.item_list) == 20)
+        assert '00010.wav' not in [
+            vid.title for vid in h.controller.player.playlist]
+
+
+def test_bulk_marking(tmpdir: str) -> None:
+    playlist = data.make_playlist(50, min_duration=30, max_duration=120)
+    with TUIHarness(str(tmpdir), size=(80, 20), playlist=playlist) as h:
+        h.press('enter')
+        saves = []
+        save_state = h.model._save_state
+        h.model._save_state = \
+            lambda *args: (saves.append(1), save_state(*args))
+
+        def watched() -> list:
+            episodes = h.model.get_playlist_info('Synthetic')['episodes']
+            return [
+                i for i, vid in enumerate(playlist)
+                if vid.id in episodes
+                and episodes[vid.id]['current_timestamp'] != '00:00:00']
+
+        h.press(':', *'watched 1-40', 'enter')
+        assert watched() == list(range(40))
+        assert len(saves) == 1
+        assert h.controller.player.item_list[39].endswith('100%')
+
+        h.press(':', *'unwatched all', 'enter')
+        assert watched() == []
+
+        # select some, then toggle them at once
+        h.press('home', 'm', 'm', 'down', 'm')
+        view = h.controller.view.widget
+        assert len(view.selected) == 3
+        assert view.vid_list[1].attr_map == {None: 'selected'}
+        h.press('w')
+        assert watched() == [0, 1, 3]
+        assert view.selected == set()
+        assert view.vid_list[1].attr_map == {None: None}
+
+        h.press('end', 'up', ':', *'mark-until-focus', 'enter')
+        assert watched() == list(range(48))
+        assert len(saves) == 4
+
+        h.press(':', *'watched 3-99', 'enter')
+        assert 'not within 1-50' in h.screen.text()[-1]
+
+
+def test_continue_watching(tmpdir: str) -> None:
+    playlist = data.make_playlist(20, min_duration=30, max_duration=120)
+    with TUIHarness(str(tmpdir), size=(80, 20), playlist=playlist) as h:
+        h.press('c')
+        assert 'Nothing to continue' in h.screen.text()[-1]
+        h.press('c', 'enter')
+
+        vid = playlist[5]
+        h.model.save_progress('Synthetic', vid.id, vid.title, 10)
+        h.controller.view.show_playlist_overview()
+        h.press('c')
+        assert any(
+            line.strip().startswith(f'< Synthetic: {vid.title}')
+            for line in h.screen.text())
+
+        h.press('enter')
+        assert h.player.calls[-1][1:] == (vid.title, 10)
+
+
+def test_continue_from_cache(
+    tmpdir: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    playlist = Playlist()
+    playlist._id = str(tmpdir)
+    for i in range(3):
+        path = str(tmpdir / f'ep{i}.mp4')
+        open(path, 'w').close()
+        playlist.append(Video(VideoData(
+            title=f'ep{i}', duration=100,
+            get_file_stream=functools.partial(str, path),
+            get_info=functools.partial(str, ''), id=f'fs:{i}')))
+
+    with TUIHarness(str(tmpdir), size=(80, 20), playlist=playlist) as h:
+        h.model.cache_playlist('Synthetic', playlist)
+        h.model.save_progress('Synthetic', 'fs:1', 'ep1', 10)
+
+        loads = []  # type: List[str]
+        load_playlist = controller_module.load_playlist
+
+        def load(_id: str) -> Tuple[str, Playlist]:
+            loads.append(_id)
+            return load_playlist(_id)
+        monkeypatch.setattr(controller_module, 'load_playlist', load)
+
+        # cached playlist is enough to resume
+        h.press('c', 'enter')
+        assert h.player.calls[-1][1:] == ('ep1', 10)
+        assert loads == []
+
+        # file is gone, ask plugin again
+        os.remove(tmpdir / 'ep1.mp4')
+        h.controller.view.show_playlist_overview()
+        h.press('c', 'enter')
+        assert loads == [str(tmpdir)]
@@ -0,0 +1,139 @@
+import os
+import queue
+import shutil
+
+import pytest
+
+from ..extra import plugins
+from ..extra.scan import ScanOptions
+from ..extra.plugins import FilesystemPlugin
+from ..extra.watcher import InotifyWatcher, PollingWatcher, create_watcher
+from ..benchmarks.data import make_media_dir
+
+
+def write(path: str, content: bytes = b'data') -> str:
+    with open(path, 'wb') as fd:
+        fd.write(content)
+    return path
+
+
+class Changes(queue.Queue):
+    def __call__(self, added: set, removed: set) -> None:
+        self.put((added, removed))
+
+    def next(self, timeout: float = 2) -> tuple:
+        return self.get(timeout=timeout)
+
+
+@pytest.fixture(params=['inotify', 'polling'])
+def watch(request, tmpdir: str):  # type: ignore
+    watchers = []
+
+    def create(options: ScanOptions, known: list = ()) -> Changes:
+        changes = Changes()
+        if request.param == 'inotify':
+            watcher = InotifyWatcher(
+                str(tmpdir), options, changes, known, debounce=.05)
+        else:
+            watcher = PollingWatcher(
+                str(tmpdir), options, changes, known, interval=.05)
+        watcher.start()
+        watchers.append(watcher)
+        return changes
+
+    yield create
+
+    for watcher in watchers:
+        watcher.stop()
+
+
+def test_files(watch, tmpdir: str) -> None:  # type: ignore
+    old = write(os.path.join(tmpdir, 'old.mkv'))
+    changes = watch(ScanOptions(), [old])
+
+    new = write(os.path.join(tmpdir, 'new.mkv'))
+    write(os.path.join(tmpdir, 'new.srt'))
+    write(os.path.join(tmpdir, '.partial.mkv'))
+    assert changes.next() == ({new}, set())
+
+    renamed = os.path.join(tmpdir, 'renamed.mkv')
+    os.rename(old, renamed)
+    assert changes.next() == ({renamed}, {old})
+
+    os.remove(new)
+    assert changes.next() == (set(), {new})
+    assert changes.empty()
+
+
+def test_subdirectories(watch, tmpdir: str) -> None:  # type: ignore
+    changes = watch(ScanOptions(recursive=True, exclude=['extras']))
+
+    os.makedirs(os.path.join(tmpdir, 'season1', 'extras'))
+    ep = write(os.path.join(tmpdir, 'season1', 'ep1.mkv'))
+    write(os.path.join(tmpdir, 'season1', 'extras', 'x.mkv'))
+    assert changes.next() == ({ep}, set())
+
+    shutil.rmtree(os.path.join(tmpdir, 'season1'))
+    assert changes.next() == (set(), {ep})
+
+
+def test_fallback(tmpdir: str, monkeypatch) -> None:  # type: ignore
+    def fail() -> None:
+        raise OSError('inotify is not supported')
+    monkeypatch.setattr('vydia.extra.watcher._load_libc', fail)
+
+    watcher = create_watcher(str(tmpdir), ScanOptions(), Changes())
+    assert isinstance(watcher, PollingWatcher)
+
+
+def test_apply_changes(tmpdir: str, monkeypatch) -> None:  # type: ignore
+    make_media_dir(str(tmpdir), n_files=3)
+    pl = FilesystemPlugin().extract_playlist(str(tmpdir))
+    durations = [vid.duration for vid in pl]
+
+    probed = []
+    get_video_duration = plugins.get_video_duration
+
+    def probe(fname: str) -> int:
+        probed.append(os.path.basename(fname))
+        return get_video_duration(fname)
+    monkeypatch.setattr(plugins, 'get_video_duration', probe)
+
+    # renamed files are not probed again
+    path = os.path.join(tmpdir, '00001.wav')
+    renamed = os.path.join(tmpdir, '00009.wav')
+    os.rename(path, renamed)
+    shutil.copy(os.path.join(tmpdir, '00000.wav'), tmpdir / '00005.wav')
+
+    updated = FilesystemPlugin.apply_changes(
+        pl, {renamed, str(tmpdir / '00005.wav')}, {path})
+    assert probed == ['00005.wav']
+    assert [vid.title for vid in updated] == [
+        '00000.wav', '00002.wav', '00005.wav', '00009.wav']
+    assert updated[3].id == pl[1].id
+    assert updated[3].duration == durations[1]
+    assert updated[3].get_file_stream() == renamed
+    assert updated.id == pl.id and updated.title == pl.title
+
+    # unsorted playlists get new videos appended
+    pl.reverse()
+    updated = FilesystemPlugin.apply_changes(
+        pl, {str(tmpdir / '00005.wav')}, set())
+    assert updated[-1].title == '00005.wav'
+
+
+def test_stop_after_failure(tmpdir: str, monkeypatch) -> None:  # type: ignore
+    def fail() -> None:
+        raise RuntimeError('Broken')
+
+    watcher = InotifyWatcher(str(tmpdir), ScanOptions(), Changes())
+    monkeypatch.setattr(watcher, '_read_events', fail)
+    watcher.start()
+
+    write(os.path.join(tmpdir, 'new.mkv'))
+    watcher._thread.join(2)
+    assert not watcher._thread.is_alive()
+
+    # descriptors are not touched again
+    watcher.stop()
+    watcher.stop()